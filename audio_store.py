@@ -0,0 +1,255 @@
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional
+
+from streaming import tee_to_file
+
+# Names the store hands out: <topic>_<YYYYmmdd_HHMMSS>_<8 hex>.mp3
+NAME_RE = re.compile(r"^[\w\-]+\.mp3$")
+
+
+class AudioStore:
+    """
+    Directory of generated briefings with a SQLite manifest, quota and retention.
+
+    Every file gets a unique name and is written atomically: it only appears
+    once complete. The manifest records size, creation and last access. When
+    the store goes over `max_bytes`, the least recently used files are deleted.
+    Files older than `max_age` seconds are deleted as well. compact() reconciles
+    the manifest with the directory (files added or removed behind its back,
+    leftover temp files) and is meant to run periodically in the background.
+    The manifest, eviction counters included, can be shared by all workers on
+    the host.
+    """
+
+    def __init__(self, root, max_bytes: int, max_age: float = 0.0):
+        """
+        Args:
+            root: Directory holding the audio files
+            max_bytes: Disk quota for the audio files (0 = unlimited)
+            max_age: Seconds a file is kept after creation (0 = forever)
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.last_compaction: Optional[float] = None
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                " name TEXT PRIMARY KEY,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS files_accessed ON files (accessed_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS evictions ("
+                " id INTEGER PRIMARY KEY CHECK (id = 0),"
+                " files INTEGER NOT NULL,"
+                " bytes INTEGER NOT NULL)"
+            )
+            conn.execute("INSERT OR IGNORE INTO evictions (id, files, bytes) VALUES (0, 0, 0)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shareable across threads, keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.root / ".manifest.sqlite3", timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def new_path(self, topic_name: Optional[str] = None) -> Path:
+        """A fresh, collision-free path for a briefing about topic_name"""
+        if topic_name:
+            # Clean topic name for filename (remove special characters)
+            clean_topic = "".join(c for c in topic_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
+            prefix = clean_topic.replace(' ', '_') or "tts"
+        else:
+            prefix = "tts"
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return self.root / f"{prefix}_{timestamp}_{uuid.uuid4().hex[:8]}.mp3"
+
+    def tee(self, chunks: Iterable[bytes], topic_name: Optional[str] = None) -> Iterator[bytes]:
+        """Yield audio chunks while saving them as a new file; the file is registered once complete"""
+        path = self.new_path(topic_name)
+        yield from tee_to_file(chunks, path)
+        self.add(path)
+
+    def save(self, chunks: Iterable[bytes], topic_name: Optional[str] = None) -> Path:
+        """Write audio chunks to a new file and return its path"""
+        path = self.new_path(topic_name)
+        for _ in tee_to_file(chunks, path):
+            pass
+        self.add(path)
+        return path
+
+    def add(self, path: Path):
+        """
+        Register a complete file in the manifest, then enforce the quota.
+
+        The new file itself is never evicted by this pass, even when it alone is
+        larger than the quota: its caller is about to serve it.
+        """
+        now = time.time()
+        self._connect().execute(
+            "INSERT OR REPLACE INTO files (name, size, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (path.name, path.stat().st_size, now, now)
+        )
+        self.enforce(keep=path.name)
+
+    def open(self, name: str) -> Optional[Path]:
+        """Return the path of a stored file (marking it recently used), or None"""
+        if not NAME_RE.match(name):
+            return None
+        path = self.root / name
+        cursor = self._connect().execute("UPDATE files SET accessed_at = ? WHERE name = ?", (time.time(), name))
+        return path if cursor.rowcount and path.exists() else None
+
+    def _forget(self, conn: sqlite3.Connection, rows):
+        """Drop rows from the manifest and count them as evicted, inside the caller's transaction"""
+        conn.executemany("DELETE FROM files WHERE name = ?", [(name,) for name, _ in rows])
+        conn.execute(
+            "UPDATE evictions SET files = files + ?, bytes = bytes + ?",
+            (len(rows), sum(size for _, size in rows))
+        )
+
+    def enforce(self, keep: Optional[str] = None):
+        """
+        Delete expired files, then least recently used ones until the store fits its quota.
+
+        Args:
+            keep: Name of a file to leave in place (the one just added)
+        """
+        conn = self._connect()
+        doomed = []
+        # One write transaction, so concurrent workers never pick and count the same rows
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self.max_age > 0:
+                expired = conn.execute(
+                    "SELECT name, size FROM files WHERE created_at < ?", (time.time() - self.max_age,)
+                ).fetchall()
+                self._forget(conn, expired)
+                doomed += expired
+
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+            if 0 < self.max_bytes < total:
+                lru = []
+                candidates = conn.execute(
+                    "SELECT name, size FROM files WHERE name != ? ORDER BY accessed_at", (keep or "",)
+                )
+                for name, size in candidates:
+                    lru.append((name, size))
+                    total -= size
+                    if total <= self.max_bytes:
+                        break
+                self._forget(conn, lru)
+                doomed += lru
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        # Unlinked once the manifest no longer lists them, so open() cannot hand them out
+        for name, _ in doomed:
+            (self.root / name).unlink(missing_ok=True)
+
+    def compact(self, tmp_age: float = 3600.0) -> dict:
+        """
+        Reconcile the manifest with the directory and re-apply retention.
+
+        Drops manifest rows whose files are gone, adopts untracked .mp3 files (e.g.
+        written before the store existed) and removes temp files left by crashed writers.
+
+        Returns:
+            dict: Rows dropped, files adopted and temp files removed
+        """
+        conn = self._connect()
+        now = time.time()
+        known = {name for (name,) in conn.execute("SELECT name FROM files")}
+        on_disk: Dict[str, os.stat_result] = {}
+        removed_tmp = 0
+        for path in self.root.iterdir():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if path.name.endswith(".tmp"):
+                if now - stat.st_mtime > tmp_age:
+                    path.unlink(missing_ok=True)
+                    removed_tmp += 1
+            elif path.suffix == ".mp3":
+                on_disk[path.name] = stat
+
+        missing = known - on_disk.keys()
+        conn.executemany("DELETE FROM files WHERE name = ?", [(name,) for name in missing])
+        untracked = on_disk.keys() - known
+        conn.executemany(
+            "INSERT OR IGNORE INTO files (name, size, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+            [(name, on_disk[name].st_size, on_disk[name].st_mtime, on_disk[name].st_mtime) for name in untracked]
+        )
+        self.enforce()
+        self.last_compaction = now
+        return {"dropped": len(missing), "adopted": len(untracked), "removed_tmp": removed_tmp}
+
+    def stats(self) -> dict:
+        conn = self._connect()
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files").fetchone()
+        evicted_files, evicted_bytes = conn.execute("SELECT files, bytes FROM evictions").fetchone()
+        return {
+            "files": count,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "usage": round(total / self.max_bytes, 3) if self.max_bytes else None,
+            "max_age_seconds": self.max_age,
+            "evicted_files": evicted_files,
+            "evicted_bytes": evicted_bytes,
+            "last_compaction": self.last_compaction,
+        }
+
+
+_stores: Dict[Path, AudioStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_audio_store(root=None) -> AudioStore:
+    """
+    Return the process-wide store for a directory (default AUDIO_DIR, "audio").
+
+    Configured through AUDIO_STORE_MAX_MB (default 1024, 0 = unlimited) and
+    AUDIO_STORE_MAX_AGE_HOURS (default 168, 0 = keep forever).
+    """
+    root = Path(root or os.getenv("AUDIO_DIR", "audio")).resolve()
+    with _stores_lock:
+        store = _stores.get(root)
+        if store is None:
+            store = _stores[root] = AudioStore(
+                root,
+                max_bytes=int(float(os.getenv("AUDIO_STORE_MAX_MB", "1024")) * 1024 * 1024),
+                max_age=float(os.getenv("AUDIO_STORE_MAX_AGE_HOURS", "168")) * 3600
+            )
+        return store
+
+
+async def run_compaction(store: AudioStore, interval: Optional[float] = None):
+    """Compact the store every `interval` seconds (AUDIO_STORE_COMPACT_INTERVAL, default 300) until cancelled"""
+    interval = interval or float(os.getenv("AUDIO_STORE_COMPACT_INTERVAL", "300"))
+    while True:
+        try:
+            result = await asyncio.to_thread(store.compact)
+            if any(result.values()):
+                print(f"Audio store compaction: {result}")
+        except Exception as e:
+            print(f"Audio store compaction failed: {str(e)}")
+        await asyncio.sleep(interval)
@@ -1,18 +1,135 @@
-from fastapi import FastAPI, HTTPException, File, Response
-from fastapi.responses import FileResponse
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import FileResponse, StreamingResponse
 import os
-from pathlib import Path
 from dotenv import load_dotenv
 
+from audio_store import get_audio_store, run_compaction
+from brightdata_client import close_brightdata_client
+from cache import get_llm_cache, get_tts_cache
+from llm import close_llm_provider, gemini_attempts, generate_broadcast_news_async
+from mcp_cache import get_mcp_tool_cache
 from models import NewsRequest
-from utils import generate_broadcast_news, text_to_audio_elevenlabs_sdk, tts_to_audio
+from utils import (
+    BROADCAST_GENERATION_CONFIG,
+    SINGLE_PASS,
+    build_broadcast_prompt,
+    cached_gemini_text,
+    elevenlabs_voice,
+    gtts_voice,
+    persist_audio,
+    pipeline_mode,
+    stream_broadcast_news
+)
+from streaming import open_audio_stream, stream_speech
+from tts import synthesize_briefing
 from news_scraper import NewsScraper
-from reddit_scraper import scrape_reddit_topics
+from reddit_scraper import scrape_reddit_topics, start_mcp_pool, stop_mcp_pool
 
-app = FastAPI()
 load_dotenv()
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Spawn MCP servers up front so Reddit requests don't pay for Node startup
+    await start_mcp_pool()
+    # Keep the audio store's manifest, quota and retention in shape in the background
+    compaction = asyncio.create_task(run_compaction(get_audio_store()))
+    yield
+    compaction.cancel()
+    # Release pooled upstream connections when the worker shuts down
+    await stop_mcp_pool()
+    await close_brightdata_client()
+    await close_llm_provider()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.get("/cache-stats")
+async def cache_stats():
+    """Hit/miss counters of this worker's caches (the LLM disk tier is shared by all workers)"""
+    return {
+        "llm": await asyncio.to_thread(get_llm_cache().stats),
+        "mcp_tools": get_mcp_tool_cache().stats(),
+        "tts": await asyncio.to_thread(get_tts_cache().stats),
+    }
+
+
+@app.get("/audio-store")
+async def audio_store_stats():
+    """Occupancy and eviction counters of the generated audio store"""
+    return await asyncio.to_thread(get_audio_store().stats)
+
+
+@app.get("/audio/{name}")
+async def get_audio(name: str):
+    """Serve a stored briefing from disk (marking it recently used)"""
+    path = await asyncio.to_thread(get_audio_store().open, name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    return FileResponse(path, media_type="audio/mpeg")
+
+
+async def gather_sources(topics, source_type: str):
+    """
+    Gather news and/or Reddit material for the topics.
+
+    In the single-pass pipeline (NEWS_PIPELINE_MODE=single_pass) the scrapers return
+    raw headlines and posts instead of per-topic summaries.
+
+    Returns:
+        tuple: (news_data, reddit_data)
+    """
+    single_pass = pipeline_mode() == SINGLE_PASS
+    results = {}
+    
+    # Scrape news if requested
+    if source_type in ["news", "both"]:
+        try:
+            news_scraper = NewsScraper(summarize=not single_pass)
+            results["news"] = await news_scraper.scrape_news(topics)
+        except Exception as e:
+            print(f"News scraping failed: {str(e)}")
+            results["news"] = {"news_analysis": {topic: f"News unavailable for {topic}" for topic in topics}}
+    
+    # Scrape Reddit if requested
+    if source_type in ["reddit", "both"]:
+        try:
+            results["reddit"] = await scrape_reddit_topics(topics)
+        except Exception as e:
+            print(f"Reddit scraping failed: {str(e)}")
+            results["reddit"] = {"reddit_analysis": {topic: f"Reddit discussions unavailable for {topic}" for topic in topics}}
+
+    # Generate news summary
+    news_data = results.get("news", {})
+    reddit_data = results.get("reddit", {})
+    
+    if not news_data and not reddit_data:
+        raise HTTPException(status_code=500, detail="No data sources available")
+    return news_data, reddit_data
+
+
+async def build_broadcast_script(topics, source_type: str) -> str:
+    """Gather material for the topics and write the broadcast script in one LLM call"""
+    news_data, reddit_data = await gather_sources(topics, source_type)
+
+    # The provider takes care of Gemini's shared rate limit itself; segments of
+    # topics already covered with the same material come from the LLM cache,
+    # only the other topics go into the call
+    news_summary = await generate_broadcast_news_async(
+        news_data=news_data,
+        reddit_data=reddit_data,
+        topics=topics,
+        raw_sources=pipeline_mode() == SINGLE_PASS
+    )
+
+    if not news_summary or len(news_summary.strip()) < 10:
+        raise HTTPException(status_code=500, detail="Failed to generate meaningful content")
+    return news_summary
+
+
 @app.post("/generate-news-audio")
 async def generate_news_audio(request: NewsRequest):
     try:
@@ -21,85 +138,36 @@ async def generate_news_audio(request: NewsRequest):
             raise HTTPException(status_code=500, detail="GEMINI_API_KEY not configured")
         if not os.getenv("ELEVEN_API_KEY"):
             raise HTTPException(status_code=500, detail="ELEVEN_API_KEY not configured")
-            
-        results = {}
-        
-        # Scrape news if requested
-        if request.source_type in ["news", "both"]:
-            try:
-                news_scraper = NewsScraper()
-                results["news"] = await news_scraper.scrape_news(request.topics)
-            except Exception as e:
-                print(f"News scraping failed: {str(e)}")
-                results["news"] = {"news_analysis": {topic: f"News unavailable for {topic}" for topic in request.topics}}
-        
-        # Scrape Reddit if requested
-        if request.source_type in ["reddit", "both"]:
-            try:
-                results["reddit"] = await scrape_reddit_topics(request.topics)
-            except Exception as e:
-                print(f"Reddit scraping failed: {str(e)}")
-                results["reddit"] = {"reddit_analysis": {topic: f"Reddit discussions unavailable for {topic}" for topic in request.topics}}
-
-        # Generate news summary
-        news_data = results.get("news", {})
-        reddit_data = results.get("reddit", {})
-        
-        if not news_data and not reddit_data:
-            raise HTTPException(status_code=500, detail="No data sources available")
-            
-        news_summary = generate_broadcast_news(
-            api_key=os.getenv("GEMINI_API_KEY"),
-            news_data=news_data,
-            reddit_data=reddit_data,
-            topics=request.topics
-        )
 
-        if not news_summary or len(news_summary.strip()) < 10:
-            raise HTTPException(status_code=500, detail="Failed to generate meaningful content")
+        news_summary = await build_broadcast_script(request.topics, request.source_type)
 
-        # Generate audio - try ElevenLabs first, fallback to gTTS
-        audio_path = None
-        
         # Create topic name for filename
         topic_name = "_".join(request.topics) if len(request.topics) <= 3 else f"{len(request.topics)}_topics"
-        
-        # Try ElevenLabs first
+
+        # Stream audio as it is synthesized - try ElevenLabs first, fallback to gTTS.
+        # gTTS is not a mid-stream fallback: its MP3 frames differ from ElevenLabs'.
+        # Each topic segment is chunked and cached on its own, so topics already
+        # spoken in earlier briefings are not synthesized again.
+        sources = []
         if os.getenv("ELEVEN_API_KEY") and os.getenv("ELEVEN_API_KEY") != 'your_elevenlabs_api_key_here':
-            try:
-                audio_path = text_to_audio_elevenlabs_sdk(
-                    text=news_summary,
-                    voice_id="JBFqnCBsd6RMkjVDRZzb",
-                    model_id="eleven_multilingual_v2",
-                    output_format="mp3_44100_128",
-                    output_dir="audio",
-                    topic_name=topic_name
-                )
-                print("✓ Used ElevenLabs for audio generation")
-            except Exception as e:
-                print(f"ElevenLabs failed: {str(e)}, falling back to gTTS")
-                audio_path = None
-        
-        # Fallback to gTTS if ElevenLabs fails
-        if not audio_path:
-            try:
-                audio_path = tts_to_audio(text=news_summary, language='en', topic_name=topic_name)
-                print("✓ Used gTTS for audio generation")
-            except Exception as e:
-                print(f"gTTS also failed: {str(e)}")
-                raise HTTPException(status_code=500, detail="Both audio services failed")
-
-        if audio_path and Path(audio_path).exists():
-            with open(audio_path, "rb") as f:
-                audio_bytes = f.read()
-
-            return Response(
-                content=audio_bytes,
-                media_type="audio/mpeg",
-                headers={"Content-Disposition": "attachment; filename=news-summary.mp3"}
-            )
-        else:
-            raise HTTPException(status_code=500, detail="Failed to generate audio file")
+            sources.append(("ElevenLabs", lambda: synthesize_briefing(news_summary, elevenlabs_voice())))
+        sources.append(("gTTS", lambda: synthesize_briefing(news_summary, gtts_voice('en'))))
+
+        # Optionally keep a copy in the audio store (AUDIO_DIR), written while the chunks go out
+        if persist_audio():
+            store = get_audio_store()
+            sources = [(name, lambda factory=factory: store.tee(factory(), topic_name)) for name, factory in sources]
+
+        try:
+            audio = await open_audio_stream(sources)
+        except RuntimeError:
+            raise HTTPException(status_code=500, detail="Both audio services failed")
+
+        return StreamingResponse(
+            audio,
+            media_type="audio/mpeg",
+            headers={"Content-Disposition": "attachment; filename=news-summary.mp3"}
+        )
     
     except HTTPException:
         raise
@@ -108,6 +176,52 @@ async def generate_news_audio(request: NewsRequest):
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+@app.post("/generate-news-audio/stream")
+async def stream_news_audio(request: NewsRequest):
+    """
+    Streaming variant of /generate-news-audio: the script is generated with Gemini
+    streaming, cut into sentences and spoken as they complete, and MP3 chunks are sent
+    as soon as they are synthesized. Time to first byte is the scraping time plus one
+    sentence instead of the whole pipeline.
+    """
+    if not os.getenv("GEMINI_API_KEY"):
+        raise HTTPException(status_code=500, detail="GEMINI_API_KEY not configured")
+
+    news_data, reddit_data = await gather_sources(request.topics, request.source_type)
+    raw_sources = pipeline_mode() == SINGLE_PASS
+    prompt = build_broadcast_prompt(news_data, reddit_data, request.topics, raw_sources)
+
+    # A cached script needs neither Gemini nor a token from its shared limiter;
+    # otherwise every model tried takes its own token
+    cached = await asyncio.to_thread(cached_gemini_text, prompt, BROADCAST_GENERATION_CONFIG)
+    attempt = gemini_attempts(asyncio.get_running_loop())
+
+    def script():
+        if cached is not None:
+            return iter([cached])
+        return stream_broadcast_news(
+            api_key=os.getenv("GEMINI_API_KEY"),
+            news_data=news_data,
+            reddit_data=reddit_data,
+            topics=request.topics,
+            raw_sources=raw_sources,
+            prompt=prompt,
+            lookup=False,
+            attempt=attempt
+        )
+
+    voices = []
+    if os.getenv("ELEVEN_API_KEY") and os.getenv("ELEVEN_API_KEY") != 'your_elevenlabs_api_key_here':
+        voices.append(elevenlabs_voice())
+    voices.append(gtts_voice('en'))
+
+    return StreamingResponse(
+        stream_speech(script, voices),
+        media_type="audio/mpeg",
+        headers={"Content-Disposition": "attachment; filename=news-summary.mp3"}
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -1,15 +1,30 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Response
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 import os
 from pathlib import Path
 from dotenv import load_dotenv
 
 from models import NewsRequest
-from utils import tts_to_audio, generate_news_urls_to_scrape, clean_html_to_text, extract_headlines
+from audio_store import get_audio_store, run_compaction
+from streaming import open_audio_stream
+from tts import synthesize_chunked
+from utils import gtts_voice, persist_audio, generate_news_urls_to_scrape, clean_html_to_text, extract_headlines
 
-app = FastAPI()
 load_dotenv()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Keep the audio store's manifest, quota and retention in shape in the background
+    compaction = asyncio.create_task(run_compaction(get_audio_store()))
+    yield
+    compaction.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
+
 def create_simple_news_script(topics, news_data=None, reddit_data=None):
     """Create a simple news script without AI when APIs are unavailable"""
     
@@ -59,24 +74,27 @@ async def generate_news_audio(request: NewsRequest):
         
         print(f"Generated script: {news_summary[:100]}...")
 
-        # Use free gTTS for audio generation
-        audio_path = tts_to_audio(
-            text=news_summary,
-            language='en'
-        )
-
-        if audio_path and Path(audio_path).exists():
-            with open(audio_path, "rb") as f:
-                audio_bytes = f.read()
+        # Use free gTTS for audio generation: sentence-aligned chunks are synthesized
+        # in parallel and streamed in order
+        gtts = gtts_voice('en')
+        source = lambda: synthesize_chunked(news_summary, gtts)
+        if persist_audio():
+            # Keep a copy in the audio store (AUDIO_DIR), written while the chunks go out
+            source = lambda: get_audio_store().tee(synthesize_chunked(news_summary, gtts))
 
-            return Response(
-                content=audio_bytes,
-                media_type="audio/mpeg",
-                headers={"Content-Disposition": "attachment; filename=news-summary.mp3"}
-            )
-        else:
+        try:
+            audio = await open_audio_stream([("gTTS", source)])
+        except RuntimeError:
             raise HTTPException(status_code=500, detail="Failed to generate audio file")
+
+        return StreamingResponse(
+            audio,
+            media_type="audio/mpeg",
+            headers={"Content-Disposition": "attachment; filename=news-summary.mp3"}
+        )
     
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Performance benchmarks for NewsNinja
+
+Usage:
+    python benchmark.py extract [--corpus DIR] [--repeat N]
+    python benchmark.py reddit TOPIC [TOPIC ...]
+    python benchmark.py startup [--repeat N] [--top N] [ENTRY_POINT ...]
+    python benchmark.py pipeline [--source news|reddit|both] [--repeat N] TOPIC [TOPIC ...]
+    python benchmark.py tts [--voice simulated|gtts|elevenlabs] [--topics N] [--parallelism N] [CHUNKS ...]
+
+Upstream-bound benchmarks can run offline against recorded fixtures with UPSTREAM_MODE=replay.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+
+def synthetic_news_page(n_articles: int, seed: int = 0) -> str:
+    """Build a Google News-like search page with n_articles headline blocks"""
+    rng = random.Random(seed)
+    outlets = ["Reuters", "BBC", "The Verge", "TechCrunch", "Bloomberg", "AP News"]
+    words = ["AI", "market", "climate", "policy", "launch", "study", "report", "growth",
+             "startup", "chip", "model", "energy", "court", "deal", "update", "record"]
+
+    parts = [
+        "<!DOCTYPE html><html><head><title>Google News</title>",
+        "<style>" + ".c-wiz{display:block}" * 200 + "</style>",
+        "<script>" + "var x = {a: 1, b: [1, 2, 3]};" * 500 + "</script>",
+        "</head><body><c-wiz><main>"
+    ]
+    for i in range(n_articles):
+        headline = " ".join(rng.choice(words) for _ in range(rng.randint(6, 14)))
+        parts.append(
+            f'<article class="IBr9hb"><div class="vr1PYe">{rng.choice(outlets)}</div>'
+            f'<a class="JtKRv" href="./read/{i}">{headline.capitalize()}</a>'
+            f'<div class="UOVeFe"><time datetime="2024-01-01">{rng.randint(1, 23)} hours ago</time>'
+            f'<span>By Staff Writer</span></div>'
+            f'<div class="sQ8Uhd"><button aria-label="More">More</button></div>'
+            f'<script>window.__d{i} = "{"z" * 200}";</script></article>'
+        )
+    parts.append("</main></c-wiz></body></html>")
+    return "".join(parts)
+
+
+def load_corpus(corpus_dir):
+    """Load saved pages from a directory, or synthesize pages of increasing size"""
+    if corpus_dir:
+        return {p.name: p.read_text(encoding="utf-8", errors="replace")
+                for p in sorted(Path(corpus_dir).glob("*.htm*"))}
+    return {f"synthetic_{n}.html": synthetic_news_page(n) for n in (50, 500, 5000)}
+
+
+def measure(func, arg, repeat: int):
+    """Return (median seconds, peak traced bytes, result) for func(arg)"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(arg)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak, result
+
+
+def bench_extract(args) -> int:
+    """Compare the BeautifulSoup and lxml streaming headline extractors"""
+    from headline_extractor import (
+        extract_headlines_soup,
+        extract_headlines_streaming,
+        fast_extractor_available
+    )
+
+    if not fast_extractor_available():
+        print("❌ lxml is not installed; the fast extractor is unavailable")
+        return 1
+
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        print(f"❌ No .html pages found in {args.corpus}")
+        return 1
+
+    print("📰 Headline extraction benchmark")
+    print("(peak memory is Python-heap only, measured with tracemalloc)")
+    print(f"{'page':<24}{'size':>10}{'soup ms':>10}{'soup MB':>10}{'lxml ms':>10}{'lxml MB':>10}{'same':>6}")
+
+    mismatches = 0
+    for name, html in corpus.items():
+        soup_t, soup_peak, soup_out = measure(extract_headlines_soup, html, args.repeat)
+        fast_t, fast_peak, fast_out = measure(extract_headlines_streaming, html, args.repeat)
+        same = soup_out == fast_out
+        mismatches += not same
+        print(
+            f"{name[:23]:<24}{len(html) / 1024:>8.0f}KB"
+            f"{soup_t * 1000:>10.1f}{soup_peak / 2**20:>10.2f}"
+            f"{fast_t * 1000:>10.1f}{fast_peak / 2**20:>10.2f}"
+            f"{'✓' if same else '❌':>6}"
+        )
+
+    if mismatches:
+        print(f"\n⚠️  {mismatches} page(s) produced different headlines")
+        return 1
+    print("\n✓ Both engines produced identical headlines on every page")
+    return 0
+
+
+def bench_reddit(args) -> int:
+    """Compare latency, tool calls and tokens of the ReAct agent and deterministic Reddit modes"""
+    from langchain_core.callbacks import BaseCallbackHandler
+    from langchain_mcp_adapters.tools import load_mcp_tools
+    from mcp import ClientSession
+    from mcp.client.stdio import stdio_client
+
+    import reddit_scraper
+    from cache import get_llm_cache
+    from rate_limit import DistributedLimiter, LocalBackend
+    from utils import llm_usage
+
+    class UsageCounter(BaseCallbackHandler):
+        def __init__(self):
+            self.tool_calls = 0
+            self.llm_calls = 0
+            self.tokens = 0
+
+        def on_tool_start(self, serialized, input_str, **kwargs):
+            self.tool_calls += 1
+
+        def on_llm_end(self, response, **kwargs):
+            self.llm_calls += 1
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                    if usage:
+                        self.tokens += usage.get("total_tokens", 0)
+
+    # Measure the pipelines themselves, not the shared MCP request budget or cached answers
+    reddit_scraper.mcp_limiter = DistributedLimiter("mcp-benchmark", 1000, 1, backend=LocalBackend())
+    get_llm_cache().ttl = 0
+
+    async def run():
+        rows = []
+        async with stdio_client(reddit_scraper.get_server_params()) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                tools = await load_mcp_tools(session)
+                agent = reddit_scraper.build_agent(tools)
+
+                for topic in args.topics:
+                    for mode in ("agent", "deterministic"):
+                        counter = UsageCounter()
+                        config = {"callbacks": [counter]}
+                        llm_usage(reset=True)
+                        start = time.perf_counter()
+                        try:
+                            if mode == "agent":
+                                await reddit_scraper.process_topic(agent, topic, config=config)
+                            else:
+                                await reddit_scraper.process_topic_deterministic(tools, topic, config=config)
+                            status = "ok"
+                        except Exception as e:
+                            status = type(e).__name__
+                        # The deterministic summary is a plain Gemini call, outside the LangChain callbacks
+                        usage = llm_usage(reset=True)
+                        counter.llm_calls += usage["calls"]
+                        counter.tokens += usage["prompt_tokens"] + usage["output_tokens"]
+                        rows.append((topic, mode, time.perf_counter() - start,
+                                     counter.tool_calls, counter.llm_calls, counter.tokens, status))
+        return rows
+
+    print("👽 Reddit analysis benchmark (live MCP server and Gemini)")
+    print(f"{'topic':<20}{'mode':<15}{'seconds':>9}{'tools':>7}{'LLM':>5}{'tokens':>9}  status")
+    for topic, mode, seconds, tools, llm_calls, tokens, status in asyncio.run(run()):
+        print(f"{topic[:19]:<20}{mode:<15}{seconds:>9.1f}{tools:>7}{llm_calls:>5}{tokens:>9}  {status}")
+    return 0
+
+
+ENTRY_POINTS = ("backend", "backend_fallback", "frontend")
+
+# Runs in a fresh interpreter: import one module, report wall time and peak RSS
+STARTUP_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+__import__(sys.argv[1])
+seconds = time.perf_counter() - start
+try:
+    import resource
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+except ImportError:  # Windows
+    rss_mb = float("nan")
+print(json.dumps({"seconds": seconds, "rss_mb": rss_mb, "modules": len(sys.modules)}))
+"""
+
+
+def probe_import(module: str) -> dict:
+    """Import a module in a fresh interpreter and return its startup measurements"""
+    result = subprocess.run(
+        [sys.executable, "-c", STARTUP_PROBE, module],
+        capture_output=True, text=True, cwd=Path(__file__).parent, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(module: str, top: int):
+    """Return (cumulative ms, name) of the slowest direct imports of a module via -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=Path(__file__).parent
+    )
+    direct = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # The entry point itself is not indented, its direct imports by two spaces
+        if name.startswith("   ") and not name.startswith("    ") and cumulative.strip().isdigit():
+            direct.append((int(cumulative) / 1000, name.strip()))
+    return sorted(direct, reverse=True)[:top]
+
+
+def bench_startup(args) -> int:
+    """Report import time and peak RSS of each entry point in fresh interpreters"""
+    baseline = [probe_import("os") for _ in range(args.repeat)]
+    base_rss = statistics.median(run["rss_mb"] for run in baseline)
+
+    print("🚀 Startup benchmark (fresh interpreter per run, median of runs)")
+    print(f"interpreter baseline: {base_rss:.1f} MB peak RSS")
+    print(f"{'entry point':<20}{'import s':>10}{'RSS MB':>10}{'+MB':>8}{'modules':>9}")
+
+    for module in args.entry_points:
+        try:
+            runs = [probe_import(module) for _ in range(args.repeat)]
+        except subprocess.CalledProcessError as e:
+            print(f"{module:<20}  ❌ import failed: {e.stderr.strip().splitlines()[-1]}")
+            continue
+        seconds = statistics.median(run["seconds"] for run in runs)
+        rss = statistics.median(run["rss_mb"] for run in runs)
+        modules = runs[0]["modules"]
+        print(f"{module:<20}{seconds:>10.2f}{rss:>10.1f}{rss - base_rss:>8.1f}{modules:>9}")
+        if args.top:
+            for ms, name in slowest_imports(module, args.top):
+                print(f"    {ms:>8.0f} ms  {name}")
+    return 0
+
+
+def bench_pipeline(args) -> int:
+    """Compare end-to-end latency and Gemini token usage of the two-pass and single-pass pipelines"""
+    import os
+
+    from backend import build_broadcast_script
+    from cache import get_llm_cache
+    from news_scraper import NewsScraper
+    from utils import SINGLE_PASS, TWO_PASS, llm_usage
+
+    # Measure real Gemini calls, not LLM response cache hits
+    get_llm_cache().ttl = 0
+
+    async def run():
+        if args.source in ("news", "both"):
+            # Fetch pages once so both modes see the same (warm) scrape cache
+            await NewsScraper(summarize=False).scrape_news(args.topics)
+
+        rows = []
+        for mode in (TWO_PASS, SINGLE_PASS):
+            os.environ["NEWS_PIPELINE_MODE"] = mode
+            timings = []
+            llm_usage(reset=True)
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                script = await build_broadcast_script(args.topics, args.source)
+                timings.append(time.perf_counter() - start)
+            usage = llm_usage(reset=True)
+            rows.append((mode, statistics.median(timings), usage, len(script)))
+        return rows
+
+    print(f"🧠 Summarization pipeline benchmark ({len(args.topics)} topics, source={args.source})")
+    print("(token counts cover Gemini calls made through utils; Reddit agent calls are not included)")
+    print(f"{'mode':<14}{'seconds':>9}{'LLM calls':>11}{'prompt tok':>12}{'output tok':>12}{'script chars':>14}")
+    for mode, seconds, usage, script_chars in asyncio.run(run()):
+        calls = usage["calls"] / args.repeat
+        prompt = usage["prompt_tokens"] / args.repeat
+        output = usage["output_tokens"] / args.repeat
+        print(f"{mode:<14}{seconds:>9.1f}{calls:>11.1f}{prompt:>12.0f}{output:>12.0f}{script_chars:>14}")
+    return 0
+
+
+def bench_tts(args) -> int:
+    """Wall-clock synthesis time of a briefing against the number of chunks it is split into"""
+    import math
+
+    from tts import synthesize_chunked
+    from utils import create_fallback_script, stream_elevenlabs_audio, stream_gtts_audio
+
+    script = create_fallback_script([f"topic {i + 1}" for i in range(args.topics)])
+
+    def simulated(text, previous):
+        # Roughly ElevenLabs: fixed request overhead plus time proportional to the text
+        time.sleep(args.overhead + len(text) * args.per_char)
+        yield b"\xff\xfb\x90\x00" + bytes(413)
+
+    voices = {
+        "simulated": simulated,
+        "gtts": lambda text, previous: stream_gtts_audio(text),
+        "elevenlabs": lambda text, previous: stream_elevenlabs_audio(text, previous_text=previous),
+    }
+    voice = voices[args.voice]
+
+    print(f"🔊 TTS synthesis benchmark ({len(script)} chars, voice={args.voice}, parallelism={args.parallelism})")
+    print(f"{'target':>8}{'chunks':>8}{'seconds':>9}{'KB':>8}")
+    for target in args.chunks:
+        max_chars = math.ceil(len(script) / target)
+        chunks = []
+
+        def counted(text, previous):
+            chunks.append(text)
+            return voice(text, previous)
+
+        start = time.perf_counter()
+        audio = b"".join(synthesize_chunked(script, counted, max_chars=max_chars, parallelism=args.parallelism))
+        elapsed = time.perf_counter() - start
+        print(f"{target:>8}{len(chunks):>8}{elapsed:>9.2f}{len(audio) / 1024:>8.0f}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NewsNinja performance benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    extract = subparsers.add_parser("extract", help="HTML-to-headlines extraction")
+    extract.add_argument("--corpus", help="Directory of saved Google News pages (*.html)")
+    extract.add_argument("--repeat", type=int, default=5, help="Timed runs per page")
+    extract.set_defaults(func=bench_extract)
+
+    reddit = subparsers.add_parser("reddit", help="ReAct agent vs deterministic Reddit analysis")
+    reddit.add_argument("topics", nargs="+", help="Topics to analyze")
+    reddit.set_defaults(func=bench_reddit)
+
+    startup = subparsers.add_parser("startup", help="Import time and memory of each entry point")
+    startup.add_argument("entry_points", nargs="*", default=list(ENTRY_POINTS), help="Modules to import")
+    startup.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per entry point")
+    startup.add_argument("--top", type=int, default=5, help="Slowest direct imports to list (0 = none)")
+    startup.set_defaults(func=bench_startup)
+
+    pipeline = subparsers.add_parser("pipeline", help="Two-pass vs single-pass summarization")
+    pipeline.add_argument("topics", nargs="+", help="Topics to brief")
+    pipeline.add_argument("--source", choices=["news", "reddit", "both"], default="news")
+    pipeline.add_argument("--repeat", type=int, default=1, help="Runs per mode")
+    pipeline.set_defaults(func=bench_pipeline)
+
+    tts = subparsers.add_parser("tts", help="Chunked parallel TTS synthesis time vs chunk count")
+    tts.add_argument("chunks", nargs="*", type=int, default=[1, 2, 4, 8, 16], help="Target chunk counts")
+    tts.add_argument("--voice", choices=["simulated", "gtts", "elevenlabs"], default="simulated")
+    tts.add_argument("--topics", type=int, default=5, help="Topics in the (fallback) script")
+    tts.add_argument("--parallelism", type=int, default=4, help="Concurrent TTS requests")
+    tts.add_argument("--overhead", type=float, default=0.3, help="Simulated seconds per request")
+    tts.add_argument("--per-char", type=float, default=0.001, help="Simulated seconds per character")
+    tts.set_defaults(func=bench_tts)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import asyncio
+import os
+from typing import Dict, Optional
+
+import httpx
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+from cache import get_scrape_cache, hash_key, normalize_url
+from rate_limit import get_limiter, parse_retry_after
+from replay import ReplayedUpstreamError, get_transport
+from resilience import get_breaker
+
+load_dotenv()
+
+BRIGHTDATA_API_URL = "https://api.brightdata.com/request"
+
+
+class BrightDataClient:
+    """
+    Async BrightData Web Unlocker client backed by a persistent, pooled HTTP session.
+
+    One instance is meant to live for the whole worker process so that TCP and TLS
+    handshakes with api.brightdata.com are paid once and then reused via keep-alive.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        zone: Optional[str] = None,
+        timeout: Optional[float] = None,
+        max_connections: Optional[int] = None,
+        keepalive_expiry: float = 30.0
+    ):
+        """
+        Args:
+            api_key: BrightData API key (defaults to BRIGHTDATA_API_KEY)
+            zone: Web Unlocker zone (defaults to BRIGHTDATA_WEB_UNLOCKER_ZONE)
+            timeout: Per-request timeout in seconds (defaults to BRIGHTDATA_TIMEOUT or 30)
+            max_connections: Connection cap for the BrightData host (defaults to
+                BRIGHTDATA_MAX_CONNECTIONS or 10)
+            keepalive_expiry: Seconds an idle pooled connection is kept open
+        """
+        self.api_key = api_key or os.getenv("BRIGHTDATA_API_KEY")
+        self.zone = zone or os.getenv("BRIGHTDATA_WEB_UNLOCKER_ZONE")
+        self.timeout = timeout or float(os.getenv("BRIGHTDATA_TIMEOUT", "30"))
+        self.max_connections = max_connections or int(os.getenv("BRIGHTDATA_MAX_CONNECTIONS", "10"))
+        self.keepalive_expiry = keepalive_expiry
+        self._client: Optional[httpx.AsyncClient] = None
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # The session is created lazily so it binds to the running event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                },
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=self.keepalive_expiry
+                )
+            )
+        return self._client
+
+    async def scrape(self, url: str, timeout: Optional[float] = None, use_cache: bool = True) -> str:
+        """
+        Scrape a URL through the BrightData Web Unlocker API.
+
+        Fresh pages are served from the scrape cache, and concurrent requests for the
+        same URL share a single upstream fetch. That fetch finishes (and fills the
+        cache) even if the caller that started it is cancelled.
+
+        Args:
+            url: Page to fetch
+            timeout: Optional override of the per-request timeout in seconds
+            use_cache: Read and populate the scrape cache
+
+        Returns:
+            str: Raw page content
+        """
+        if not use_cache:
+            return await self._fetch(url, timeout)
+
+        key = hash_key(normalize_url(url))
+        cache = get_scrape_cache()
+        # The disk tier compresses and scans SQLite, keep it off the event loop
+        cached = await asyncio.to_thread(cache.get_text, key)
+        if cached is not None:
+            return cached
+
+        # The fetch runs as its own task so that a caller going away (a cancelled
+        # request or topic) does not take the shared fetch down for the others
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch_and_cache(url, key, timeout))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._settle(key, done))
+        return await asyncio.shield(task)
+
+    async def _fetch_and_cache(self, url: str, key: str, timeout: Optional[float]) -> str:
+        text = await self._fetch(url, timeout)
+        await asyncio.to_thread(get_scrape_cache().set_text, key, text)
+        return text
+
+    def _settle(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved in case every caller was cancelled
+            task.exception()
+
+    async def _fetch(self, url: str, timeout: Optional[float]) -> str:
+        try:
+            with get_breaker("brightdata"):
+                result = await get_transport().call("brightdata", {"url": url}, self._post, url, timeout)
+                if result["status"] == 429:
+                    # Slow every worker down for as long as BrightData asks us to
+                    retry_after = parse_retry_after(result["retry_after"])
+                    await get_limiter("brightdata").report_throttled(retry_after)
+                if result["status"] >= 400:
+                    raise HTTPException(status_code=500, detail=f"BrightData error: HTTP {result['status']}")
+            await get_limiter("brightdata").report_success()
+            return result["text"]
+        except (httpx.HTTPError, ReplayedUpstreamError) as e:
+            raise HTTPException(status_code=500, detail=f"BrightData error: {str(e)}")
+
+    async def _post(self, url: str, timeout: Optional[float]) -> dict:
+        payload = {
+            "zone": self.zone,
+            "url": url,
+            "format": "raw"
+        }
+        response = await self._get_client().post(
+            BRIGHTDATA_API_URL,
+            json=payload,
+            timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT
+        )
+        return {
+            "status": response.status_code,
+            "retry_after": response.headers.get("Retry-After"),
+            "text": response.text
+        }
+
+    async def aclose(self):
+        """Close the pooled session"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+_default_client: Optional[BrightDataClient] = None
+
+
+def get_brightdata_client() -> BrightDataClient:
+    """Return the process-wide BrightData client, creating it on first use"""
+    global _default_client
+    if _default_client is None:
+        _default_client = BrightDataClient()
+    return _default_client
+
+
+async def close_brightdata_client():
+    """Close the process-wide BrightData client (call on app shutdown)"""
+    global _default_client
+    if _default_client is not None:
+        await _default_client.aclose()
+        _default_client = None
@@ -0,0 +1,495 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+CACHE_DIR = Path(os.getenv("NEWSNINJA_CACHE_DIR", ".cache"))
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalize a URL so equivalent requests share a cache entry.
+
+    Lowercases scheme and host, drops the fragment and sorts query parameters.
+    """
+    parts = urlsplit(url.strip())
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", query, ""))
+
+
+def hash_key(*parts: str) -> str:
+    """Build a content-addressed key from one or more strings"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class MemoryCache:
+    """
+    Thread-safe in-memory LRU cache with a per-entry TTL.
+
+    Bounded both by entry count and by the total size of the stored bytes values.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 1024, max_bytes: Optional[int] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()  # key -> (expires_at, value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value, _ = entry
+            if expires_at < time.time():
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: Optional[float] = None, expires_at: Optional[float] = None):
+        size = len(value) if isinstance(value, (bytes, str)) else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        if expires_at is None:
+            expires_at = time.time() + (self.ttl if ttl is None else ttl)
+
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (expires_at, value, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _remove(self, key: str):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+
+class DiskCache:
+    """
+    SQLite-backed cache of bytes values with TTL and size-bounded LRU eviction.
+
+    The database file can be shared by several worker processes on the same host.
+    """
+
+    def __init__(self, path, ttl: float, max_bytes: int):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " value BLOB NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shareable across threads, keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_with_expiry(self, key: str):
+        """Return (value, expires_at) or (None, None) when missing or stale"""
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value, expires_at FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None, None
+        value, expires_at = row
+        now = time.time()
+        if expires_at < now:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            return None, None
+        conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        return value, expires_at
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_with_expiry(key)[0]
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (key, value, len(value), expires_at, now)
+        )
+        self._evict(conn, now)
+
+    def delete(self, key: str):
+        self._connect().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        conn.execute("DELETE FROM entries WHERE expires_at < ?", (now,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used entries until we are back under the quota
+        freed = 0
+        doomed = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+            doomed.append((key,))
+            freed += size
+            if total - freed <= self.max_bytes:
+                break
+        conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+
+    def stats(self) -> dict:
+        count, total = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        return {"entries": count, "bytes": total}
+
+
+class TieredCache:
+    """
+    Two-level cache: a small in-memory LRU in front of a persistent disk tier.
+
+    Values are bytes and are zlib-compressed before being stored in either tier.
+    """
+
+    def __init__(self, memory: MemoryCache, disk: Optional[DiskCache] = None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str) -> Optional[bytes]:
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value, expires_at = self.disk.get_with_expiry(key)
+            if value is not None:
+                # Promote to memory but never beyond the disk entry's freshness
+                self.memory.set(key, value, expires_at=expires_at)
+        return zlib.decompress(value) if value is not None else None
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        compressed = zlib.compress(value, 6)
+        self.memory.set(key, compressed, ttl=ttl)
+        if self.disk is not None:
+            self.disk.set(key, compressed, ttl=ttl)
+
+    def get_text(self, key: str) -> Optional[str]:
+        value = self.get(key)
+        return value.decode("utf-8") if value is not None else None
+
+    def set_text(self, key: str, value: str, ttl: Optional[float] = None):
+        self.set(key, value.encode("utf-8"), ttl=ttl)
+
+    def delete(self, key: str):
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+
+_scrape_cache: Optional[TieredCache] = None
+
+
+def get_scrape_cache() -> TieredCache:
+    """
+    Return the process-wide cache for raw scraped pages.
+
+    Configured through SCRAPE_CACHE_TTL (seconds), SCRAPE_CACHE_MEMORY_MB and
+    SCRAPE_CACHE_DISK_MB (0 disables the on-disk tier).
+    """
+    global _scrape_cache
+    if _scrape_cache is None:
+        ttl = float(os.getenv("SCRAPE_CACHE_TTL", "600"))
+        memory_mb = float(os.getenv("SCRAPE_CACHE_MEMORY_MB", "64"))
+        disk_mb = float(os.getenv("SCRAPE_CACHE_DISK_MB", "256"))
+        memory = MemoryCache(ttl=ttl, max_entries=4096, max_bytes=int(memory_mb * 1024 * 1024))
+        disk = DiskCache(CACHE_DIR / "scrape.sqlite3", ttl=ttl, max_bytes=int(disk_mb * 1024 * 1024)) if disk_mb > 0 else None
+        _scrape_cache = TieredCache(memory, disk)
+    return _scrape_cache
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so prompts differing only in indentation or spacing share an entry"""
+    return " ".join(prompt.split())
+
+
+class LLMResponseCache:
+    """
+    Cache of LLM responses keyed by model name, normalized prompt hash and generation config.
+
+    Entries live in a TieredCache (memory LRU + SQLite file shared by workers on the
+    host). Each entry remembers how long the original call took so hits can report
+    the latency they saved. Counters are per process.
+    """
+
+    def __init__(self, cache: TieredCache, ttl: float):
+        self.cache = cache
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    @staticmethod
+    def key(model: str, prompt: str, generation_config: Optional[dict] = None) -> str:
+        prompt_hash = hash_key(normalize_prompt(prompt))
+        config = json.dumps(generation_config or {}, sort_keys=True, separators=(",", ":"))
+        return hash_key("llm", model, prompt_hash, config)
+
+    def _load(self, model: str, prompt: str, generation_config: Optional[dict]) -> Optional[dict]:
+        value = self.cache.get(self.key(model, prompt, generation_config))
+        return json.loads(value) if value is not None else None
+
+    def get(self, model: str, prompt: str, generation_config: Optional[dict] = None) -> Optional[dict]:
+        """Return the cached {"text", "latency", ...} entry, counting the hit or miss"""
+        if not self.enabled:
+            return None
+        entry = self._load(model, prompt, generation_config)
+        self._count(entry)
+        return entry
+
+    def get_any(self, models, prompt: str, generation_config: Optional[dict] = None) -> Optional[dict]:
+        """Like get(), for the first of several models with a fresh entry (counted as one lookup)"""
+        if not self.enabled:
+            return None
+        entry = None
+        for model in models:
+            entry = self._load(model, prompt, generation_config)
+            if entry is not None:
+                break
+        self._count(entry)
+        return entry
+
+    def _count(self, entry: Optional[dict]):
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.latency_saved += entry.get("latency", 0.0)
+
+    def set(self, model: str, prompt: str, generation_config: Optional[dict], text: str, latency: float, **extra):
+        if not self.enabled:
+            return
+        entry = {"text": text, "latency": latency, **extra}
+        self.cache.set(self.key(model, prompt, generation_config), json.dumps(entry).encode("utf-8"), ttl=self.ttl)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "latency_saved_seconds": round(self.latency_saved, 3),
+                "memory_entries": len(self.cache.memory),
+                "memory_bytes": self.cache.memory.size_bytes,
+            }
+        if self.cache.disk is not None:
+            stats.update({f"disk_{name}": value for name, value in self.cache.disk.stats().items()})
+        return stats
+
+
+_llm_cache: Optional[LLMResponseCache] = None
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """
+    Return the process-wide LLM response cache.
+
+    Configured through LLM_CACHE_TTL (seconds, 0 disables), LLM_CACHE_MEMORY_MB and
+    LLM_CACHE_DISK_MB (0 disables the shared on-disk tier).
+    """
+    global _llm_cache
+    if _llm_cache is None:
+        ttl = float(os.getenv("LLM_CACHE_TTL", "3600"))
+        memory_mb = float(os.getenv("LLM_CACHE_MEMORY_MB", "16"))
+        disk_mb = float(os.getenv("LLM_CACHE_DISK_MB", "64"))
+        memory = MemoryCache(ttl=ttl, max_entries=2048, max_bytes=int(memory_mb * 1024 * 1024))
+        disk = DiskCache(CACHE_DIR / "llm.sqlite3", ttl=ttl, max_bytes=int(disk_mb * 1024 * 1024)) if disk_mb > 0 else None
+        _llm_cache = LLMResponseCache(TieredCache(memory, disk), ttl=ttl)
+    return _llm_cache
+
+
+def normalize_tts_text(text: str) -> str:
+    """Unicode-normalize and collapse whitespace; case and punctuation are kept since they change the speech"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class TTSCache:
+    """
+    Content-addressed cache of synthesized speech.
+
+    Keys hash the normalized text together with voice, model, output format and
+    language. Each entry is stored once as <root>/<ab>/<key>.mp3 with a
+    <key>.json metadata file next to it, so every worker on the host shares it.
+    Files are written atomically. When the cache grows past max_bytes, the least
+    recently used entries are removed; a hit refreshes the file's mtime.
+
+    Writes keep a running byte total instead of scanning the tree, so the
+    directory is only listed when the total goes over quota. It is also
+    rescanned every RESCAN_INTERVAL seconds to pick up other workers' writes.
+    """
+
+    RESCAN_INTERVAL = 300.0
+
+    def __init__(self, root, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+        self._lock = threading.Lock()
+        self._bytes: Optional[int] = None  # Audio bytes under root as of the last scan, plus our writes
+        self._scanned_at = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(text: str, voice_id: str, model_id: str, output_format: str, language: str = "") -> str:
+        return hash_key("tts", normalize_tts_text(text), voice_id, model_id, output_format, language or "")
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.mp3"
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return cached audio for a key, counting the hit or miss"""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            audio = path.read_bytes()
+            os.utime(path)  # Recently used
+            meta = json.loads(path.with_suffix(".json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            audio, meta = None, {}
+        with self._lock:
+            if audio is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.latency_saved += meta.get("latency", 0.0)
+        return audio
+
+    def set(self, key: str, audio: bytes, latency: float, **meta):
+        """Store audio with its metadata (text, voice, model, format, language...)"""
+        if not self.enabled or not audio:
+            return
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            replaced = path.stat().st_size
+        except OSError:
+            replaced = 0
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        entry = {"bytes": len(audio), "latency": latency, "created_at": time.time(), **meta}
+        for target, data in ((path.with_suffix(".json"), json.dumps(entry).encode("utf-8")), (path, audio)):
+            tmp = target.with_name(target.name + suffix)
+            tmp.write_bytes(data)
+            os.replace(tmp, target)
+
+        with self._lock:
+            stale = self._bytes is None or time.monotonic() - self._scanned_at > self.RESCAN_INTERVAL
+            if not stale:
+                self._bytes += len(audio) - replaced
+            over = stale or self._bytes > self.max_bytes
+        if over:
+            self._evict()
+
+    def _entries(self):
+        for path in self.root.glob("*/*.mp3"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue  # Removed by another worker
+            yield stat.st_mtime, stat.st_size, path
+
+    def _evict(self):
+        """Rescan the tree, drop least recently used entries until under quota and reset the total"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            path.with_suffix(".json").unlink(missing_ok=True)
+            total -= size
+        with self._lock:
+            self._bytes, self._scanned_at = total, time.monotonic()
+
+    def stats(self) -> dict:
+        entries = list(self._entries()) if self.root.exists() else []
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "latency_saved_seconds": round(self.latency_saved, 3),
+                "entries": len(entries),
+                "bytes": sum(size for _, size, _ in entries),
+            }
+
+
+_tts_cache: Optional[TTSCache] = None
+
+
+def get_tts_cache() -> TTSCache:
+    """
+    Return the process-wide TTS audio cache, stored under CACHE_DIR/tts.
+
+    Bounded by TTS_CACHE_DISK_MB (default 512, 0 disables it).
+    """
+    global _tts_cache
+    if _tts_cache is None:
+        disk_mb = float(os.getenv("TTS_CACHE_DISK_MB", "512"))
+        _tts_cache = TTSCache(CACHE_DIR / "tts", max_bytes=int(disk_mb * 1024 * 1024))
+    return _tts_cache
@@ -0,0 +1,292 @@
+import hashlib
+import os
+import re
+from typing import List, Optional
+
+try:
+    from lxml import etree
+except ImportError:  # lxml is optional, fall back to the BeautifulSoup path
+    etree = None
+
+from models import Headline
+from utils import clean_html_to_text, extract_headlines
+
+# Tags whose contents BeautifulSoup's get_text() does not treat as text
+NON_TEXT_TAGS = {"script", "style", "template"}
+
+# Feed the parser in chunks so the page never needs a second full-size copy
+FEED_CHUNK_SIZE = 64 * 1024
+
+# Lines kept per headline block; title, outlet and time always come first
+MAX_BLOCK_LINES = 6
+
+
+class _HeadlineTarget:
+    """
+    lxml parser target that applies the "More"-delimited headline heuristic
+    while the page is being parsed, without building a document tree.
+
+    Text between two parser events corresponds to one string in
+    BeautifulSoup's get_text(separator="\\n"), so each buffered run of text is
+    split into lines exactly like utils.clean_html_to_text + utils.extract_headlines.
+    """
+
+    def __init__(self):
+        self.blocks: List[List[str]] = []
+        self._block: List[str] = []
+        self._buffer: List[str] = []
+        self._skip_depth = 0
+
+    def start(self, tag, attrib):
+        self._flush()
+        if tag in NON_TEXT_TAGS:
+            self._skip_depth += 1
+
+    def end(self, tag):
+        self._flush()
+        if tag in NON_TEXT_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def data(self, data):
+        if not self._skip_depth:
+            self._buffer.append(data)
+
+    def comment(self, text):
+        self._flush()
+
+    def pi(self, target, data=None):
+        self._flush()
+
+    def doctype(self, *args):
+        self._flush()
+
+    def close(self) -> List[List[str]]:
+        self._flush()
+        if self._block:
+            self.blocks.append(self._block)
+            self._block = []
+        return self.blocks
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        text = "".join(self._buffer)
+        self._buffer = []
+        for line in text.split("\n"):
+            line = line.strip()
+            if not line:
+                continue
+            if line == "More":
+                if self._block:
+                    self.blocks.append(self._block)
+                    self._block = []
+            elif len(self._block) < MAX_BLOCK_LINES:
+                self._block.append(line)
+
+
+def fast_extractor_available() -> bool:
+    """Whether the C-backed lxml extraction engine can be used"""
+    return etree is not None
+
+
+def extract_headlines_streaming(html_content: str) -> str:
+    """
+    Extract headlines from raw HTML in a single streaming pass with lxml.
+
+    Produces the same output as extract_headlines(clean_html_to_text(html_content)).
+
+    Args:
+        html_content: Raw HTML of a news search page
+
+    Returns:
+        str: Combined headlines separated by newlines
+    """
+    # First line of block is headline
+    return "\n".join(block[0] for block in _stream_blocks(html_content))
+
+
+def _stream_blocks(html_content: str) -> List[List[str]]:
+    target = _HeadlineTarget()
+    parser = etree.HTMLParser(target=target, recover=True, no_network=True)
+    for start in range(0, len(html_content), FEED_CHUNK_SIZE):
+        parser.feed(html_content[start:start + FEED_CHUNK_SIZE])
+    return parser.close()
+
+
+def _soup_blocks(html_content: str) -> List[List[str]]:
+    blocks, current = [], []
+    for line in clean_html_to_text(html_content).split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        if line == "More":
+            if current:
+                blocks.append(current)
+                current = []
+        elif len(current) < MAX_BLOCK_LINES:
+            current.append(line)
+    if current:
+        blocks.append(current)
+    return blocks
+
+
+def extract_headlines_soup(html_content: str) -> str:
+    """Extract headlines with the original BeautifulSoup html.parser path"""
+    return extract_headlines(clean_html_to_text(html_content))
+
+
+def extract_headlines_from_html(html_content: str, engine: Optional[str] = None) -> str:
+    """
+    Extract headlines from raw HTML using the configured engine.
+
+    Args:
+        html_content: Raw HTML of a news search page
+        engine: "fast" (lxml streaming) or "soup" (BeautifulSoup). Defaults to
+            HEADLINE_EXTRACTOR, and to "fast" whenever lxml is installed.
+
+    Returns:
+        str: Combined headlines separated by newlines
+    """
+    engine = engine or os.getenv("HEADLINE_EXTRACTOR", "fast")
+    if engine == "fast" and fast_extractor_available() and html_content:
+        return extract_headlines_streaming(html_content)
+    return extract_headlines_soup(html_content)
+
+
+RELATIVE_TIME_RE = re.compile(
+    r"^(\d+\s+(second|minute|hour|day|week|month|year)s?\s+ago|yesterday|just now|"
+    r"(mon|tues|wednes|thurs|fri|satur|sun)day|"
+    r"(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]* \d{1,2}(, \d{4})?)$",
+    re.IGNORECASE
+)
+
+
+def parse_headline_block(lines: List[str]) -> Headline:
+    """
+    Turn one "More"-delimited block into a structured headline record.
+
+    The first line is the title (as in extract_headlines); the first line that
+    looks like a relative timestamp is the publish time, and the first other
+    short line that is not a byline is taken as the outlet.
+    """
+    title, outlet, published = lines[0], None, None
+    for line in lines[1:]:
+        if published is None and RELATIVE_TIME_RE.match(line):
+            published = line
+        elif outlet is None and len(line) <= 40 and not line.lower().startswith("by "):
+            outlet = line
+    return Headline(title=title, outlet=outlet, published=published)
+
+
+def extract_headline_records(html_content: str, engine: Optional[str] = None) -> List[Headline]:
+    """
+    Extract structured headline records (title, outlet, relative time) from raw HTML.
+
+    Args:
+        html_content: Raw HTML of a news search page
+        engine: "fast" or "soup", see extract_headlines_from_html
+
+    Returns:
+        List[Headline]: One record per headline block, in page order
+    """
+    engine = engine or os.getenv("HEADLINE_EXTRACTOR", "fast")
+    if not html_content:
+        return []
+    if engine == "fast" and fast_extractor_available():
+        blocks = _stream_blocks(html_content)
+    else:
+        blocks = _soup_blocks(html_content)
+    return [parse_headline_block(block) for block in blocks]
+
+
+# MinHash signature layout: NUM_BANDS * ROWS_PER_BAND permutations
+NUM_BANDS = 16
+ROWS_PER_BAND = 4
+_MERSENNE_PRIME = (1 << 61) - 1
+_PERMUTATIONS = [
+    (int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") % _MERSENNE_PRIME | 1,
+     int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big") % _MERSENNE_PRIME)
+    for i in range(NUM_BANDS * ROWS_PER_BAND)
+]
+_OUTLET_SUFFIX_RE = re.compile(r"\s+[-|\u2013\u2014]\s+[^-|\u2013\u2014]{1,40}$")
+
+
+def _shingles(title: str) -> set:
+    # Syndicated copies often only differ by a trailing " - Outlet" suffix
+    tokens = re.findall(r"[a-z0-9]+", _OUTLET_SUFFIX_RE.sub("", title).lower())
+    return set(tokens) | {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+
+
+def _minhash(shingles: set) -> List[int]:
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big") for s in shingles]
+    if not hashes:
+        return [_MERSENNE_PRIME] * len(_PERMUTATIONS)
+    return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def _similarity(sig_a: List[int], sig_b: List[int]) -> float:
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / len(sig_a)
+
+
+def collapse_near_duplicates(headlines: List[Headline], threshold: Optional[float] = None) -> List[Headline]:
+    """
+    Collapse syndicated copies of the same story using MinHash over word shingles.
+
+    Candidate pairs come from LSH banding of the MinHash signatures and are merged
+    when their estimated Jaccard similarity reaches the threshold. From every
+    cluster the most representative record (highest mean similarity to the rest)
+    is kept, with `coverage` set to the cluster size.
+
+    Args:
+        headlines: Headline records in page order
+        threshold: Minimum Jaccard similarity (defaults to HEADLINE_DEDUP_THRESHOLD or 0.7)
+
+    Returns:
+        List[Headline]: One record per story, in order of first appearance
+    """
+    if threshold is None:
+        threshold = float(os.getenv("HEADLINE_DEDUP_THRESHOLD", "0.7"))
+    signatures = [_minhash(_shingles(h.title)) for h in headlines]
+
+    # Union-find over candidate pairs that share at least one LSH band
+    parent = list(range(len(headlines)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(NUM_BANDS):
+        buckets = {}
+        lo, hi = band * ROWS_PER_BAND, (band + 1) * ROWS_PER_BAND
+        for i, sig in enumerate(signatures):
+            buckets.setdefault(tuple(sig[lo:hi]), []).append(i)
+        for members in buckets.values():
+            for j in members[1:]:
+                if find(j) != find(members[0]) and _similarity(signatures[members[0]], signatures[j]) >= threshold:
+                    parent[find(j)] = find(members[0])
+
+    clusters = {}
+    for i in range(len(headlines)):
+        clusters.setdefault(find(i), []).append(i)
+
+    collapsed = []
+    for members in sorted(clusters.values(), key=lambda m: m[0]):
+        best = max(
+            members,
+            key=lambda i: (sum(_similarity(signatures[i], signatures[j]) for j in members if j != i), -i)
+        )
+        collapsed.append(headlines[best].model_copy(update={"coverage": len(members)}))
+    return collapsed
+
+
+def format_headlines(headlines: List[Headline]) -> str:
+    """Render headline records as prompt lines, noting stories covered by several outlets"""
+    lines = []
+    for headline in headlines:
+        if headline.coverage > 1:
+            lines.append(f"{headline.title} ({headline.coverage} sources)")
+        else:
+            lines.append(headline.title)
+    return "\n".join(lines)
@@ -0,0 +1,445 @@
+import asyncio
+import functools
+import math
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, ContextManager, Dict, Optional
+
+import httpx
+
+from cache import get_llm_cache
+from rate_limit import get_limiter, is_throttling_error
+from replay import get_transport
+from utils import (
+    BROADCAST_GENERATION_CONFIG,
+    BROADCAST_MODELS,
+    NEWS_SCRIPT_MODEL,
+    build_broadcast_prompt,
+    cached_gemini_text,
+    cached_segments,
+    create_fallback_script,
+    finish_broadcast,
+    generate_with_gemini,
+    news_script_prompt,
+    summarize_with_gemini_news_script,
+    summarize_with_ollama
+)
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_llm_executor() -> ThreadPoolExecutor:
+    """
+    Return the process-wide thread pool for blocking LLM SDK calls.
+
+    Bounded by LLM_MAX_WORKERS (default 8) so a burst of briefings queues for a
+    worker instead of spawning threads, and cannot starve asyncio.to_thread users.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("LLM_MAX_WORKERS", "8")),
+            thread_name_prefix="llm"
+        )
+    return _executor
+
+
+def llm_timeout() -> float:
+    """Seconds allowed for a single LLM call (LLM_TIMEOUT, default 60)"""
+    return float(os.getenv("LLM_TIMEOUT", "60"))
+
+
+async def run_llm(func: Callable, *args, deadline: Optional[float] = None, **kwargs):
+    """
+    Run a blocking LLM call in the LLM thread pool without blocking the event loop.
+
+    If the caller is cancelled or the deadline passes, the await ends immediately.
+    The worker thread cannot be interrupted, so the SDK calls also get an HTTP
+    timeout. That timeout frees the thread soon afterwards.
+
+    Args:
+        func: Blocking function to call
+        deadline: Seconds to wait before raising asyncio.TimeoutError (None waits forever)
+
+    Returns:
+        Whatever func returns
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(get_llm_executor(), functools.partial(func, *args, **kwargs))
+    return await asyncio.wait_for(future, deadline)
+
+
+def gemini_attempts(loop: asyncio.AbstractEventLoop) -> Callable[[], ContextManager]:
+    """
+    Build the `attempt` hook for utils' Gemini calls: every model attempt takes a
+    token from the shared "gemini" limiter and reports throttling or success to
+    it, so failover across models spends one token per real request.
+
+    The attempts run in worker threads; the limiter is driven on `loop`.
+    """
+    def on_loop(coro):
+        try:
+            future = asyncio.run_coroutine_threadsafe(coro, loop)
+        except RuntimeError:
+            coro.close()
+            raise RuntimeError("The event loop waiting for this Gemini call has closed")
+        return future.result()
+
+    @contextmanager
+    def attempt():
+        limiter = get_limiter("gemini")
+        on_loop(limiter.acquire())
+        try:
+            yield
+        except Exception as e:
+            if is_throttling_error(e):
+                on_loop(limiter.report_throttled())
+            raise
+        on_loop(limiter.report_success())
+
+    return attempt
+
+
+async def run_gemini(func: Callable, *args, **kwargs):
+    """
+    run_llm() for a utils Gemini function that accepts `attempt=`, taking a
+    "gemini" limiter token for each model it tries (see gemini_attempts()).
+
+    Callers look the prompt up in the LLM cache first, so only real Gemini
+    calls spend the budget.
+    """
+    return await run_llm(func, *args, attempt=gemini_attempts(asyncio.get_running_loop()), **kwargs)
+
+
+async def generate_with_gemini_async(
+    prompt: str,
+    generation_config: dict = None,
+    timeout: Optional[float] = None,
+    models=BROADCAST_MODELS,
+    api_key: Optional[str] = None
+) -> str:
+    """
+    Async generate_with_gemini(): cached answers come straight back, real calls go
+    through the "gemini" limiter, circuit breaker and model health registry.
+
+    Args:
+        prompt: Full prompt text
+        generation_config: Optional generation config dict
+        timeout: Seconds per Gemini attempt (default LLM_TIMEOUT)
+        models: Candidate models in order of preference
+        api_key: Gemini API key (defaults to GEMINI_API_KEY)
+
+    Returns:
+        str: Generated text
+    """
+    timeout = timeout or llm_timeout()
+    cached = await asyncio.to_thread(cached_gemini_text, prompt, generation_config, models)
+    if cached is not None:
+        return cached
+    return await run_gemini(
+        generate_with_gemini,
+        api_key or os.getenv("GEMINI_API_KEY"),
+        prompt,
+        generation_config,
+        timeout=timeout,
+        models=models,
+        lookup=False
+    )
+
+
+class LLMProvider(ABC):
+    """A backend that turns a prompt into text"""
+
+    name = "llm"
+
+    @abstractmethod
+    async def generate(self, prompt: str, generation_config: dict = None, timeout: Optional[float] = None) -> str:
+        """Return the model's answer to the prompt"""
+
+    async def aclose(self):
+        pass
+
+
+class GeminiProvider(LLMProvider):
+    """
+    Gemini with the model fallback chain, run in the LLM thread pool.
+
+    Cached answers are returned straight away. Real calls take a token from the
+    shared "gemini" limiter, so other providers never spend Gemini's budget.
+    """
+
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key
+
+    async def generate(self, prompt: str, generation_config: dict = None, timeout: Optional[float] = None) -> str:
+        return await generate_with_gemini_async(prompt, generation_config, timeout, api_key=self.api_key)
+
+
+class OllamaProvider(LLMProvider):
+    """
+    Any server speaking Ollama's /api/generate protocol, called over pooled async HTTP.
+
+    Unlike the Gemini SDK, these requests really stop when the awaiting task is cancelled.
+    Answers are kept in the LLM response cache like Gemini's, keyed by "ollama/<model>".
+    """
+
+    name = "ollama"
+
+    def __init__(self, host: Optional[str] = None, model: Optional[str] = None):
+        """
+        Args:
+            host: Server URL (defaults to OLLAMA_HOST or http://localhost:11434)
+            model: Model name (defaults to OLLAMA_MODEL or llama3.2)
+        """
+        self.host = (host or os.getenv("OLLAMA_HOST", "http://localhost:11434")).rstrip("/")
+        self.model = model or os.getenv("OLLAMA_MODEL", "llama3.2")
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Created lazily so it binds to the running event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(base_url=self.host)
+        return self._client
+
+    async def generate(self, prompt: str, generation_config: dict = None, timeout: Optional[float] = None) -> str:
+        config = generation_config or {}
+        options = {key: config[key] for key in ("temperature", "top_p", "top_k") if key in config}
+        if "max_output_tokens" in config:
+            options["num_predict"] = config["max_output_tokens"]
+        request = {"model": self.model, "prompt": prompt, "options": options, "stream": False}
+
+        cache = get_llm_cache()
+        cache_model = f"ollama/{self.model}"
+        cached = await asyncio.to_thread(cache.get, cache_model, prompt, generation_config)
+        if cached is not None:
+            return cached["text"]
+
+        async def post():
+            response = await self._get_client().post("/api/generate", json=request, timeout=timeout or llm_timeout())
+            response.raise_for_status()
+            return response.json()["response"]
+
+        start = time.perf_counter()
+        text = await get_transport().call("ollama", request, post)
+        await asyncio.to_thread(cache.set, cache_model, prompt, generation_config, text, time.perf_counter() - start)
+        return text
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class HedgedProvider(LLMProvider):
+    """
+    Sends each prompt to the primary provider and, if it has not answered within its
+    recent p95 latency (or has already failed), to the secondary provider as well.
+    The first successful answer wins and the other task is cancelled.
+
+    Cancelling only stops waiting. An Ollama request is really aborted, but a
+    Gemini request keeps running in its LLM worker thread until it answers or hits
+    its HTTP timeout. Until then it still uses Gemini quota and one of the
+    LLM_MAX_WORKERS threads, so every hedge can cost a full call on both sides.
+
+    Until `min_samples` primary latencies have been seen, `initial_delay` is used.
+    """
+
+    name = "hedged"
+
+    def __init__(
+        self,
+        primary: LLMProvider,
+        secondary: LLMProvider,
+        quantile: float = 0.95,
+        min_samples: int = 10,
+        initial_delay: float = 5.0,
+        window: int = 100
+    ):
+        self.primary = primary
+        self.secondary = secondary
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.latencies: Dict[str, deque] = {
+            primary.name: deque(maxlen=window),
+            secondary.name: deque(maxlen=window),
+        }
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for the primary before hedging: its recent latency quantile (nearest rank)"""
+        samples = sorted(self.latencies[self.primary.name])
+        if len(samples) < self.min_samples:
+            return self.initial_delay
+        return samples[max(0, math.ceil(self.quantile * len(samples)) - 1)]
+
+    async def _timed(self, provider: LLMProvider, *args) -> str:
+        start = time.perf_counter()
+        try:
+            text = await provider.generate(*args)
+        except asyncio.CancelledError:
+            # Lost the race; its time so far is a lower bound on its latency
+            self.latencies[provider.name].append(time.perf_counter() - start)
+            raise
+        self.latencies[provider.name].append(time.perf_counter() - start)
+        return text
+
+    async def generate(self, prompt: str, generation_config: dict = None, timeout: Optional[float] = None) -> str:
+        self.requests += 1
+        primary = asyncio.create_task(self._timed(self.primary, prompt, generation_config, timeout))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay())
+            if done and primary.exception() is None:
+                return primary.result()
+
+            error = primary.exception() if done else None
+            print(f"{self.primary.name} {'failed' if done else 'is slow'}, asking {self.secondary.name} too")
+            self.hedges += 1
+            secondary = asyncio.create_task(self._timed(self.secondary, prompt, generation_config, timeout))
+            tasks.append(secondary)
+
+            pending = {task for task in tasks if not task.done()}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is secondary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def aclose(self):
+        await self.primary.aclose()
+        await self.secondary.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_delay": round(self.hedge_delay(), 3),
+        }
+
+
+_provider: Optional[LLMProvider] = None
+
+
+def get_llm_provider() -> LLMProvider:
+    """
+    Return the process-wide provider used to write broadcasts (LLM_PROVIDER):
+
+    gemini  -> Gemini only (default)
+    ollama  -> a local Ollama-compatible server (OLLAMA_HOST, OLLAMA_MODEL)
+    hedged  -> Gemini, hedged to Ollama past Gemini's LLM_HEDGE_QUANTILE latency
+               (LLM_HEDGE_DELAY seconds until LLM_HEDGE_MIN_SAMPLES calls are seen)
+    """
+    global _provider
+    if _provider is None:
+        mode = os.getenv("LLM_PROVIDER", "gemini").lower()
+        if mode == "gemini":
+            _provider = GeminiProvider()
+        elif mode == "ollama":
+            _provider = OllamaProvider()
+        elif mode == "hedged":
+            _provider = HedgedProvider(
+                GeminiProvider(),
+                OllamaProvider(),
+                quantile=float(os.getenv("LLM_HEDGE_QUANTILE", "0.95")),
+                min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "10")),
+                initial_delay=float(os.getenv("LLM_HEDGE_DELAY", "5"))
+            )
+        else:
+            raise ValueError(f"Unknown LLM_PROVIDER: {mode}")
+    return _provider
+
+
+async def close_llm_provider():
+    """Close the provider's pooled connections (call on worker shutdown)"""
+    if _provider is not None:
+        await _provider.aclose()
+
+
+async def generate_broadcast_news_async(
+    news_data,
+    reddit_data,
+    topics,
+    raw_sources: bool = False,
+    timeout: Optional[float] = None,
+    provider: Optional[LLMProvider] = None
+) -> str:
+    """
+    Write the broadcast script with the configured LLM provider without blocking the event loop.
+
+    Like generate_broadcast_news(): cached topic segments are reused and the
+    other topics are written by one batched call, split per topic and cached.
+    The provider call gets `timeout` seconds per model (default LLM_TIMEOUT). If
+    it runs out of time or fails, the new topics get fallback text instead.
+
+    Args:
+        news_data: {"news_analysis": {topic: text}} from NewsScraper
+        reddit_data: {"reddit_analysis": {topic: text}} from the Reddit scraper
+        topics: Topics in broadcast order
+        raw_sources: The source texts are raw headlines and posts (single-pass pipeline)
+        timeout: Seconds per LLM call
+        provider: Provider to use instead of get_llm_provider()
+
+    Returns:
+        str: TTS-ready broadcast script
+    """
+    timeout = timeout or llm_timeout()
+    provider = provider or get_llm_provider()
+    try:
+        prompts, segments = await asyncio.to_thread(cached_segments, news_data, reddit_data, topics, raw_sources)
+        missing = [topic for topic in topics if segments[topic] is None]
+        script, latency = None, 0.0
+        if missing:
+            prompt = build_broadcast_prompt(news_data, reddit_data, missing, raw_sources)
+            start = time.perf_counter()
+            try:
+                script = await asyncio.wait_for(
+                    provider.generate(prompt, BROADCAST_GENERATION_CONFIG, timeout),
+                    timeout * len(BROADCAST_MODELS)
+                )
+                latency = time.perf_counter() - start
+            except asyncio.TimeoutError:
+                print("Broadcast generation timed out, using fallback segments")
+            except Exception as e:
+                print(f"Broadcast generation failed ({str(e)}), using fallback segments")
+        return await asyncio.to_thread(finish_broadcast, topics, prompts, segments, script, latency)
+    except Exception as e:
+        print(f"Broadcast generation failed ({str(e)}), using fallback script")
+        return create_fallback_script(topics)
+
+
+async def summarize_with_gemini_news_script_async(api_key: str, headlines: str, timeout: Optional[float] = None) -> str:
+    """
+    Async summarize_with_gemini_news_script(); raises asyncio.TimeoutError after `timeout` seconds.
+
+    Cached summaries are returned without waiting for the "gemini" limiter.
+    """
+    timeout = timeout or llm_timeout()
+    cached = await asyncio.to_thread(cached_gemini_text, news_script_prompt(headlines), None, [NEWS_SCRIPT_MODEL])
+    if cached is not None:
+        return cached
+    return await run_gemini(
+        summarize_with_gemini_news_script, api_key, headlines, timeout=timeout, lookup=False, deadline=timeout
+    )
+
+
+async def summarize_with_ollama_async(headlines, timeout: Optional[float] = None) -> str:
+    """Async summarize_with_ollama(); raises asyncio.TimeoutError after `timeout` seconds"""
+    timeout = timeout or llm_timeout()
+    return await run_llm(summarize_with_ollama, headlines, timeout=timeout, deadline=timeout)
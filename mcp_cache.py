@@ -0,0 +1,155 @@
+import asyncio
+import functools
+import json
+import os
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from cache import MemoryCache, hash_key, normalize_url
+
+# Per-tool freshness defaults in seconds; override with MCP_CACHE_TTL_<TOOL> (0 disables)
+DEFAULT_TOOL_TTLS = {
+    "search_engine": 900,
+    "scrape_as_markdown": 1800,
+}
+
+# Awaited before a call that misses the cache, so callers can take rate-limit
+# budget only for requests that actually reach the MCP server
+upstream_gate: ContextVar[Optional[Callable[[], Awaitable]]] = ContextVar("mcp_upstream_gate", default=None)
+
+
+def canonical_tool_args(args: dict) -> str:
+    """Encode tool arguments so equivalent calls share a cache entry"""
+    canonical = {}
+    for name, value in args.items():
+        if value is None:
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+            if name == "url":
+                value = normalize_url(value)
+        canonical[name] = value
+    return json.dumps(canonical, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def tool_ttl(name: str) -> float:
+    """Cache TTL for a tool: MCP_CACHE_TTL_<TOOL>, else its default, else MCP_CACHE_TTL"""
+    override = os.getenv(f"MCP_CACHE_TTL_{name.upper()}")
+    if override is not None:
+        return float(override)
+    return float(DEFAULT_TOOL_TTLS.get(name, os.getenv("MCP_CACHE_TTL", "600")))
+
+
+class MCPToolCache:
+    """
+    Memoizes MCP tool results keyed on tool name plus canonicalized arguments.
+
+    Results are stored as JSON text in a bounded in-memory LRU, so overlapping
+    searches and post fetches from concurrent requests are answered locally.
+    Concurrent identical calls share one upstream call; errors are never cached.
+    """
+
+    def __init__(self, cache: MemoryCache):
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def call(self, name: str, args: dict, func: Callable[[], Awaitable]):
+        """Return the cached result of func() for this tool call, or run it and cache it"""
+        ttl = tool_ttl(name)
+        if ttl <= 0:
+            return await self._call_upstream(func)
+
+        key = hash_key("mcp", name, canonical_tool_args(args))
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.hits += 1
+            return json.loads(cached)
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.hits += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._call_upstream(func)
+            try:
+                self.cache.set(key, json.dumps(result, ensure_ascii=False), ttl=ttl)
+            except (TypeError, ValueError):
+                pass  # Not plain content (e.g. a ToolMessage); hand it back uncached
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting on it
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    @staticmethod
+    async def _call_upstream(func: Callable[[], Awaitable]):
+        gate = upstream_gate.get()
+        if gate is not None:
+            await gate()
+        return await func()
+
+    def wrap(self, tool):
+        """Return a copy of a LangChain MCP tool whose calls go through this cache"""
+        if tool.coroutine is None:
+            return tool
+        original = tool.coroutine
+
+        @functools.wraps(original)
+        async def cached_call(runtime=None, **arguments):
+            result = await self.call(tool.name, arguments, lambda: original(runtime=runtime, **arguments))
+            if tool.response_format == "content_and_artifact" and isinstance(result, list):
+                # JSON turned the (content, artifact) tuple into a list
+                result = tuple(result)
+            return result
+
+        return tool.model_copy(update={"coroutine": cached_call})
+
+    def wrap_tools(self, tools: List) -> List:
+        return [self.wrap(tool) for tool in tools]
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.cache),
+            "bytes": self.cache.size_bytes,
+        }
+
+
+_tool_cache: Optional[MCPToolCache] = None
+
+
+def get_mcp_tool_cache() -> MCPToolCache:
+    """
+    Return the process-wide MCP tool result cache.
+
+    Bounded by MCP_CACHE_MAX_ENTRIES and MCP_CACHE_MEMORY_MB; per-tool TTLs come
+    from MCP_CACHE_TTL_<TOOL> (e.g. MCP_CACHE_TTL_SEARCH_ENGINE) or MCP_CACHE_TTL.
+    """
+    global _tool_cache
+    if _tool_cache is None:
+        memory_mb = float(os.getenv("MCP_CACHE_MEMORY_MB", "32"))
+        _tool_cache = MCPToolCache(MemoryCache(
+            ttl=float(os.getenv("MCP_CACHE_TTL", "600")),
+            max_entries=int(os.getenv("MCP_CACHE_MAX_ENTRIES", "2048")),
+            max_bytes=int(memory_mb * 1024 * 1024)
+        ))
+    return _tool_cache
+
+
+def cache_mcp_tools(tools: List) -> List:
+    """Wrap tools from load_mcp_tools() with the process-wide result cache"""
+    return get_mcp_tool_cache().wrap_tools(tools)
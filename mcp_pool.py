@@ -0,0 +1,197 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Callable, List, Optional
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from langchain_mcp_adapters.tools import load_mcp_tools
+
+
+class MCPPoolError(Exception):
+    """Raised when no pooled MCP session becomes available in time"""
+    pass
+
+
+class PooledSession:
+    """One long-lived MCP server subprocess with its initialized session, tools and agent"""
+
+    def __init__(self, member_id: int):
+        self.id = member_id
+        self.session: Optional[ClientSession] = None
+        self.tools: List = []
+        self.agent = None
+        self.ready = asyncio.Event()
+        self.restart = asyncio.Event()
+        self.leased = False
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def healthy(self) -> bool:
+        return self.ready.is_set() and not self.restart.is_set()
+
+
+class MCPSessionPool:
+    """
+    Warm pool of pre-initialized MCP sessions shared by concurrent requests.
+
+    Each member owns an `npx @brightdata/mcp` subprocess for the lifetime of the
+    app: the session is initialized, tools are loaded and the agent graph is built
+    once. Requests lease a member, use it exclusively and return it. Members whose
+    subprocess crashes or fails a health-check ping are respawned in the background.
+    """
+
+    def __init__(
+        self,
+        server_params: StdioServerParameters,
+        build_agent: Callable,
+        size: int = 2,
+        health_interval: float = 30.0,
+        lease_timeout: float = 60.0,
+        prepare_tools: Optional[Callable] = None
+    ):
+        """
+        Args:
+            server_params: How to launch the MCP server subprocess
+            build_agent: Called with the loaded tools to build the member's agent
+            size: Number of sessions kept warm
+            health_interval: Seconds between health-check pings of idle sessions
+            lease_timeout: Seconds lease() waits for a healthy session
+            prepare_tools: Optional wrapper applied to the loaded tools (e.g. a result cache)
+        """
+        self.server_params = server_params
+        self.build_agent = build_agent
+        self.size = size
+        self.health_interval = health_interval
+        self.lease_timeout = lease_timeout
+        self.prepare_tools = prepare_tools
+        self.members: List[PooledSession] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._health_task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @property
+    def started(self) -> bool:
+        return self._idle is not None and not self._closing
+
+    async def start(self):
+        """Spawn all members; they warm up in the background so app startup is not blocked"""
+        if self.started:
+            return
+        self._closing = False
+        self._idle = asyncio.Queue()
+        for member_id in range(self.size):
+            member = PooledSession(member_id)
+            member.task = asyncio.create_task(self._run_member(member))
+            self.members.append(member)
+            self._idle.put_nowait(member)
+        self._health_task = asyncio.create_task(self._health_loop())
+
+    async def close(self):
+        """Stop health checks and shut every MCP subprocess down"""
+        self._closing = True
+        if self._health_task is not None:
+            self._health_task.cancel()
+        for member in self.members:
+            member.restart.set()
+        await asyncio.gather(*(m.task for m in self.members if m.task), return_exceptions=True)
+        self.members = []
+        self._idle = None
+
+    async def _run_member(self, member: PooledSession):
+        # The stdio/session contexts must be entered and exited in the same task,
+        # so each member lives in its own task and is restarted from here
+        backoff = 1.0
+        while not self._closing:
+            try:
+                async with stdio_client(self.server_params) as (read, write):
+                    async with ClientSession(read, write) as session:
+                        await session.initialize()
+                        member.session = session
+                        tools = await load_mcp_tools(session)
+                        member.tools = self.prepare_tools(tools) if self.prepare_tools else tools
+                        member.agent = self.build_agent(member.tools)
+                        member.ready.set()
+                        print(f"✓ MCP session {member.id} ready")
+                        backoff = 1.0
+                        await member.restart.wait()
+            except Exception as e:
+                print(f"MCP session {member.id} crashed: {str(e)}")
+            finally:
+                member.ready.clear()
+                member.restart.clear()
+                member.session = None
+                member.agent = None
+
+            if not self._closing:
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+    async def _ping(self, member: PooledSession, timeout: float = 10.0) -> bool:
+        if not member.ready.is_set() or member.session is None:
+            return False
+        try:
+            await asyncio.wait_for(member.session.send_ping(), timeout=timeout)
+            return True
+        except Exception:
+            return False
+
+    async def _health_loop(self):
+        while not self._closing:
+            await asyncio.sleep(self.health_interval)
+            for member in self.members:
+                if member.leased or not member.ready.is_set():
+                    continue
+                if not await self._ping(member):
+                    print(f"MCP session {member.id} failed health check, respawning")
+                    member.restart.set()
+
+    @asynccontextmanager
+    async def lease(self):
+        """
+        Borrow a healthy session for exclusive use:
+
+            async with pool.lease() as member:
+                await member.agent.ainvoke(...)
+        """
+        if not self.started:
+            raise MCPPoolError("MCP session pool is not running")
+
+        try:
+            member = await asyncio.wait_for(self._idle.get(), timeout=self.lease_timeout)
+        except asyncio.TimeoutError:
+            raise MCPPoolError("Timed out waiting for an idle MCP session")
+
+        try:
+            try:
+                await asyncio.wait_for(self._wait_healthy(member), timeout=self.lease_timeout)
+            except asyncio.TimeoutError:
+                raise MCPPoolError(f"MCP session {member.id} did not become ready")
+
+            member.leased = True
+            try:
+                yield member
+            except Exception:
+                # A broken subprocess must not be handed to the next request
+                if not await self._ping(member):
+                    member.restart.set()
+                raise
+        finally:
+            member.leased = False
+            if self._idle is not None:
+                self._idle.put_nowait(member)
+
+    async def _wait_healthy(self, member: PooledSession):
+        while not member.healthy:
+            if member.restart.is_set():
+                # Still tearing down the old subprocess
+                await asyncio.sleep(0.1)
+            else:
+                await member.ready.wait()
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "ready": sum(m.healthy for m in self.members),
+            "leased": sum(m.leased for m in self.members),
+        }
+
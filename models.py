@@ -1,7 +1,14 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 
 class NewsRequest(BaseModel):
     topics: List[str]
-    source_type: str
\ No newline at end of file
+    source_type: str
+
+
+class Headline(BaseModel):
+    title: str
+    outlet: Optional[str] = None
+    published: Optional[str] = None
+    coverage: int = 1
@@ -1,55 +1,94 @@
 import asyncio
 import os
-from typing import Dict, List
+from typing import Dict, List, Optional
 
-from aiolimiter import AsyncLimiter
-from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+from tenacity import retry, retry_if_not_exception_type, stop_after_attempt, wait_random_exponential
 from dotenv import load_dotenv
 
+from brightdata_client import get_brightdata_client
+from headline_extractor import collapse_near_duplicates, extract_headline_records, format_headlines
+from llm import summarize_with_gemini_news_script_async
+from rate_limit import get_limiter
+from resilience import CircuitOpenError
 from utils import (
+    SINGLE_PASS,
     generate_news_urls_to_scrape,
-    scrape_with_brightdata,
-    clean_html_to_text,
-    extract_headlines,
-    summarize_with_gemini_news_script,
-    summarize_with_ollama
+    pipeline_mode
 )
 
 load_dotenv()
 
 
 class NewsScraper:
-    _rate_limiter = AsyncLimiter(5, 1)  # 5 requests/second
+    # Shared with every worker on the host (RATE_LIMIT_BRIGHTDATA, default 5 requests/second)
+    _rate_limiter = get_limiter("brightdata")
 
-    @retry(
+    def __init__(self, max_concurrency: Optional[int] = None, summarize: Optional[bool] = None):
+        """
+        Args:
+            max_concurrency: Maximum number of topics processed at once.
+                Defaults to NEWS_FETCH_CONCURRENCY (5). Use 1 for serial fetching.
+            summarize: Summarize each topic's headlines with Gemini. Defaults to
+                False in the single-pass pipeline, where raw headlines are returned.
+        """
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv("NEWS_FETCH_CONCURRENCY", "5"))
+        if summarize is None:
+            summarize = pipeline_mode() != SINGLE_PASS
+        self.max_concurrency = max(1, max_concurrency)
+        self.summarize = summarize
+
+    # Each topic's upstream calls are retried on their own with jittered backoff;
+    # an open circuit breaker is never retried so outages fail fast
+    _topic_retry = retry(
         stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=10)
+        wait=wait_random_exponential(multiplier=1, max=10),
+        retry=retry_if_not_exception_type(CircuitOpenError),
+        reraise=True
     )
+
+    @_topic_retry
+    async def _fetch_page(self, url: str) -> str:
+        # The shared limiter paces requests to BrightData across all topics
+        async with self._rate_limiter:
+            return await get_brightdata_client().scrape(url)
+
+    @_topic_retry
+    async def _summarize(self, headlines: str) -> str:
+        # Cache hits skip the shared "gemini" limiter; real calls wait for a token
+        return await summarize_with_gemini_news_script_async(
+            api_key=os.getenv("GEMINI_API_KEY"),
+            headlines=headlines
+        )
+
+    async def _scrape_topic(self, topic: str, semaphore: asyncio.Semaphore) -> str:
+        """Fetch, parse and summarize a single topic"""
+        async with semaphore:
+            try:
+                urls = generate_news_urls_to_scrape([topic])
+                search_html = await self._fetch_page(urls[topic])
+
+                # Syndicated copies of the same story only pad the Gemini prompt
+                records = collapse_near_duplicates(extract_headline_records(search_html))
+                headlines = format_headlines(records)
+
+                if headlines.strip():
+                    if not self.summarize:
+                        return headlines
+                    return await self._summarize(headlines)
+                return f"No headlines found for topic: {topic}"
+
+            except Exception as e:
+                print(f"Error scraping news for {topic}: {str(e)}")
+                return f"Unable to fetch news for {topic}. Please try again later."
+
     async def scrape_news(self, topics: List[str]) -> Dict[str, str]:
-        """Scrape and analyze news articles"""
-        results = {}
-        
-        for topic in topics:
-            async with self._rate_limiter:
-                try:
-                    urls = generate_news_urls_to_scrape([topic])
-                    search_html = scrape_with_brightdata(urls[topic])
-                    clean_text = clean_html_to_text(search_html)
-                    headlines = extract_headlines(clean_text)
-                    
-                    if headlines.strip():
-                        summary = summarize_with_gemini_news_script(
-                            api_key=os.getenv("GEMINI_API_KEY"),
-                            headlines=headlines
-                        )
-                        results[topic] = summary
-                    else:
-                        results[topic] = f"No headlines found for topic: {topic}"
-                        
-                except Exception as e:
-                    print(f"Error scraping news for {topic}: {str(e)}")
-                    results[topic] = f"Unable to fetch news for {topic}. Please try again later."
-                    
-                await asyncio.sleep(1)  # Avoid overwhelming news sites
+        """Scrape and analyze news articles for all topics concurrently"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        summaries = await asyncio.gather(
+            *(self._scrape_topic(topic, semaphore) for topic in topics)
+        )
 
+        # gather preserves input order, so results follow the requested topic order
+        results = {topic: summary for topic, summary in zip(topics, summaries)}
         return {"news_analysis": results}
@@ -0,0 +1,177 @@
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Gemini averages roughly four characters of English text per token
+CHARS_PER_TOKEN = 4
+
+# Headlines carried by several outlets, as rendered by format_headlines()
+COVERAGE_RE = re.compile(r"\((\d+) sources\)\s*$")
+
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap, offline token estimate (no count_tokens round trip)"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def allocate(demands: Dict[str, int], budget: int) -> Dict[str, int]:
+    """
+    Split a token budget max-min fairly: every key gets an equal share, and
+    shares that a key does not need are redistributed to the others.
+    """
+    allocation = {}
+    remaining = budget
+    pending = sorted(demands, key=demands.get)
+    for i, key in enumerate(pending):
+        share = remaining // (len(pending) - i)
+        allocation[key] = min(demands[key], share)
+        remaining -= allocation[key]
+    return allocation
+
+
+def split_units(text: str) -> List[str]:
+    """Split source material into droppable units: paragraphs, or lines for line-based text"""
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
+    if len(paragraphs) > 1:
+        return paragraphs
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def source_cost(text: str) -> int:
+    """Tokens needed to keep every unit of a source (one separator token per unit)"""
+    return sum(estimate_tokens(unit) + 1 for unit in split_units(text))
+
+
+def _rank(units: List[str]) -> List[int]:
+    # Stories covered by more outlets first, then the source's own order (relevance)
+    def key(i):
+        match = COVERAGE_RE.search(units[i])
+        return (-int(match.group(1)) if match else -1, i)
+    return sorted(range(len(units)), key=key)
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Cut text to the budget at a sentence boundary, or a word boundary if none fits"""
+    limit = budget * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    head = text[:limit]
+    sentences = SENTENCE_END_RE.split(head)
+    if len(sentences) > 1:
+        return " ".join(sentences[:-1])
+    return head.rsplit(" ", 1)[0] if " " in head else head
+
+
+def fit_to_budget(text: str, budget: int) -> Tuple[str, dict]:
+    """
+    Keep the highest-ranked units of a source that fit in `budget` tokens.
+
+    Returns:
+        tuple: (kept text in its original order, report with tokens/units kept and dropped)
+    """
+    units = split_units(text)
+    separator = "\n\n" if "\n\n" in text.strip() else "\n"
+    kept, used = set(), 0
+    for i in _rank(units):
+        cost = estimate_tokens(units[i]) + 1
+        if used + cost <= budget:
+            kept.add(i)
+            used += cost
+
+    kept_units = [units[i] for i in sorted(kept)]
+    if not kept_units and units and budget > 0:
+        # Not even the best unit fits whole; keep its beginning
+        kept_units = [truncate_to_tokens(units[_rank(units)[0]], budget)]
+
+    result = separator.join(kept_units)
+    report = {
+        "budget": budget,
+        "tokens": estimate_tokens(result),
+        "dropped_tokens": max(0, estimate_tokens(text) - estimate_tokens(result)),
+        "dropped_units": len(units) - len(kept_units),
+        "truncated": bool(kept_units) and not kept,
+    }
+    return result, report
+
+
+def topic_token_budget() -> int:
+    """Input tokens for one topic's source material (PROMPT_TOPIC_TOKEN_BUDGET)"""
+    return int(os.getenv("PROMPT_TOPIC_TOKEN_BUDGET", "2000"))
+
+
+def _fit_topic(texts: Dict[str, str], budget: int) -> Tuple[Dict[str, str], Dict[str, dict]]:
+    # Split the topic's budget fairly between its sources ("news", "reddit")
+    source_budgets = allocate({name: source_cost(text) for name, text in texts.items()}, budget)
+    fitted, report = {}, {}
+    for name, text in texts.items():
+        fitted[name], report[name] = fit_to_budget(text, source_budgets[name])
+    return fitted, report
+
+
+def budget_topics(
+    sources: Dict[str, Dict[str, str]],
+    budget: Optional[int] = None
+) -> Tuple[Dict[str, Dict[str, str]], Dict[str, Dict[str, dict]]]:
+    """
+    Fit each topic's source material into a fixed per-topic token budget.
+
+    A topic's fitted material depends only on its own sources, never on which
+    other topics are in the same briefing, so its prompt block is stable.
+
+    Args:
+        sources: {topic: {source name: text}} for the material that will be prompted
+        budget: Tokens per topic (default: PROMPT_TOPIC_TOKEN_BUDGET)
+
+    Returns:
+        tuple: ({topic: {source: fitted text}}, {topic: {source: report}})
+    """
+    if budget is None:
+        budget = topic_token_budget()
+    fitted, report = {}, {}
+    for topic, texts in sources.items():
+        fitted[topic], report[topic] = _fit_topic(texts, budget)
+    return fitted, report
+
+
+def budget_sources(
+    sources: Dict[str, Dict[str, str]],
+    budget: int
+) -> Tuple[Dict[str, Dict[str, str]], Dict[str, Dict[str, dict]]]:
+    """
+    Fit every topic's source material into a shared token budget.
+
+    The budget is split fairly between topics and then between each topic's
+    sources ("news", "reddit"), so one verbose topic cannot crowd out the rest.
+
+    Args:
+        sources: {topic: {source name: text}} for the material that will be prompted
+        budget: Total tokens for all material
+
+    Returns:
+        tuple: ({topic: {source: fitted text}}, {topic: {source: report}})
+    """
+    demands = {
+        topic: sum(source_cost(text) for text in texts.values())
+        for topic, texts in sources.items()
+    }
+    topic_budgets = allocate(demands, budget)
+
+    fitted, report = {}, {}
+    for topic, texts in sources.items():
+        fitted[topic], report[topic] = _fit_topic(texts, topic_budgets[topic])
+    return fitted, report
+
+
+def describe_drops(report: Dict[str, Dict[str, dict]]) -> List[str]:
+    """Human-readable lines for every source that lost material"""
+    lines = []
+    for topic, sources in report.items():
+        for name, entry in sources.items():
+            if entry["dropped_tokens"]:
+                how = "truncated" if entry["truncated"] else f"dropped {entry['dropped_units']} item(s)"
+                lines.append(
+                    f"{topic}/{name}: {how}, ~{entry['dropped_tokens']} tokens over its {entry['budget']}-token budget"
+                )
+    return lines
@@ -0,0 +1,379 @@
+import asyncio
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from dotenv import load_dotenv
+
+from cache import CACHE_DIR
+
+load_dotenv()
+
+# Default per-upstream budgets as "<requests>/<seconds>", overridable via RATE_LIMIT_<NAME>
+DEFAULT_BUDGETS = {
+    "brightdata": "5/1",
+    "gemini": "15/60",
+    "mcp": "1/15",
+}
+
+# Adaptive budget tuning: multiplicative decrease on throttling, additive recovery on success
+MIN_SCALE = 0.1
+DECREASE_FACTOR = 0.5
+RECOVERY_STEP = 0.05
+
+
+def _bucket_step(state: Optional[Tuple[float, float, float, float]], now: float,
+                 capacity: float, refill_rate: float, tokens: float):
+    """
+    Advance a token bucket and try to take `tokens` from it.
+
+    State is (tokens, updated_at, scale, blocked_until). The scale shrinks the
+    budget after the upstream throttles us and recovers as calls succeed.
+
+    Returns:
+        (new_state, wait): wait is 0 when the tokens were taken, otherwise the
+        number of seconds until enough tokens will be available
+    """
+    scale = 1.0
+    blocked_until = 0.0
+    if state is None:
+        available, updated = capacity, now
+    else:
+        available, updated, scale, blocked_until = state
+
+    if blocked_until > now:
+        return (available, updated, scale, blocked_until), blocked_until - now
+
+    bucket_capacity = max(1.0, capacity * scale)
+    rate = refill_rate * scale
+    available = min(bucket_capacity, available + (now - updated) * rate)
+    if available >= tokens:
+        return (available - tokens, now, scale, blocked_until), 0.0
+    return (available, now, scale, blocked_until), (tokens - available) / rate
+
+
+def _penalize_step(state, now: float, capacity: float, retry_after: Optional[float]):
+    available, updated, scale, blocked_until = state or (capacity, now, 1.0, 0.0)
+    scale = max(MIN_SCALE, scale * DECREASE_FACTOR)
+    if retry_after:
+        blocked_until = max(blocked_until, now + retry_after)
+    # Drain the bucket so no worker bursts straight back into the throttled upstream
+    return (0.0, now, scale, blocked_until)
+
+
+def _reward_step(state, now: float, capacity: float):
+    if state is None:
+        return None
+    available, updated, scale, blocked_until = state
+    return (available, updated, min(1.0, scale + RECOVERY_STEP), blocked_until)
+
+
+class LocalBackend:
+    """In-process bucket store; budgets are per worker"""
+
+    def __init__(self):
+        self._states: Dict[str, tuple] = {}
+
+    async def acquire(self, name, capacity, refill_rate, tokens) -> float:
+        state, wait = _bucket_step(self._states.get(name), time.time(), capacity, refill_rate, tokens)
+        self._states[name] = state
+        return wait
+
+    async def penalize(self, name, capacity, retry_after):
+        self._states[name] = _penalize_step(self._states.get(name), time.time(), capacity, retry_after)
+
+    async def reward(self, name, capacity):
+        self._states[name] = _reward_step(self._states.get(name), time.time(), capacity)
+
+    async def snapshot(self, name):
+        return self._states.get(name)
+
+
+class SQLiteBackend:
+    """
+    Bucket store shared by all processes on one host through a SQLite file.
+
+    Every update runs in a BEGIN IMMEDIATE transaction, so the file lock makes the
+    read-modify-write of a bucket atomic across workers.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            " name TEXT PRIMARY KEY, tokens REAL, updated_at REAL, scale REAL, blocked_until REAL)"
+        )
+        conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _update(self, name, step):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT tokens, updated_at, scale, blocked_until FROM buckets WHERE name = ?", (name,)
+            ).fetchone()
+            state, result = step(row)
+            if state is not None:
+                conn.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?, ?)", (name, *state))
+            conn.execute("COMMIT")
+            return result
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    async def acquire(self, name, capacity, refill_rate, tokens) -> float:
+        def step(row):
+            return _bucket_step(row, time.time(), capacity, refill_rate, tokens)
+        return await asyncio.to_thread(self._update, name, step)
+
+    async def penalize(self, name, capacity, retry_after):
+        def step(row):
+            return _penalize_step(row, time.time(), capacity, retry_after), None
+        await asyncio.to_thread(self._update, name, step)
+
+    async def reward(self, name, capacity):
+        def step(row):
+            return _reward_step(row, time.time(), capacity), None
+        await asyncio.to_thread(self._update, name, step)
+
+    async def snapshot(self, name):
+        return await asyncio.to_thread(self._update, name, lambda row: (None, row))
+
+
+class _RESPConnection:
+    """Minimal Redis protocol (RESP2) client over an asyncio stream"""
+
+    def __init__(self, host: str, port: int, db: int = 0, password: Optional[str] = None):
+        self.host, self.port, self.db, self.password = host, port, db, password
+        self._reader = None
+        self._writer = None
+
+    async def _ensure_connected(self):
+        if self._writer is None or self._writer.is_closing():
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+            if self.password:
+                await self.execute("AUTH", self.password)
+            if self.db:
+                await self.execute("SELECT", self.db)
+
+    async def execute(self, *args):
+        await self._ensure_connected()
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self._writer.write(b"".join(parts))
+        await self._writer.drain()
+        return await self._read_reply()
+
+    async def _read_reply(self):
+        line = (await self._reader.readline()).rstrip(b"\r\n")
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        prefix, rest = line[:1], line[1:]
+        if prefix == b"+":
+            return rest.decode()
+        if prefix == b"-":
+            raise RuntimeError(f"Redis error: {rest.decode()}")
+        if prefix == b":":
+            return int(rest)
+        if prefix == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2]
+        if prefix == b"*":
+            count = int(rest)
+            if count < 0:
+                return None
+            return [await self._read_reply() for _ in range(count)]
+        raise RuntimeError(f"Unexpected Redis reply: {line!r}")
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class RedisBackend:
+    """
+    Bucket store shared across hosts through any server speaking the Redis protocol.
+
+    Uses optimistic WATCH/MULTI/EXEC transactions on a hash per bucket, so it only
+    needs basic commands (no Lua) and works against lightweight local stand-ins.
+    """
+
+    def __init__(self, url: str, key_prefix: str = "newsninja:ratelimit:"):
+        parts = urlsplit(url)
+        db = int(parts.path.lstrip("/") or 0)
+        self._conn = _RESPConnection(parts.hostname or "localhost", parts.port or 6379, db, parts.password)
+        self._lock = asyncio.Lock()
+        self.key_prefix = key_prefix
+
+    async def _update(self, name, step, ttl: float):
+        key = self.key_prefix + name
+        async with self._lock:
+            try:
+                return await self._transact(key, step, ttl)
+            except Exception:
+                # Drop the connection so the next call starts from a clean protocol state
+                await self._conn.close()
+                raise
+
+    async def _transact(self, key, step, ttl: float):
+        while True:
+            await self._conn.execute("WATCH", key)
+            raw = await self._conn.execute("HMGET", key, "tokens", "updated_at", "scale", "blocked_until")
+            row = tuple(float(v) for v in raw) if raw and all(v is not None for v in raw) else None
+            state, result = step(row)
+            if state is None:
+                await self._conn.execute("UNWATCH")
+                return result
+            await self._conn.execute("MULTI")
+            await self._conn.execute(
+                "HSET", key, "tokens", repr(state[0]), "updated_at", repr(state[1]),
+                "scale", repr(state[2]), "blocked_until", repr(state[3])
+            )
+            await self._conn.execute("PEXPIRE", key, int(ttl * 1000))
+            if await self._conn.execute("EXEC") is not None:
+                return result
+            # Another worker touched the bucket first; re-read and try again
+
+    async def acquire(self, name, capacity, refill_rate, tokens) -> float:
+        ttl = max(60.0, capacity / refill_rate * 10)
+        return await self._update(
+            name, lambda row: _bucket_step(row, time.time(), capacity, refill_rate, tokens), ttl
+        )
+
+    async def penalize(self, name, capacity, retry_after):
+        await self._update(
+            name, lambda row: (_penalize_step(row, time.time(), capacity, retry_after), None),
+            max(3600.0, retry_after or 0)
+        )
+
+    async def reward(self, name, capacity):
+        await self._update(name, lambda row: (_reward_step(row, time.time(), capacity), None), 3600.0)
+
+    async def snapshot(self, name):
+        return await self._update(name, lambda row: (None, row), 0)
+
+    async def close(self):
+        await self._conn.close()
+
+
+class DistributedLimiter:
+    """
+    Token-bucket rate limiter for one upstream, backed by a shared bucket store.
+
+    Drop-in replacement for aiolimiter.AsyncLimiter:
+
+        async with get_limiter("brightdata"):
+            ...
+
+    Callers report throttling (HTTP 429, Retry-After, "Overloaded") through
+    report_throttled(), which pauses every worker for Retry-After seconds and
+    halves the budget; report_success() gradually restores it.
+    """
+
+    def __init__(self, name: str, max_rate: float, time_period: float = 1.0, backend=None):
+        self.name = name
+        self.max_rate = max_rate
+        self.time_period = time_period
+        self._backend = backend
+
+    @property
+    def backend(self):
+        # Resolved lazily so limiters can be created at import time
+        if self._backend is None:
+            self._backend = get_backend()
+        return self._backend
+
+    async def acquire(self, tokens: float = 1):
+        """
+        Wait until `tokens` can be taken from the bucket, then take them.
+
+        Raises:
+            ValueError: More tokens than the bucket can ever hold were requested
+        """
+        if tokens > max(1.0, self.max_rate):
+            raise ValueError(f"Cannot take {tokens} tokens from the {self.name} bucket of {self.max_rate}")
+        refill_rate = self.max_rate / self.time_period
+        while True:
+            wait = await self.backend.acquire(self.name, self.max_rate, refill_rate, tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(min(wait, self.time_period))
+
+    async def report_throttled(self, retry_after: Optional[float] = None):
+        print(f"Rate limited by {self.name}" + (f", backing off {retry_after:.0f}s" if retry_after else ""))
+        await self.backend.penalize(self.name, self.max_rate, retry_after)
+
+    async def report_success(self):
+        await self.backend.reward(self.name, self.max_rate)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+def is_throttling_error(error: Exception) -> bool:
+    """Whether an upstream error means we are being rate limited"""
+    message = str(error).lower()
+    return any(marker in message for marker in ("429", "quota", "rate limit", "resource exhausted", "overloaded"))
+
+
+def parse_retry_after(value) -> Optional[float]:
+    """Parse a Retry-After header given in seconds; HTTP dates are ignored"""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+_backend = None
+_limiters: Dict[str, DistributedLimiter] = {}
+
+
+def get_backend():
+    """
+    Return the process-wide bucket store selected by RATE_LIMIT_BACKEND:
+    "local", "sqlite" (default, shared by workers on this host) or a redis:// URL.
+    """
+    global _backend
+    if _backend is None:
+        setting = os.getenv("RATE_LIMIT_BACKEND", "sqlite")
+        if setting == "local":
+            _backend = LocalBackend()
+        elif setting.startswith("redis://"):
+            _backend = RedisBackend(setting)
+        else:
+            _backend = SQLiteBackend(CACHE_DIR / "ratelimit.sqlite3")
+    return _backend
+
+
+def get_limiter(name: str) -> DistributedLimiter:
+    """Return the limiter for an upstream, budgeted by RATE_LIMIT_<NAME> ("requests/seconds")"""
+    limiter = _limiters.get(name)
+    if limiter is None:
+        budget = os.getenv(f"RATE_LIMIT_{name.upper()}", DEFAULT_BUDGETS.get(name, "1/1"))
+        max_rate, time_period = (float(x) for x in budget.split("/"))
+        limiter = DistributedLimiter(name, max_rate, time_period)
+        _limiters[name] = limiter
+    return limiter
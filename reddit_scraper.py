@@ -1,13 +1,10 @@
-from typing import List
+from typing import List, Optional
 import os
 from utils import *
 from typing import List
 import asyncio
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
-from langchain_mcp_adapters.tools import load_mcp_tools
-from langgraph.prebuilt import create_react_agent
-from langchain_google_genai import ChatGoogleGenerativeAI
+import json
+import re
 from dotenv import load_dotenv
 import os
 from tenacity import (
@@ -16,10 +13,18 @@ from tenacity import (
     wait_exponential,
     retry_if_exception_type
 )
-from aiolimiter import AsyncLimiter
+from llm import generate_with_gemini_async
+from mcp_cache import cache_mcp_tools, upstream_gate
+from rate_limit import get_limiter
+from replay import get_transport
 from tenacity import retry, stop_after_attempt, wait_exponential
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from datetime import datetime, timedelta
 
+# mcp, langchain_mcp_adapters, langgraph and langchain_google_genai are imported on
+# first use so importing this module (and the API server) stays cheap
+
 
 load_dotenv()
 
@@ -32,33 +37,146 @@ class MCPOverloadedError(Exception):
     pass
 
 
-mcp_limiter = AsyncLimiter(1, 15)
+# Shared with every worker on the host (RATE_LIMIT_MCP, default 1 request/15 seconds)
+mcp_limiter = get_limiter("mcp")
 
-# Configure Gemini model for LangChain
-model = ChatGoogleGenerativeAI(
-    model="gemini-1.5-pro",
-    google_api_key=os.getenv("GEMINI_API_KEY"),
-    temperature=0.3
-)
+# The Reddit analysis model (agent and deterministic summary alike)
+REDDIT_MODEL = "gemini-1.5-pro"
+REDDIT_GENERATION_CONFIG = {"temperature": 0.3}
 
-server_params = StdioServerParameters(
-    command="npx",
-    env={
-        "API_TOKEN": os.getenv("API_TOKEN"),
-        "WEB_UNLOCKER_ZONE": os.getenv("WEB_UNLOCKER_ZONE"),
-    },
-    args=["@brightdata/mcp"],
-)
+# Built on first use by get_model() / get_server_params()
+model = None
+server_params = None
+
+
+def get_model():
+    """Return the Gemini chat model used for Reddit analysis"""
+    global model
+    if model is None:
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        model = ChatGoogleGenerativeAI(
+            model=REDDIT_MODEL,
+            google_api_key=os.getenv("GEMINI_API_KEY"),
+            temperature=REDDIT_GENERATION_CONFIG["temperature"]
+        )
+    return model
+
+
+def get_server_params():
+    """Return how to launch the BrightData MCP server"""
+    global server_params
+    if server_params is None:
+        from mcp import StdioServerParameters
+
+        server_params = StdioServerParameters(
+            command="npx",
+            env={
+                "API_TOKEN": os.getenv("API_TOKEN"),
+                "WEB_UNLOCKER_ZONE": os.getenv("WEB_UNLOCKER_ZONE"),
+            },
+            args=["@brightdata/mcp"],
+        )
+    return server_params
+
+
+def build_agent(tools):
+    """Build the ReAct agent for a set of (cached) MCP tools"""
+    from langgraph.prebuilt import create_react_agent
+
+    return create_react_agent(get_model(), tools)
+
+
+_mcp_pool = None
+
+
+def get_mcp_pool():
+    """Return the process-wide pool of warm MCP sessions (MCP_POOL_SIZE members)"""
+    global _mcp_pool
+    if _mcp_pool is None:
+        from mcp_pool import MCPSessionPool
+
+        _mcp_pool = MCPSessionPool(
+            get_server_params(),
+            build_agent=build_agent,
+            size=int(os.getenv("MCP_POOL_SIZE", "2")),
+            health_interval=float(os.getenv("MCP_HEALTH_INTERVAL", "30")),
+            lease_timeout=float(os.getenv("MCP_LEASE_TIMEOUT", "60")),
+            prepare_tools=prepare_mcp_tools
+        )
+    return _mcp_pool
+
+
+async def start_mcp_pool():
+    """Warm up the MCP session pool (called on app startup)"""
+    if get_transport().replaying or int(os.getenv("MCP_POOL_SIZE", "2")) <= 0:
+        return
+    await get_mcp_pool().start()
+
+
+async def stop_mcp_pool():
+    """Shut the MCP session pool down (called on app shutdown)"""
+    if _mcp_pool is not None:
+        await _mcp_pool.close()
+
+
+# The running topic's REDDIT_TOPIC_TIMEOUT, set by scrape_reddit_topics
+_topic_deadline: ContextVar[Optional[asyncio.Timeout]] = ContextVar("reddit_topic_deadline", default=None)
+
+
+@asynccontextmanager
+async def _deadline_paused():
+    """
+    Stop the running topic's timeout clock while it waits rather than works
+    (queued for an mcp_limiter token, or backing off between retries), so topics
+    late in the 1-per-15s queue are not timed out before they ever reach MCP.
+    """
+    deadline = _topic_deadline.get()
+    if deadline is None or deadline.when() is None or deadline.expired():
+        yield
+        return
+    loop = asyncio.get_running_loop()
+    remaining = deadline.when() - loop.time()
+    deadline.reschedule(None)
+    try:
+        yield
+    finally:
+        deadline.reschedule(loop.time() + remaining)
+
+
+async def _backoff_sleep(seconds: float):
+    async with _deadline_paused():
+        await asyncio.sleep(seconds)
+
+
+class _TopicPermit:
+    """
+    Takes the topic's mcp_limiter token on its first tool call that misses the
+    MCP tool cache, so topics answered entirely from cache skip the limiter.
+    """
+
+    def __init__(self):
+        self.acquired = False
+        self._lock = asyncio.Lock()
+
+    async def __call__(self):
+        async with self._lock:
+            if not self.acquired:
+                async with _deadline_paused():
+                    await mcp_limiter.acquire()
+                self.acquired = True
 
 
 @retry(
     stop=stop_after_attempt(3),
     wait=wait_exponential(multiplier=1, min=15, max=60),
     retry=retry_if_exception_type(MCPOverloadedError),
-    reraise=True
+    reraise=True,
+    sleep=_backoff_sleep
 )
-async def process_topic(agent, topic: str):
-    async with mcp_limiter:
+async def process_topic(agent, topic: str, config: Optional[dict] = None):
+    gate = upstream_gate.set(_TopicPermit())
+    try:
         messages = [
             {
                 "role": "system",
@@ -79,29 +197,278 @@ async def process_topic(agent, topic: str):
             }                   
         ]
         
-        try:
-            response = await agent.ainvoke({"messages": messages})
+        # Every tool call costs two graph steps (model turn + tool node), plus the final answer
+        run_config = {"recursion_limit": 2 * reddit_step_budget() + 1, **(config or {})}
+
+        async def run_agent():
+            response = await agent.ainvoke({"messages": messages}, config=run_config)
             return response["messages"][-1].content
+
+        try:
+            # Keyed on the topic only: the prompt embeds today's date
+            return await get_transport().call("mcp", {"agent": "reddit_analysis", "topic": topic}, run_agent)
         except Exception as e:
             if "Overloaded" in str(e):
+                await mcp_limiter.report_throttled()
                 raise MCPOverloadedError("Service overloaded")
             else:
                 raise
+    finally:
+        upstream_gate.reset(gate)
+
+
+
+class StepBudgetExceeded(Exception):
+    """Raised when a Reddit topic would need more tool calls than its step budget"""
+    pass
+
+
+def reddit_step_budget() -> int:
+    """Maximum MCP tool calls per topic (REDDIT_STEP_BUDGET)"""
+    return int(os.getenv("REDDIT_STEP_BUDGET", "5"))
+
+
+REDDIT_POST_URL_RE = re.compile(
+    r"https?://(?:www\.|old\.)?reddit\.com/r/(\w+)/comments/(\w+)(?:/[^\s)\]\"'<>]*)?"
+)
+
+
+def _tool_text(result) -> str:
+    """Flatten an MCP tool result (string or list of content blocks) into text"""
+    if isinstance(result, str):
+        return result
+    if isinstance(result, list):
+        return "\n".join(
+            block.get("text", "") if isinstance(block, dict) else str(block) for block in result
+        )
+    return str(result)
+
+
+def _parse_reddit_post(raw: str, max_comments: int = 5) -> Optional[dict]:
+    """Parse a Reddit post .json payload (post listing + comment listing)"""
+    start, end = raw.find("["), raw.rfind("]")
+    if start < 0 or end <= start:
+        return None
+    try:
+        listings = json.loads(raw[start:end + 1])
+        post = listings[0]["data"]["children"][0]["data"]
+    except (ValueError, LookupError, TypeError):
+        return None
 
+    comments = []
+    if len(listings) > 1:
+        for child in listings[1].get("data", {}).get("children", []):
+            data = child.get("data", {})
+            if child.get("kind") == "t1" and data.get("body"):
+                comments.append((data.get("score", 0), data["body"][:500]))
+    comments.sort(key=lambda c: c[0], reverse=True)
+
+    return {
+        "title": post.get("title", ""),
+        "subreddit": post.get("subreddit", ""),
+        "text": (post.get("selftext") or "")[:2000],
+        "score": post.get("score", 0),
+        "created_utc": post.get("created_utc"),
+        "comments": [body for _, body in comments[:max_comments]],
+    }
+
+
+# MCP tools process_topic_deterministic() calls by name
+DETERMINISTIC_TOOLS = ("search_engine", "scrape_as_markdown")
+
+
+def missing_deterministic_tools(tools) -> List[str]:
+    """Names in DETERMINISTIC_TOOLS that the loaded MCP tools do not offer"""
+    names = {tool.name for tool in tools}
+    return [name for name in DETERMINISTIC_TOOLS if name not in names]
+
+
+def prepare_mcp_tools(tools):
+    """
+    Set freshly loaded MCP tools up for use: wrap them in the result cache, and warn
+    when REDDIT_MODE=deterministic cannot run on them (those topics use the agent).
+    """
+    missing = missing_deterministic_tools(tools)
+    if missing and reddit_mode() == "deterministic":
+        print(f"MCP server has no {', '.join(missing)} tool, Reddit topics will use the agent pipeline")
+    return cache_mcp_tools(tools)
+
+
+class _ToolRunner:
+    """Calls MCP tools by name through the upstream transport while enforcing the step budget"""
+
+    def __init__(self, tools, budget: int, config: Optional[dict] = None):
+        self.tools = {tool.name: tool for tool in (tools or [])}
+        self.budget = budget
+        self.used = 0
+        self.config = config
+
+    async def call(self, name: str, args: dict) -> str:
+        if self.used >= self.budget:
+            raise StepBudgetExceeded(f"Tool-call budget of {self.budget} exhausted")
+        self.used += 1
+
+        async def invoke():
+            if name not in self.tools:
+                raise RuntimeError(f"MCP server has no {name} tool")
+            return _tool_text(await self.tools[name].ainvoke(args, config=self.config))
+
+        return await get_transport().call("mcp", {"tool": name, "args": args}, invoke)
+
+
+def _format_posts(posts: List[dict]) -> str:
+    blocks = []
+    for i, post in enumerate(posts, 1):
+        block = f"POST {i} (r/{post['subreddit']}, score {post['score']}): {post['title']}"
+        if post["text"]:
+            block += f"\n{post['text']}"
+        if post["comments"]:
+            block += "\nTop comments:\n" + "\n".join(f"- {c}" for c in post["comments"])
+        blocks.append(block)
+    return "\n\n".join(blocks)
+
+
+@retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=1, min=15, max=60),
+    retry=retry_if_exception_type(MCPOverloadedError),
+    reraise=True,
+    sleep=_backoff_sleep
+)
+async def process_topic_deterministic(
+    tools, topic: str, config: Optional[dict] = None, summarize: bool = True
+) -> str:
+    """
+    Analyze a topic with a fixed pipeline instead of the ReAct agent:
+    search -> fetch top-N posts -> drop posts before the two-week cutoff -> one summary call.
+
+    At most REDDIT_STEP_BUDGET tool calls and exactly one Gemini call are made per
+    topic, and the Gemini call is skipped when the LLM cache already has the answer.
+    With summarize=False (single-pass pipeline) the formatted posts are returned
+    as-is and no LLM call is made.
+    """
+    top_n = int(os.getenv("REDDIT_TOP_POSTS", "2"))
+    runner = _ToolRunner(tools, reddit_step_budget(), config)
+    cutoff = two_weeks_ago.timestamp()
+
+    gate = upstream_gate.set(_TopicPermit())
+    try:
+        try:
+            results = await runner.call(
+                "search_engine", {"query": f"site:reddit.com {topic} after:{two_weeks_ago_str}", "engine": "google"}
+            )
+
+            candidates = []
+            for match in REDDIT_POST_URL_RE.finditer(results):
+                subreddit, post_id = match.groups()
+                url = f"https://www.reddit.com/r/{subreddit}/comments/{post_id}/.json"
+                if url not in candidates:
+                    candidates.append(url)
+
+            posts = []
+            while candidates and len(posts) < top_n and runner.used < runner.budget:
+                batch_size = min(top_n - len(posts), runner.budget - runner.used, len(candidates))
+                batch, candidates = candidates[:batch_size], candidates[batch_size:]
+                pages = await asyncio.gather(
+                    *(runner.call("scrape_as_markdown", {"url": url}) for url in batch)
+                )
+                for page in pages:
+                    post = _parse_reddit_post(page)
+                    if post and (post["created_utc"] is None or post["created_utc"] >= cutoff):
+                        posts.append(post)
+        except Exception as e:
+            if "Overloaded" in str(e):
+                await mcp_limiter.report_throttled()
+                raise MCPOverloadedError("Service overloaded")
+            raise
+    finally:
+        upstream_gate.reset(gate)
+
+    if not posts:
+        return f"No recent Reddit discussions found for {topic}"
+    if not summarize:
+        return _format_posts(posts)
+
+    prompt = f"""You are a Reddit analysis expert. Analyze these Reddit posts about '{topic}'.
+Provide a comprehensive summary including:
+- Main discussion points
+- Key opinions expressed
+- Any notable trends or patterns
+- Summarize the overall narrative, discussion points and also quote interesting comments without mentioning names
+- Overall sentiment (positive/neutral/negative)
+
+{_format_posts(posts)}"""
+
+    # Same path as every other Gemini call: LLM cache, shared limiter, breaker, model health
+    return await generate_with_gemini_async(prompt, REDDIT_GENERATION_CONFIG, models=[REDDIT_MODEL])
+
+
+def reddit_mode() -> str:
+    """Reddit analysis mode: "agent" (ReAct agent, default) or "deterministic" (REDDIT_MODE)"""
+    return os.getenv("REDDIT_MODE", "agent")
+
+
+async def _analyze_topics(topics: List[str], analyze) -> dict[str, dict]:
+    """
+    Run analyze(topic) for every topic concurrently and keep whatever finishes.
+
+    Pacing comes from mcp_limiter and the number of available sessions; a topic
+    that fails or spends more than REDDIT_TOPIC_TIMEOUT seconds working (time
+    queued for the limiter or backing off is not counted) gets a placeholder
+    instead of discarding the other topics' results.
+    """
+    async def guarded(topic):
+        try:
+            return await analyze(topic)
+        except asyncio.TimeoutError:
+            print(f"Reddit analysis for {topic} timed out")
+        except Exception as e:
+            print(f"Reddit analysis for {topic} failed: {str(e)}")
+        return f"Reddit discussions unavailable for {topic}"
+
+    summaries = await asyncio.gather(*(guarded(topic) for topic in topics))
+    return {"reddit_analysis": dict(zip(topics, summaries))}
 
 
 async def scrape_reddit_topics(topics: List[str]) -> dict[str, dict]:
-    """Process list of topics and return analysis results"""
-    async with stdio_client(server_params) as (read, write):
+    """Process list of topics concurrently and return analysis results"""
+    timeout = float(os.getenv("REDDIT_TOPIC_TIMEOUT", "120"))
+
+    deterministic = reddit_mode() == "deterministic"
+    # The agent always summarizes; the deterministic path can hand raw posts to the broadcast call
+    summarize = pipeline_mode() != SINGLE_PASS
+
+    async def run(agent, tools, topic):
+        # Only the topic's own work counts: limiter queueing and retry backoff pause the clock
+        async with asyncio.timeout(timeout) as deadline:
+            _topic_deadline.set(deadline)
+            # Replays have no tools; live sessions need the ones the fixed pipeline calls
+            if deterministic and (tools is None or not missing_deterministic_tools(tools)):
+                return await process_topic_deterministic(tools, topic, summarize=summarize)
+            return await process_topic(agent, topic)
+
+    if get_transport().replaying:
+        # Recorded answers need no MCP server or Gemini client
+        return await _analyze_topics(topics, lambda topic: run(None, None, topic))
+
+    pool = _mcp_pool
+    if pool is not None and pool.started:
+        async def analyze_with_pool(topic):
+            # Waiting for a free session does not count against the topic timeout
+            async with pool.lease() as member:
+                return await run(member.agent, member.tools, topic)
+
+        return await _analyze_topics(topics, analyze_with_pool)
+
+    # No warm pool (e.g. called outside the API server): share a one-off session
+    from mcp import ClientSession
+    from mcp.client.stdio import stdio_client
+    from langchain_mcp_adapters.tools import load_mcp_tools
+
+    async with stdio_client(get_server_params()) as (read, write):
         async with ClientSession(read, write) as session:
             await session.initialize()
-            tools = await load_mcp_tools(session)
-            agent = create_react_agent(model, tools)
-            
-            reddit_results = {}
-            for topic in topics:
-                summary = await process_topic(agent, topic)
-                reddit_results[topic] = summary
-                await asyncio.sleep(5)  # Maintain rate limiting
-                
-            return {"reddit_analysis": reddit_results}
\ No newline at end of file
+            tools = prepare_mcp_tools(await load_mcp_tools(session))
+            agent = build_agent(tools)
+
+            return await _analyze_topics(topics, lambda topic: run(agent, tools, topic))
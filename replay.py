@@ -0,0 +1,207 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LIVE, RECORD, REPLAY = "live", "record", "replay"
+
+
+class FixtureNotFoundError(Exception):
+    """Raised in replay mode when no recording exists for an upstream request"""
+    pass
+
+
+class ReplayedUpstreamError(Exception):
+    """An upstream error that was recorded (or injected) and is being replayed"""
+    pass
+
+
+class UpstreamTransport:
+    """
+    Record/replay layer around every external call (BrightData, Gemini, ElevenLabs, MCP).
+
+    live    -> calls go straight to the upstream
+    record  -> calls go to the upstream and the request, response (or error), latency
+               and streamed chunks are written to the fixture store
+    replay  -> responses are served from the fixture store without network access,
+               optionally with injected latency and errors
+
+    Fixtures are JSON files under <fixtures_dir>/<upstream>/<request hash>.json, keyed
+    by a canonical JSON encoding of the request description passed by the caller.
+    """
+
+    def __init__(
+        self,
+        mode: str = LIVE,
+        fixtures_dir="fixtures/upstream",
+        latency_scale: float = 0.0,
+        extra_latency: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0
+    ):
+        """
+        Args:
+            mode: "live", "record" or "replay"
+            fixtures_dir: Directory of the fixture store
+            latency_scale: Replay mode; multiplier applied to recorded latencies (0 = instant)
+            extra_latency: Replay mode; seconds added to every call
+            error_rate: Replay mode; probability of injecting an upstream error per call
+            seed: Seed for the error-injection RNG so runs are reproducible
+        """
+        if mode not in (LIVE, RECORD, REPLAY):
+            raise ValueError(f"Unknown upstream transport mode: {mode}")
+        self.mode = mode
+        self.fixtures_dir = Path(fixtures_dir)
+        self.latency_scale = latency_scale
+        self.extra_latency = extra_latency
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == REPLAY
+
+    def _path(self, upstream: str, request: dict) -> Path:
+        canonical = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+        digest = hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:24]
+        return self.fixtures_dir / upstream / f"{digest}.json"
+
+    def _save(self, upstream: str, request: dict, fixture: dict):
+        path = self._path(upstream, request)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fixture = {"upstream": upstream, "request": request, **fixture}
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(fixture, indent=2, ensure_ascii=False, default=str), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def _load(self, upstream: str, request: dict) -> dict:
+        path = self._path(upstream, request)
+        if not path.exists():
+            raise FixtureNotFoundError(f"No {upstream} fixture for request {request!r} ({path})")
+        fixture = json.loads(path.read_text(encoding="utf-8"))
+        with self._lock:
+            inject_error = self.error_rate > 0 and self._rng.random() < self.error_rate
+        if inject_error:
+            fixture = {**fixture, "error": f"Injected {upstream} error (429 Resource exhausted)"}
+        return fixture
+
+    def _delay(self, recorded: float) -> float:
+        return recorded * self.latency_scale + self.extra_latency
+
+    async def call(self, upstream: str, request: dict, func: Callable, *args, **kwargs):
+        """Run an async upstream call through the transport; the result must be JSON-serializable"""
+        if self.mode == REPLAY:
+            fixture = self._load(upstream, request)
+            delay = self._delay(fixture.get("latency", 0.0))
+            if delay:
+                await asyncio.sleep(delay)
+            if fixture.get("error"):
+                raise ReplayedUpstreamError(fixture["error"])
+            return fixture["response"]
+
+        start = time.perf_counter()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as e:
+            if self.mode == RECORD:
+                self._save(upstream, request, {"error": str(e), "latency": time.perf_counter() - start})
+            raise
+        if self.mode == RECORD:
+            self._save(upstream, request, {"response": result, "latency": time.perf_counter() - start})
+        return result
+
+    def call_sync(self, upstream: str, request: dict, func: Callable, *args, **kwargs):
+        """Blocking counterpart of call() for synchronous SDKs"""
+        if self.mode == REPLAY:
+            fixture = self._load(upstream, request)
+            delay = self._delay(fixture.get("latency", 0.0))
+            if delay:
+                time.sleep(delay)
+            if fixture.get("error"):
+                raise ReplayedUpstreamError(fixture["error"])
+            return fixture["response"]
+
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if self.mode == RECORD:
+                self._save(upstream, request, {"error": str(e), "latency": time.perf_counter() - start})
+            raise
+        if self.mode == RECORD:
+            self._save(upstream, request, {"response": result, "latency": time.perf_counter() - start})
+        return result
+
+    def stream_sync(self, upstream: str, request: dict, func: Callable, *args, **kwargs) -> Iterator[bytes]:
+        """
+        Run a call that returns an iterator of bytes chunks (e.g. streamed audio).
+
+        Record mode captures every chunk with its arrival offset; replay mode yields
+        the same chunks with the same (scaled) pacing.
+        """
+        if self.mode == REPLAY:
+            fixture = self._load(upstream, request)
+            started = time.perf_counter()
+            for offset, chunk in fixture.get("chunks", []):
+                delay = self._delay(offset) - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+                yield base64.b64decode(chunk)
+            if fixture.get("error"):
+                raise ReplayedUpstreamError(fixture["error"])
+            return
+
+        start = time.perf_counter()
+        chunks = []
+        try:
+            for chunk in func(*args, **kwargs):
+                if self.mode == RECORD:
+                    chunks.append((time.perf_counter() - start, base64.b64encode(chunk).decode("ascii")))
+                yield chunk
+        except Exception as e:
+            if self.mode == RECORD:
+                self._save(upstream, request, {"chunks": chunks, "error": str(e), "latency": time.perf_counter() - start})
+            raise
+        if self.mode == RECORD:
+            self._save(upstream, request, {"chunks": chunks, "latency": time.perf_counter() - start})
+
+
+_transport: Optional[UpstreamTransport] = None
+
+
+def get_transport() -> UpstreamTransport:
+    """
+    Return the process-wide upstream transport.
+
+    Configured through UPSTREAM_MODE (live/record/replay), UPSTREAM_FIXTURES,
+    REPLAY_LATENCY_SCALE, REPLAY_EXTRA_LATENCY, REPLAY_ERROR_RATE and REPLAY_SEED.
+    """
+    global _transport
+    if _transport is None:
+        _transport = UpstreamTransport(
+            mode=os.getenv("UPSTREAM_MODE", LIVE),
+            fixtures_dir=os.getenv("UPSTREAM_FIXTURES", "fixtures/upstream"),
+            latency_scale=float(os.getenv("REPLAY_LATENCY_SCALE", "0")),
+            extra_latency=float(os.getenv("REPLAY_EXTRA_LATENCY", "0")),
+            error_rate=float(os.getenv("REPLAY_ERROR_RATE", "0")),
+            seed=int(os.getenv("REPLAY_SEED", "0"))
+        )
+    return _transport
+
+
+def set_transport(transport: UpstreamTransport) -> UpstreamTransport:
+    """Install a transport for this process (used by benchmarks and tests)"""
+    global _transport
+    _transport = transport
+    return transport
@@ -0,0 +1,252 @@
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+from rate_limit import is_throttling_error
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the upstream's circuit breaker is open"""
+    pass
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for one upstream service.
+
+    closed    -> calls pass through; `failure_threshold` consecutive failures open it
+    open      -> calls fail fast with CircuitOpenError for `reset_timeout` seconds
+    half_open -> a single trial call is let through; success closes, failure re-opens
+
+    Usable from sync and async code alike:
+
+        with get_breaker("gemini"):
+            response = model.generate_content(prompt)
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may proceed right now (reserves the half-open trial slot)"""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or (self._opened_at is None and self._failures >= self.failure_threshold):
+                print(f"Circuit breaker for {self.name} opened after {self._failures} failure(s)")
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def release(self):
+        """Give back a reserved trial slot without recording an outcome"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def __enter__(self):
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open, failing fast")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.record_success()
+        elif issubclass(exc_type, Exception):
+            self.record_failure()
+        else:
+            # Cancellation says nothing about the upstream's health
+            self.release()
+        return False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """
+    Return the process-wide circuit breaker for an upstream ("brightdata", "gemini", "elevenlabs", ...).
+
+    Thresholds come from BREAKER_FAILURE_THRESHOLD and BREAKER_RESET_TIMEOUT (seconds).
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                name,
+                failure_threshold=int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5")),
+                reset_timeout=float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+            )
+            _breakers[name] = breaker
+        return breaker
+
+
+# Gemini quota errors carry the server's suggested wait, e.g. "retry_delay { seconds: 17 }"
+RETRY_DELAY_RE = re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)")
+
+
+class ModelHealth:
+    """Recent outcomes, latency and cooldown of one model"""
+
+    def __init__(self, window: int):
+        self.outcomes = deque(maxlen=window)  # True = success
+        self.latency: Optional[float] = None  # EWMA of successful call latency, seconds
+        self.failures = 0  # consecutive
+        self.cooldown_until = 0.0
+        self.last_error: Optional[str] = None
+
+    @property
+    def success_rate(self) -> float:
+        # Laplace smoothing: untried models start at 0.5 instead of 0 or 1
+        return (sum(self.outcomes) + 1) / (len(self.outcomes) + 2)
+
+
+class ModelHealthRegistry:
+    """
+    Process-wide record of how each model in a fallback chain has been doing.
+
+    Failures put a model on a cooldown that doubles with consecutive failures:
+    quota/429 errors start at `quota_cooldown` (or the server's retry delay),
+    other errors at `error_cooldown`. order() skips cooling models and ranks the
+    rest by recent success rate, then latency, then the caller's preference.
+    """
+
+    def __init__(
+        self,
+        window: int = 20,
+        quota_cooldown: float = 60.0,
+        error_cooldown: float = 15.0,
+        max_cooldown: float = 600.0,
+        latency_alpha: float = 0.3
+    ):
+        self.window = window
+        self.quota_cooldown = quota_cooldown
+        self.error_cooldown = error_cooldown
+        self.max_cooldown = max_cooldown
+        self.latency_alpha = latency_alpha
+        self._models: Dict[str, ModelHealth] = {}
+        self._lock = threading.Lock()
+
+    def _health(self, model: str) -> ModelHealth:
+        health = self._models.get(model)
+        if health is None:
+            health = self._models[model] = ModelHealth(self.window)
+        return health
+
+    def record_success(self, model: str, latency: float):
+        with self._lock:
+            health = self._health(model)
+            health.outcomes.append(True)
+            health.failures = 0
+            health.cooldown_until = 0.0
+            if health.latency is None:
+                health.latency = latency
+            else:
+                health.latency += self.latency_alpha * (latency - health.latency)
+
+    def record_failure(self, model: str, error: Exception) -> float:
+        """Record a failed call and return the cooldown applied, in seconds"""
+        message = str(error)
+        if is_throttling_error(error):
+            match = RETRY_DELAY_RE.search(message)
+            base = float(match.group(1)) if match else self.quota_cooldown
+        else:
+            base = self.error_cooldown
+
+        with self._lock:
+            health = self._health(model)
+            health.outcomes.append(False)
+            health.failures += 1
+            health.last_error = message[:200]
+            cooldown = min(base * 2 ** (health.failures - 1), self.max_cooldown)
+            health.cooldown_until = time.monotonic() + cooldown
+        print(f"Model {model} cooling down for {cooldown:.0f}s")
+        return cooldown
+
+    def available(self, model: str) -> bool:
+        with self._lock:
+            return self._health(model).cooldown_until <= time.monotonic()
+
+    def order(self, candidates: Iterable[str]) -> List[str]:
+        """Models not cooling down, best first"""
+        now = time.monotonic()
+        with self._lock:
+            ranked = []
+            for preference, model in enumerate(candidates):
+                health = self._health(model)
+                if health.cooldown_until > now:
+                    continue
+                latency = health.latency if health.latency is not None else float("inf")
+                # Coarse buckets so latency only decides between similarly reliable models
+                ranked.append((-round(health.success_rate, 1), latency, preference, model))
+        return [model for *_, model in sorted(ranked)]
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                model: {
+                    "success_rate": round(health.success_rate, 3),
+                    "latency": round(health.latency, 3) if health.latency is not None else None,
+                    "cooldown_remaining": round(max(0.0, health.cooldown_until - now), 1),
+                    "last_error": health.last_error,
+                }
+                for model, health in self._models.items()
+            }
+
+
+_model_registry: Optional[ModelHealthRegistry] = None
+
+
+def get_model_registry() -> ModelHealthRegistry:
+    """
+    Return the process-wide model health registry.
+
+    Cooldowns come from MODEL_QUOTA_COOLDOWN, MODEL_ERROR_COOLDOWN and
+    MODEL_MAX_COOLDOWN (seconds); MODEL_HEALTH_WINDOW sets how many recent calls count.
+    """
+    global _model_registry
+    with _breakers_lock:
+        if _model_registry is None:
+            _model_registry = ModelHealthRegistry(
+                window=int(os.getenv("MODEL_HEALTH_WINDOW", "20")),
+                quota_cooldown=float(os.getenv("MODEL_QUOTA_COOLDOWN", "60")),
+                error_cooldown=float(os.getenv("MODEL_ERROR_COOLDOWN", "15")),
+                max_cooldown=float(os.getenv("MODEL_MAX_COOLDOWN", "600"))
+            )
+        return _model_registry
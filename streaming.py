@@ -0,0 +1,293 @@
+import asyncio
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+from pathlib import Path
+from typing import AsyncIterator, Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Words whose trailing period does not end a sentence
+ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "inc", "ltd",
+    "co", "corp", "no", "e.g", "i.e", "u.s", "u.k", "u.n", "e.u", "jan", "feb",
+    "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec"
+}
+
+# End punctuation (plus closing quotes/brackets) followed by whitespace, or a paragraph break
+BOUNDARY_RE = re.compile(r"[.!?]+[\"')\]]*\s+|\n\s*\n")
+
+
+class SentenceSplitter:
+    """
+    Cuts streamed text into speakable pieces as soon as sentences complete.
+
+    The first sentence is released on its own so audio can start immediately;
+    after that, sentences are grouped until a piece has at least `min_chars`
+    characters, which keeps the number of TTS requests (and seams) down.
+    """
+
+    def __init__(self, min_chars: int = 200):
+        self.min_chars = min_chars
+        self._buffer = ""
+        self._pending: List[str] = []
+        self._released = False
+
+    def _is_boundary(self, text: str, match: re.Match) -> bool:
+        if match.group().startswith("\n"):
+            return True
+        words = text[:match.start()].split()
+        if not words:
+            return False
+        word = words[-1].lower().strip("\"'([")
+        # Initials ("J. Smith") and known abbreviations
+        return not (len(word) == 1 and word.isalpha()) and word not in ABBREVIATIONS
+
+    def _split(self):
+        # Move complete sentences from the buffer to the pending list
+        start = 0
+        for match in BOUNDARY_RE.finditer(self._buffer):
+            if self._is_boundary(self._buffer, match):
+                sentence = self._buffer[start:match.end()].strip()
+                if sentence:
+                    self._pending.append(sentence)
+                start = match.end()
+        self._buffer = self._buffer[start:]
+
+    def feed(self, text: str) -> List[str]:
+        """Add streamed text and return the pieces that are ready to speak"""
+        self._buffer += text
+        self._split()
+
+        pieces = []
+        while self._pending:
+            if self._released and sum(len(s) + 1 for s in self._pending) < self.min_chars:
+                break
+            if self._released:
+                pieces.append(" ".join(self._pending))
+                self._pending = []
+            else:
+                pieces.append(self._pending.pop(0))
+                self._released = True
+        return pieces
+
+    def flush(self) -> List[str]:
+        """Return whatever is left once the stream has ended"""
+        rest = " ".join(self._pending + [self._buffer.strip()]).strip()
+        self._pending, self._buffer = [], ""
+        return [rest] if rest else []
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split complete text into sentences, with the same rules as SentenceSplitter"""
+    splitter = SentenceSplitter()
+    splitter._buffer = text
+    splitter._split()
+    rest = splitter._buffer.strip()
+    return splitter._pending + ([rest] if rest else [])
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_stream_executor() -> ThreadPoolExecutor:
+    """
+    Process-wide pool for the threads that relay blocking streams (STREAM_MAX_WORKERS,
+    default 32).
+
+    A relay holds its thread for the whole download, throttled by the client, so it
+    must not come from the default executor that asyncio.to_thread users share.
+    Streams beyond the limit queue for a thread.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("STREAM_MAX_WORKERS", "32")),
+                thread_name_prefix="stream"
+            )
+    return _executor
+
+
+async def iterate_in_thread(factory: Callable[[], Iterable], max_pending: int = 16) -> AsyncIterator:
+    """
+    Consume a blocking iterator (an SDK stream) in a stream-pool thread and yield its
+    items on the event loop as they arrive. Closing the async iterator stops the worker.
+
+    At most `max_pending` items are buffered, so a fast producer waits for a slow
+    consumer instead of piling its output up in memory.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+    slots = threading.Semaphore(max_pending)
+    done = object()
+
+    def deliver(item, error=None):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, (item, error))
+        except RuntimeError:
+            stop.set()  # event loop already closed
+
+    def worker():
+        iterator = None
+        try:
+            iterator = iter(factory())
+            for item in iterator:
+                while not slots.acquire(timeout=0.1):
+                    if stop.is_set():
+                        break
+                if stop.is_set():
+                    break
+                deliver(item)
+        except Exception as e:
+            deliver(done, e)
+            return
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+        deliver(done)
+
+    task = loop.run_in_executor(get_stream_executor(), worker)
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                break
+            slots.release()
+            yield item
+    finally:
+        stop.set()
+        if task.done():
+            task.exception()
+
+
+def tee_to_file(chunks: Iterable[bytes], path) -> Iterator[bytes]:
+    """
+    Yield audio chunks unchanged while writing them to `path`.
+
+    The file only appears (atomically) once the stream completes; an aborted or
+    failed stream leaves nothing behind.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                yield chunk
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+async def _resume(first: bytes, stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    async with aclosing(stream):
+        yield first
+        async for chunk in stream:
+            yield chunk
+
+
+async def open_audio_stream(sources: Sequence[Tuple[str, Callable[[], Iterable[bytes]]]]) -> AsyncIterator[bytes]:
+    """
+    Start the first TTS source that produces audio and return its chunk stream.
+
+    Each source is tried until its first chunk arrives, so a voice that fails
+    upfront (bad key, quota, open circuit) falls back to the next one while an
+    HTTP error can still be returned. Chunks are then relayed as they are
+    synthesized; memory use does not grow with the length of the briefing.
+
+    Args:
+        sources: (name, factory) pairs, best first; factories return MP3 chunk iterators
+
+    Raises:
+        RuntimeError: No source produced any audio
+    """
+    for name, factory in sources:
+        stream = iterate_in_thread(factory)
+        try:
+            first = await anext(stream)
+        except Exception as e:
+            print(f"{name} failed: {str(e)}, trying the next voice")
+            await stream.aclose()
+            continue
+        print(f"✓ Streaming audio from {name}")
+        return _resume(first, stream)
+    raise RuntimeError("All TTS voices failed")
+
+
+Voice = Callable[[str, Optional[str]], Iterable[bytes]]
+
+
+async def stream_speech(
+    script_factory: Callable[[], Iterable[str]],
+    voices: Sequence[Voice],
+    min_chars: Optional[int] = None
+) -> AsyncIterator[bytes]:
+    """
+    Turn a streamed script into a stream of audio bytes.
+
+    The script is read in a worker thread while earlier sentences are being
+    synthesized, so the first audio arrives after one sentence rather than after
+    the whole script. Each piece is spoken by the first voice that works; a voice
+    that fails is dropped for the rest of the stream so the speaker does not flip
+    back and forth. Per-piece MP3 tags are stripped (see tts.strip_mp3_stream())
+    apart from the first piece's ID3 header.
+
+    Args:
+        script_factory: Returns an iterator of script text chunks
+        voices: TTS callables (text, previous_text) -> iterator of MP3 chunks, best first
+        min_chars: Minimum characters per TTS request after the first sentence
+            (STREAM_MIN_CHARS, default 200)
+    """
+    if min_chars is None:
+        min_chars = int(os.getenv("STREAM_MIN_CHARS", "200"))
+    splitter = SentenceSplitter(min_chars)
+    pieces: asyncio.Queue = asyncio.Queue()
+
+    async def produce():
+        try:
+            async with aclosing(iterate_in_thread(script_factory)) as script:
+                async for text in script:
+                    for piece in splitter.feed(text):
+                        pieces.put_nowait(piece)
+            for piece in splitter.flush():
+                pieces.put_nowait(piece)
+        finally:
+            pieces.put_nowait(None)
+
+    from tts import strip_mp3_stream
+
+    producer = asyncio.create_task(produce())
+    voices = list(voices)
+    previous = None
+    header_sent = False
+    try:
+        while (piece := await pieces.get()) is not None:
+            while voices:
+                voice = voices[0]
+                started = False
+                # Only the very first piece keeps its ID3 header, so the stream reads as one file
+                speak = lambda: strip_mp3_stream(voice(piece, previous), keep_header=not header_sent)
+                try:
+                    async with aclosing(iterate_in_thread(speak)) as audio:
+                        async for chunk in audio:
+                            started = header_sent = True
+                            yield chunk
+                    break
+                except Exception as e:
+                    print(f"TTS voice failed: {str(e)}, switching to the next one")
+                    voices.pop(0)
+                    if started:
+                        break  # Part of this piece is already out; carry on with the next
+            else:
+                raise RuntimeError("All TTS voices failed")
+            previous = piece
+        await producer
+    finally:
+        producer.cancel()
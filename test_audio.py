@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+Offline tests for NewsNinja audio generation
+"""
+
+import asyncio
+import time
+
+
+def test_sentence_splitter():
+    """Sentences should be released as soon as they complete, abbreviations kept intact"""
+    print("✂️ Testing sentence splitter...")
+
+    from streaming import SentenceSplitter
+
+    splitter = SentenceSplitter(min_chars=60)
+    assert splitter.feed("Dr. Smith said the U.S. economy grew 3.") == []
+    assert splitter.feed("5 percent. Markets") == ["Dr. Smith said the U.S. economy grew 3.5 percent."]
+    assert splitter.feed(" rallied. Bonds fell! ") == [], "Later pieces wait for min_chars"
+    pieces = splitter.feed("Analysts at J. P. Morgan expect more of the same next quarter. ")
+    assert pieces == ["Markets rallied. Bonds fell! Analysts at J. P. Morgan expect more of the same next quarter."]
+    splitter.feed("This concludes our coverage")
+    assert splitter.flush() == ["This concludes our coverage"]
+
+    print("✓ Pieces follow sentence boundaries")
+    return True
+
+
+def test_streamed_speech_starts_early():
+    """Audio should start after the first sentence and fall back to the next voice on failure"""
+    print("🎙️ Testing streamed speech...")
+
+    from streaming import stream_speech
+
+    sentences = [f"Sentence number {i} of the broadcast. " for i in range(5)]
+
+    def script():
+        for sentence in sentences:
+            time.sleep(0.1)  # Gemini streaming one sentence at a time
+            yield sentence
+
+    def broken_voice(text, previous):
+        raise RuntimeError("quota exceeded")
+        yield b""
+
+    spoken = []
+
+    def voice(text, previous):
+        spoken.append((text, previous))
+        yield b"ID3\x04\x00\x00\x00\x00\x00\x00" + text.encode()  # Empty ID3v2 tag
+        yield b"TAG" + bytes(125)  # ID3v1 tag
+
+    async def run():
+        start = time.perf_counter()
+        first_byte, chunks = None, []
+        async for chunk in stream_speech(script, [broken_voice, voice], min_chars=0):
+            first_byte = first_byte or time.perf_counter() - start
+            chunks.append(chunk)
+        return first_byte, time.perf_counter() - start, chunks
+
+    first_byte, total, chunks = asyncio.run(run())
+
+    assert first_byte < 0.3 and total >= 0.5, f"first byte after {first_byte:.2f}s of {total:.2f}s"
+    audio = b"".join(chunks)
+    assert audio.count(b"ID3") == 1 and audio.startswith(b"ID3"), "Only the first piece keeps its ID3 header"
+    assert b"TAG" not in audio and audio.endswith(sentences[-1].strip().encode())
+    assert spoken[1] == (sentences[1].strip(), sentences[0].strip()), "Previous text is passed for continuity"
+
+    print(f"✓ First audio after {first_byte:.2f}s of a {total:.2f}s script")
+    return True
+
+
+def test_audio_stream_falls_back_and_tees():
+    """Audio should stream from the first working voice, with a copy saved only for complete streams"""
+    print("💾 Testing streamed audio with disk tee...")
+
+    import tempfile
+    import threading
+    from pathlib import Path
+
+    from streaming import open_audio_stream, tee_to_file
+
+    def broken_voice():
+        raise RuntimeError("quota exceeded")
+        yield b""
+
+    threads = set()
+
+    def voice():
+        threads.add(threading.current_thread().name)
+        for i in range(200):
+            yield b"frame%d;" % i
+
+    async def read(sources, limit=None):
+        audio = await open_audio_stream(sources)
+        chunks = []
+        async for chunk in audio:
+            chunks.append(chunk)
+            if len(chunks) == limit:
+                await audio.aclose()  # Listener hung up
+                break
+        return b"".join(chunks)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "briefing.mp3"
+        sources = [
+            ("broken", lambda: tee_to_file(broken_voice(), path)),
+            ("working", lambda: tee_to_file(voice(), path)),
+        ]
+        audio = asyncio.run(read(sources))
+        assert all(name.startswith("stream") for name in threads), "Relays stay off the default executor"
+        assert audio == b"".join(voice()) and path.read_bytes() == audio
+
+        path.unlink()
+        asyncio.run(read(sources, limit=3))
+        time.sleep(0.1)  # The worker thread closes the tee
+        assert list(Path(tmp).iterdir()) == [], "Aborted streams leave no files behind"
+
+    try:
+        asyncio.run(read([("broken", broken_voice)]))
+        raise AssertionError("Expected every voice to fail")
+    except RuntimeError as e:
+        assert "All TTS voices failed" in str(e)
+
+    print("✓ Failed voice skipped, complete stream saved, aborted stream discarded")
+    return True
+
+
+def _mp3_piece(label: bytes) -> bytes:
+    """A tagged MP3 like TTS services return: ID3v2, Info frame, one audio frame, ID3v1"""
+    frame_header = b"\xff\xfb\x90\x00"  # MPEG-1 Layer III, 128 kbps, 44.1 kHz: 417-byte frames
+    id3 = b"ID3\x04\x00\x00\x00\x00\x00\x05" + b"TSSE\x00"
+    info = (frame_header + b"\x00" * 32 + b"Info").ljust(417, b"\x00")
+    audio = (frame_header + label).ljust(417, b"\x00")
+    return id3 + info + audio + b"TAG".ljust(128, b"\x00")
+
+
+def test_chunked_parallel_synthesis():
+    """Scripts should be split on sentences, synthesized in parallel and stitched in order"""
+    print("🧩 Testing chunked parallel synthesis...")
+
+    from tts import chunk_text, strip_mp3_tags, synthesize_chunked
+
+    script = " ".join(f"Story {i} is developing quickly today." for i in range(40))
+    chunks = chunk_text(script, 200)
+    assert all(len(chunk) <= 200 and chunk.endswith(".") for chunk in chunks)
+    assert " ".join(chunks) == script
+    assert chunk_text("word " * 100, 50)[0] == ("word " * 10).strip(), "Long sentences are cut between words"
+
+    stripped = strip_mp3_tags(_mp3_piece(b"A"))
+    assert len(stripped) == 417 and stripped[4:5] == b"A", "Only the audio frame is left"
+
+    calls = []
+
+    def voice(text, previous):
+        calls.append(previous)
+        time.sleep(0.2)  # One TTS request
+        yield _mp3_piece(text.split()[1].encode())
+
+    start = time.perf_counter()
+    audio = b"".join(synthesize_chunked(script, voice, max_chars=200, parallelism=4))
+    elapsed = time.perf_counter() - start
+
+    frames = [audio[i:i + 417] for i in range(0, len(audio), 417)]
+    assert len(frames) == len(chunks) == 8 and all(len(f) == 417 for f in frames)
+    assert [f[4:].rstrip(b"\x00") for f in frames] == [c.split()[1].encode() for c in chunks], "Order is kept"
+    assert None in calls and chunks[0] in calls, "Previous text is passed for continuity"
+    assert elapsed < 0.8, f"8 chunks of 0.2s took {elapsed:.2f}s with parallelism 4"
+
+    print(f"✓ {len(chunks)} chunks synthesized in {elapsed:.2f}s and stitched into one MP3")
+    return True
+
+
+def test_chunked_synthesis_recovers_from_breaker():
+    """The first chunk should go alone through a half-open circuit; later failures fall back"""
+    print("🔌 Testing chunked synthesis with a recovering provider...")
+
+    from resilience import CircuitBreaker
+    from tts import synthesize_chunked
+
+    script = " ".join(f"Story {i} is developing quickly today." for i in range(40))
+    breaker = CircuitBreaker("elevenlabs-test", failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)  # Half-open: one trial call is let through
+    fail_after = []
+
+    def eleven(text, previous):
+        with breaker:
+            time.sleep(0.05)
+            if fail_after and text.split()[1] == fail_after[0]:
+                raise RuntimeError("quota exceeded")
+            yield _mp3_piece(b"E" + text.split()[1].encode())
+
+    def backup(text, previous):
+        yield _mp3_piece(b"G" + text.split()[1].encode())
+
+    def gtts(text, previous):
+        # MPEG-2 Layer III, 32 kbps, 24 kHz, mono: 96-byte frames, unlike the 44.1 kHz voices
+        yield (b"\xff\xf3\x44\xc4" + text.split()[1].encode()).ljust(96, b"\x00")
+
+    audio = b"".join(synthesize_chunked(script, eleven, max_chars=200, parallelism=4, fallback=backup))
+    labels = [audio[i + 4:i + 417].rstrip(b"\x00") for i in range(0, len(audio), 417)]
+    assert len(labels) == 8 and all(label.startswith(b"E") for label in labels), "No chunk is refused by the breaker"
+
+    fail_after.append("15")
+    audio = b"".join(synthesize_chunked(script, eleven, max_chars=200, parallelism=4, fallback=backup))
+    labels = [audio[i + 4:i + 417].rstrip(b"\x00") for i in range(0, len(audio), 417)]
+    assert len(labels) == 8, "A mid-stream failure does not cut the MP3 short"
+    assert labels[:3] == [b"E0", b"E5", b"E10"] and all(label.startswith(b"G") for label in labels[3:])
+
+    # A fallback in another MP3 format would make the stream undecodable: end it instead
+    sent = []
+    try:
+        for chunk in synthesize_chunked(script, eleven, max_chars=200, parallelism=4, fallback=gtts):
+            sent.append(chunk)
+        raise AssertionError("Mixing MP3 formats must end the stream")
+    except RuntimeError as e:
+        assert "different MP3 format" in str(e)
+    assert len(b"".join(sent)) == 3 * 417, "Only the first voice's frames went out"
+
+    print("✓ The trial chunk closes the circuit before the fan-out; later failures switch voice")
+    return True
+
+
+def test_briefing_segments_are_reused():
+    """A topic segment already spoken in an earlier briefing should not be synthesized again"""
+    print("♻️ Testing per-topic segment reuse...")
+
+    import tempfile
+    from pathlib import Path
+
+    import cache
+    from tts import split_segments, synthesize_briefing
+    from utils import cached_voice
+
+    ai = "Chipmakers raced ahead on new AI models. Regulators took notice. This concludes our coverage of AI."
+    climate = "Heatwaves broke records across Europe. This concludes our coverage of climate."
+    assert split_segments(f"{ai} {climate} Thanks for listening.") == [ai, climate, "Thanks for listening."]
+
+    spoken = []
+
+    def voice(text, previous):
+        spoken.append((text, previous))
+        yield _mp3_piece(text.split()[0].encode())
+
+    original = cache._tts_cache
+    with tempfile.TemporaryDirectory() as tmp:
+        cache._tts_cache = cache.TTSCache(Path(tmp), max_bytes=1024 * 1024)
+        try:
+            anchor = cached_voice(voice, "rachel", "eleven_multilingual_v2", "mp3_44100_128")
+            first = b"".join(synthesize_briefing(ai, anchor, pause=0.5))
+            spoken.clear()
+            second = b"".join(synthesize_briefing(f"{ai}\n\n{climate}", anchor, pause=0.5))
+        finally:
+            cache._tts_cache = original
+
+    assert spoken == [(climate, None)], "Only the new topic is synthesized, without the previous topic's text"
+    assert second.startswith(first), "The cached AI segment is reused as is"
+    pause = second[len(first):-417]
+    assert len(pause) % 417 == 0 and len(pause) // 417 == round(0.5 * 44100 / 1152), "Silent frames between topics"
+    assert set(pause[4:417]) == {0}
+
+    print(f"✓ Second briefing synthesized 1 of 2 segments, {len(pause) // 417} silent frames between them")
+    return True
+
+
+def test_broadcast_script_segments_are_reused():
+    """A topic already covered with the same material should cost neither a Gemini call nor TTS"""
+    print("📰 Testing per-topic script generation...")
+
+    import re
+    import tempfile
+    from pathlib import Path
+
+    import backend
+    import cache
+    import llm
+    import rate_limit
+    import replay
+    from replay import UpstreamTransport
+    from tts import BRIEFING_INTRO, BRIEFING_OUTRO, split_segments, synthesize_briefing
+    from utils import cached_voice
+
+    news = {
+        "AI": "Chipmakers race ahead on new AI models",
+        "climate": "Heatwaves break records across Europe",
+        "space": "A reusable rocket lands for the tenth time",
+    }
+
+    async def gather_sources(topics, source_type):
+        return {"news_analysis": {topic: news[topic] for topic in topics}}, {}
+
+    class StubGemini(UpstreamTransport):
+        def __init__(self):
+            super().__init__()
+            self.topics = []
+
+        def call_sync(self, upstream, request, func, *args, **kwargs):
+            topics = re.findall(r"TOPIC: (\w+)", request["prompt"])
+            self.topics.append(topics)
+            text = " ".join(
+                f"{news[topic]}, our correspondents report. This concludes our coverage of {topic}." for topic in topics
+            )
+            return {"text": text, "prompt_tokens": 100, "output_tokens": 20}
+
+    spoken = []
+
+    def voice(text, previous):
+        spoken.append(text)
+        yield _mp3_piece(text.split()[0].encode())
+
+    stub = StubGemini()
+    saved = (
+        backend.gather_sources, replay._transport, llm._provider, cache._llm_cache, cache._tts_cache,
+        rate_limit._backend, rate_limit._limiters
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        disk = cache.DiskCache(Path(tmp) / "llm.sqlite3", ttl=60, max_bytes=1024 * 1024)
+        cache._llm_cache = cache.LLMResponseCache(cache.TieredCache(cache.MemoryCache(ttl=60), disk), ttl=60)
+        cache._tts_cache = cache.TTSCache(Path(tmp) / "tts", max_bytes=1024 * 1024)
+        rate_limit._backend, rate_limit._limiters = rate_limit.LocalBackend(), {}
+        backend.gather_sources, llm._provider = gather_sources, llm.GeminiProvider("key")
+        replay.set_transport(stub)
+        try:
+            anchor = cached_voice(voice, "rachel", "eleven_multilingual_v2", "mp3_44100_128")
+            first = asyncio.run(backend.build_broadcast_script(["AI", "space"], "news"))
+            b"".join(synthesize_briefing(first, anchor, pause=0))
+            assert stub.topics == [["AI", "space"]], "New topics share one batched call"
+            stub.topics.clear()
+            spoken.clear()
+
+            second = asyncio.run(backend.build_broadcast_script(["AI", "climate"], "news"))
+            b"".join(synthesize_briefing(second, anchor, pause=0))
+        finally:
+            (backend.gather_sources, replay._transport, llm._provider, cache._llm_cache, cache._tts_cache,
+             rate_limit._backend, rate_limit._limiters) = saved
+
+    segments = split_segments(second)
+    assert segments[0] == BRIEFING_INTRO and segments[-1] == BRIEFING_OUTRO
+    assert segments[1] == split_segments(first)[1], "The AI segment is the cached one"
+    assert stub.topics == [["climate"]], "Only the new topic goes into the batched Gemini call"
+    assert spoken == [segments[2]], "Only the new topic's segment is synthesized"
+
+    print("✓ Second briefing wrote and spoke 1 of 2 topic segments")
+    return True
+
+
+def test_audio_store():
+    """Briefings should get unique names and be evicted by quota, age and LRU order"""
+    print("🗄️ Testing managed audio store...")
+
+    import os
+    import tempfile
+    from pathlib import Path
+
+    from audio_store import AudioStore
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = AudioStore(tmp, max_bytes=2500)
+        first = store.save([b"a" * 1000], "AI news")
+        second = store.save([b"b" * 1000], "AI news")
+        assert first != second and first.name.startswith("AI_news_"), "Same topic, same second, two files"
+
+        # Reading the first file makes the second one the least recently used
+        time.sleep(0.01)
+        assert store.open(first.name) == first
+        assert store.open("../secret.mp3") is None
+        store.save([b"c" * 1000], "climate")
+        assert first.exists() and not second.exists()
+
+        # An aborted stream leaves neither a file nor a manifest row
+        stream = store.tee(iter([b"d" * 100] * 5), "AI")
+        next(stream)
+        stream.close()
+        assert store.stats()["files"] == 2
+
+        # Compaction adopts stray files, forgets deleted ones and clears stale temp files
+        legacy = Path(tmp) / "legacy_20240101_120000.mp3"
+        legacy.write_bytes(b"e" * 100)
+        os.utime(legacy, (time.time() - 3600, time.time() - 3600))
+        stale = Path(tmp) / ".x.mp3.1.2.tmp"
+        stale.write_bytes(b"partial")
+        os.utime(stale, (0, 0))
+        first.unlink()
+        assert store.compact() == {"dropped": 1, "adopted": 1, "removed_tmp": 1}
+
+        store.max_age = 60
+        store.enforce()  # The adopted file's mtime counts as its creation time
+        stats = store.stats()
+        assert stats["files"] == 1 and stats["bytes"] == 1000
+        assert stats["evicted_files"] == 2 and stats["evicted_bytes"] == 1100
+        assert AudioStore(tmp, max_bytes=2500).stats()["evicted_files"] == 2, "Counters live in the shared manifest"
+
+        # A briefing larger than the whole quota is still there for its caller to serve
+        big = store.save([b"f" * 3000], "AI")
+        assert store.open(big.name) == big, "The file just written was evicted"
+        assert store.stats()["files"] == 1 and store.stats()["bytes"] == 3000
+
+    print(f"✓ Unique atomic writes, LRU/age eviction and compaction: {stats}")
+    return True
+
+
+def main():
+    print("🥷 NewsNinja Audio Test")
+    print("=" * 50)
+
+    tests = [
+        ("Sentence Splitter", test_sentence_splitter),
+        ("Streamed Speech", test_streamed_speech_starts_early),
+        ("Streamed Audio Tee", test_audio_stream_falls_back_and_tees),
+        ("Chunked Parallel Synthesis", test_chunked_parallel_synthesis),
+        ("Chunked Synthesis Recovery", test_chunked_synthesis_recovers_from_breaker),
+        ("Segment Reuse", test_briefing_segments_are_reused),
+        ("Script Segment Reuse", test_broadcast_script_segments_are_reused),
+        ("Audio Store", test_audio_store)
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        print("-" * 30)
+        try:
+            results.append(test_func())
+        except Exception as e:
+            print(f"❌ {test_name} failed: {str(e)}")
+            results.append(False)
+
+    print(f"\n📊 {sum(results)}/{len(results)} audio tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the NewsNinja caching layer
+"""
+
+import json
+import tempfile
+import time
+from pathlib import Path
+
+
+def test_normalize_url():
+    """Equivalent URLs should map to the same cache key"""
+    print("🔗 Testing URL normalization...")
+
+    from cache import normalize_url
+
+    a = normalize_url("HTTPS://News.Google.com/search?tbs=sbd:1&q=AI#top")
+    b = normalize_url("https://news.google.com/search?q=AI&tbs=sbd:1")
+    assert a == b, f"{a} != {b}"
+
+    print(f"✓ Normalized URL: {a}")
+    return True
+
+
+def test_memory_cache_lru_and_ttl():
+    """In-memory tier should evict least recently used entries and expire stale ones"""
+    print("🧠 Testing in-memory cache...")
+
+    from cache import MemoryCache
+
+    cache = MemoryCache(ttl=60, max_entries=10, max_bytes=10)
+    cache.set("a", b"12345")
+    cache.set("b", b"12345")
+    cache.get("a")  # "a" is now most recently used
+    cache.set("c", b"12345")
+    assert cache.get("a") == b"12345"
+    assert cache.get("b") is None, "LRU entry should have been evicted"
+
+    cache.set("d", b"1", ttl=-1)
+    assert cache.get("d") is None, "Expired entry should not be returned"
+
+    print("✓ LRU eviction and TTL expiry working")
+    return True
+
+
+def test_tiered_cache_survives_restart():
+    """Entries written to the disk tier should be readable by a fresh cache instance"""
+    print("💾 Testing on-disk cache tier...")
+
+    from cache import DiskCache, MemoryCache, TieredCache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "scrape.sqlite3"
+        page = "<html>" + "headline More " * 1000 + "</html>"
+
+        first = TieredCache(MemoryCache(ttl=60), DiskCache(path, ttl=60, max_bytes=1024 * 1024))
+        first.set_text("page", page)
+
+        second = TieredCache(MemoryCache(ttl=60), DiskCache(path, ttl=60, max_bytes=1024 * 1024))
+        assert second.get_text("page") == page
+        assert second.disk.stats()["bytes"] < len(page), "Pages should be stored compressed"
+
+        # Size-bounded eviction drops the least recently used page
+        small = DiskCache(Path(tmp) / "small.sqlite3", ttl=60, max_bytes=100)
+        small.set("old", b"x" * 60)
+        time.sleep(0.01)
+        small.set("new", b"y" * 60)
+        assert small.get("old") is None and small.get("new") == b"y" * 60
+
+    print("✓ Disk tier persists compressed pages and enforces its quota")
+    return True
+
+
+def test_llm_response_cache():
+    """Equivalent prompts should hit a cache shared through the disk tier, keyed by config too"""
+    print("🧠 Testing LLM response cache...")
+
+    from cache import DiskCache, LLMResponseCache, MemoryCache, TieredCache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "llm.sqlite3"
+
+        def worker():
+            disk = DiskCache(path, ttl=60, max_bytes=1024 * 1024)
+            return LLMResponseCache(TieredCache(MemoryCache(ttl=60), disk), ttl=60)
+
+        config = {"temperature": 0.7, "max_output_tokens": 1000}
+        first = worker()
+        assert first.get("gemini-1.5-flash", "Summarize:\n  headline one", config) is None
+        first.set("gemini-1.5-flash", "Summarize:\n  headline one", config, "Script", latency=2.5)
+
+        second = worker()
+        hit = second.get("gemini-1.5-flash", "  Summarize: headline one\n", dict(reversed(config.items())))
+        assert hit["text"] == "Script", "Whitespace and config key order should not matter"
+        assert second.get("gemini-1.5-pro", "Summarize: headline one", config) is None
+        assert second.get("gemini-1.5-flash", "Summarize: headline one", {"temperature": 0.2}) is None
+
+        stats = second.stats()
+        assert stats["hits"] == 1 and stats["misses"] == 2
+        assert stats["latency_saved_seconds"] == 2.5
+
+    print("✓ Responses are shared across workers and report latency saved")
+    return True
+
+
+def test_cached_llm_answers_bypass_breaker_and_limiter():
+    """Cached Gemini answers should be served while the circuit is open, without a limiter token"""
+    print("🚦 Testing cache lookups ahead of the breaker and limiter...")
+
+    import asyncio
+
+    import cache
+    import llm
+    import resilience
+    from utils import BROADCAST_GENERATION_CONFIG, generate_with_gemini, news_script_prompt
+
+    class EmptyLimiter:
+        async def __aenter__(self):
+            raise AssertionError("A cache hit must not take a limiter token")
+
+    original_cache, original_limiter = cache._llm_cache, llm.get_limiter
+    saved_breaker = resilience._breakers.get("gemini")
+    with tempfile.TemporaryDirectory() as tmp:
+        disk = cache.DiskCache(Path(tmp) / "llm.sqlite3", ttl=60, max_bytes=1024 * 1024)
+        llm_cache = cache._llm_cache = cache.LLMResponseCache(cache.TieredCache(cache.MemoryCache(ttl=60), disk), ttl=60)
+        breaker = resilience._breakers["gemini"] = resilience.CircuitBreaker("gemini", failure_threshold=1, reset_timeout=60)
+        breaker.record_failure()
+        llm.get_limiter = lambda name: EmptyLimiter()
+        try:
+            llm_cache.set("models/gemini-pro", "Write the briefing", BROADCAST_GENERATION_CONFIG, "Cached script", 3.0)
+            llm_cache.set("models/gemini-1.5-pro", news_script_prompt("Headline"), None, "Cached summary", 2.0)
+
+            assert generate_with_gemini("key", "Write the briefing", BROADCAST_GENERATION_CONFIG) == "Cached script"
+            provider = llm.GeminiProvider("key")
+            assert asyncio.run(provider.generate("Write the briefing", BROADCAST_GENERATION_CONFIG)) == "Cached script"
+            assert asyncio.run(llm.summarize_with_gemini_news_script_async("key", "Headline")) == "Cached summary"
+            assert breaker.state == "open", "Cache hits leave the breaker alone"
+
+            stats = llm_cache.stats()
+            assert stats["hits"] == 3 and stats["misses"] == 0, "Each lookup across the model chain counts once"
+        finally:
+            cache._llm_cache, llm.get_limiter = original_cache, original_limiter
+            if saved_breaker is None:
+                resilience._breakers.pop("gemini", None)
+            else:
+                resilience._breakers["gemini"] = saved_breaker
+
+    print("✓ Cached answers are served during an outage without spending the Gemini budget")
+    return True
+
+
+def test_tts_cache():
+    """Identical text for the same voice should be synthesized once and then served from disk"""
+    print("🔊 Testing TTS audio cache...")
+
+    import cache
+    from utils import cached_voice
+
+    calls = []
+
+    def voice(text, previous_text):
+        calls.append(text)
+        yield b"ID3" + text.encode()
+        yield b"-end"
+
+    original = cache._tts_cache
+    with tempfile.TemporaryDirectory() as tmp:
+        cache._tts_cache = tts_cache = cache.TTSCache(Path(tmp), max_bytes=1024 * 1024)
+        try:
+            rachel = cached_voice(voice, "rachel", "eleven_multilingual_v2", "mp3_44100_128")
+            first = b"".join(rachel("This concludes our coverage of AI.", None))
+            again = b"".join(rachel("  This concludes our\ncoverage of AI. ", "Earlier sentence."))
+            assert first == again == b"ID3This concludes our coverage of AI.-end"
+            assert len(calls) == 1, "Whitespace and previous text do not change the key"
+
+            other = cached_voice(voice, "adam", "eleven_multilingual_v2", "mp3_44100_128")
+            b"".join(other("This concludes our coverage of AI.", None))
+            assert len(calls) == 2, "Each voice has its own entries"
+
+            key = tts_cache.key("This concludes our coverage of AI.", "rachel", "eleven_multilingual_v2", "mp3_44100_128")
+            meta = json.loads(tts_cache._path(key).with_suffix(".json").read_text())
+            assert meta["voice_id"] == "rachel" and meta["bytes"] == len(first)
+
+            stats = tts_cache.stats()
+            assert stats["hits"] == 1 and stats["misses"] == 2 and stats["entries"] == 2
+
+            scans = []
+            entries = tts_cache._entries
+            tts_cache._entries = lambda: scans.append(1) or entries()
+            tts_cache.set("1" * 64, b"x" * 10, latency=0.1)
+            assert not scans, "Writes under quota keep a running total instead of listing the tree"
+
+            tts_cache.max_bytes = len(first) + 1
+            tts_cache.set("0" * 64, b"x" * 10, latency=0.1)
+            assert scans, "Going over quota rescans the tree"
+            assert tts_cache.stats()["bytes"] <= tts_cache.max_bytes, "Least recently used audio is evicted"
+        finally:
+            cache._tts_cache = original
+
+    print("✓ Audio is synthesized once per text and voice")
+    return True
+
+
+def main():
+    print("🥷 NewsNinja Cache Test")
+    print("=" * 50)
+
+    tests = [
+        ("URL Normalization", test_normalize_url),
+        ("Memory Cache", test_memory_cache_lru_and_ttl),
+        ("Tiered Cache", test_tiered_cache_survives_restart),
+        ("LLM Response Cache", test_llm_response_cache),
+        ("Cache Before Breaker and Limiter", test_cached_llm_answers_bypass_breaker_and_limiter),
+        ("TTS Audio Cache", test_tts_cache)
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        print("-" * 30)
+        try:
+            results.append(test_func())
+        except Exception as e:
+            print(f"❌ {test_name} failed: {str(e)}")
+            results.append(False)
+
+    print(f"\n📊 {sum(results)}/{len(results)} cache tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Offline tests for NewsNinja Reddit scraping infrastructure
+
+Uses a local stub MCP server instead of `npx @brightdata/mcp`.
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+STUB_MCP_SERVER = '''
+import json
+import time
+
+from mcp.server.fastmcp import FastMCP
+
+mcp = FastMCP("stub-brightdata")
+
+
+@mcp.tool()
+def search_engine(query: str, engine: str = "google") -> str:
+    """Search the web"""
+    return (
+        "results for " + query + "\\n"
+        "[Old thread](https://www.reddit.com/r/tech/comments/old111/ancient/)\\n"
+        "[New thread](https://www.reddit.com/r/tech/comments/new222/fresh/)\\n"
+        "[Newer thread](https://www.reddit.com/r/news/comments/new333/fresher/)"
+    )
+
+
+@mcp.tool()
+def scrape_as_markdown(url: str) -> str:
+    """Scrape a page"""
+    age_days = 30 if "old111" in url else 1
+    post = {"title": "Thread " + url.split("/")[6], "subreddit": "tech", "selftext": "Body",
+            "score": 10, "created_utc": time.time() - age_days * 86400}
+    comments = [{"kind": "t1", "data": {"body": "Great point", "score": 5}}]
+    return json.dumps([{"data": {"children": [{"data": post}]}}, {"data": {"children": comments}}])
+
+
+mcp.run()
+'''
+
+
+def _stub_server_params(tmp: str):
+    from mcp import StdioServerParameters
+
+    script = Path(tmp) / "stub_mcp_server.py"
+    script.write_text(STUB_MCP_SERVER)
+    return StdioServerParameters(command=sys.executable, args=[str(script)])
+
+
+def test_mcp_session_pool():
+    """Pooled sessions should be shared by concurrent leases and respawned after a crash"""
+    print("🏊 Testing warm MCP session pool...")
+
+    from mcp_pool import MCPSessionPool
+
+    async def run(tmp):
+        pool = MCPSessionPool(
+            _stub_server_params(tmp),
+            build_agent=lambda tools: {tool.name: tool for tool in tools},
+            size=2,
+            lease_timeout=30
+        )
+        await pool.start()
+
+        async def use(i):
+            async with pool.lease() as member:
+                result = await member.agent["search_engine"].ainvoke({"query": str(i)})
+                return member.id, str(result)
+
+        try:
+            results = await asyncio.gather(*(use(i) for i in range(4)))
+            assert {member_id for member_id, _ in results} <= {0, 1}
+            assert all(f"results for {i}" in text for i, (_, text) in enumerate(results))
+
+            pool.members[0].restart.set()  # simulate a crashed subprocess
+            results = await asyncio.gather(*(use(i) for i in range(4)))
+            assert len(results) == 4 and pool.stats()["ready"] == 2
+        finally:
+            await pool.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run(tmp))
+
+    print("✓ Sessions are leased, returned and respawned")
+    return True
+
+
+def test_deterministic_reddit_pipeline():
+    """Deterministic mode should search, fetch recent posts within budget and summarize once"""
+    print("🧭 Testing deterministic Reddit pipeline...")
+
+    for var in ("GEMINI_API_KEY", "API_TOKEN", "WEB_UNLOCKER_ZONE"):
+        os.environ.setdefault(var, "test")
+
+    from mcp import ClientSession
+    from mcp.client.stdio import stdio_client
+    from langchain_mcp_adapters.tools import load_mcp_tools
+    import reddit_scraper
+    from rate_limit import DistributedLimiter, LocalBackend
+
+    prompts = []
+
+    async def stub_gemini(prompt, generation_config=None, timeout=None, models=None, api_key=None):
+        prompts.append(prompt)
+        return "Summary of Reddit discussions"
+
+    async def run(tmp):
+        async with stdio_client(_stub_server_params(tmp)) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                tools = await load_mcp_tools(session)
+                return await reddit_scraper.process_topic_deterministic(tools, "ai")
+
+    original_gemini, original_limiter = reddit_scraper.generate_with_gemini_async, reddit_scraper.mcp_limiter
+    reddit_scraper.generate_with_gemini_async = stub_gemini
+    reddit_scraper.mcp_limiter = DistributedLimiter("mcp-test", 100, 1, backend=LocalBackend())
+    os.environ["REDDIT_STEP_BUDGET"] = "3"
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            summary = asyncio.run(run(tmp))
+    finally:
+        reddit_scraper.generate_with_gemini_async, reddit_scraper.mcp_limiter = original_gemini, original_limiter
+        del os.environ["REDDIT_STEP_BUDGET"]
+
+    assert summary == "Summary of Reddit discussions"
+    assert len(prompts) == 1, "Exactly one summarization call per topic"
+    # Budget of 3 = 1 search + 2 fetches; the old post is filtered out, leaving one
+    assert "Thread old111" not in prompts[0] and "Thread new222" in prompts[0]
+    assert "Thread new333" not in prompts[0], "Step budget should stop further fetches"
+
+    print("✓ Fixed search/fetch/filter/summarize sequence respects the step budget")
+    return True
+
+
+def test_mcp_tool_cache():
+    """Repeated tool calls should be served from the cache without taking MCP budget"""
+    print("🗃️ Testing MCP tool result cache...")
+
+    for var in ("GEMINI_API_KEY", "API_TOKEN", "WEB_UNLOCKER_ZONE"):
+        os.environ.setdefault(var, "test")
+
+    from mcp import ClientSession
+    from mcp.client.stdio import stdio_client
+    from langchain_mcp_adapters.tools import load_mcp_tools
+    import reddit_scraper
+    from cache import MemoryCache
+    from mcp_cache import MCPToolCache
+    from rate_limit import DistributedLimiter, LocalBackend
+
+    class CountingLimiter(DistributedLimiter):
+        acquired = 0
+
+        async def acquire(self, tokens: float = 1):
+            CountingLimiter.acquired += 1
+            await super().acquire(tokens)
+
+    async def stub_gemini(prompt, generation_config=None, timeout=None, models=None, api_key=None):
+        return prompt
+
+    tool_cache = MCPToolCache(MemoryCache(ttl=60, max_entries=16, max_bytes=1024 * 1024))
+
+    async def run(tmp):
+        async with stdio_client(_stub_server_params(tmp)) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                tools = tool_cache.wrap_tools(await load_mcp_tools(session))
+                first = await reddit_scraper.process_topic_deterministic(tools, "ai")
+                after_first = CountingLimiter.acquired
+                second = await reddit_scraper.process_topic_deterministic(tools, "ai")
+                # Equivalent URLs share an entry
+                scrape = next(tool for tool in tools if tool.name == "scrape_as_markdown")
+                await scrape.ainvoke({"url": "HTTPS://WWW.REDDIT.COM/r/tech/comments/new222/.json#top"})
+                return first, second, after_first
+
+    original_gemini, original_limiter = reddit_scraper.generate_with_gemini_async, reddit_scraper.mcp_limiter
+    reddit_scraper.generate_with_gemini_async = stub_gemini
+    reddit_scraper.mcp_limiter = CountingLimiter("mcp-test", 100, 1, backend=LocalBackend())
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            first, second, after_first = asyncio.run(run(tmp))
+    finally:
+        reddit_scraper.generate_with_gemini_async, reddit_scraper.mcp_limiter = original_gemini, original_limiter
+
+    assert first == second and "Thread new222" in first
+    assert after_first == 1, "One limiter token per topic that reaches the MCP server"
+    assert CountingLimiter.acquired == 1, "A fully cached topic should not wait on the limiter"
+    stats = tool_cache.stats()
+    assert stats["misses"] == 4 and stats["hits"] == 5, stats
+
+    print("✓ Repeated searches and post fetches are served locally")
+    return True
+
+
+def test_topic_timeout_excludes_limiter_wait():
+    """Queueing for the MCP limiter and retry backoff should not count against REDDIT_TOPIC_TIMEOUT"""
+    print("⏱️ Testing per-topic timeout accounting...")
+
+    import reddit_scraper
+    from rate_limit import DistributedLimiter, LocalBackend
+
+    async def topic(work: float, backoff: float = 0.0):
+        async with asyncio.timeout(0.2) as deadline:
+            reddit_scraper._topic_deadline.set(deadline)
+            await reddit_scraper._TopicPermit()()
+            await reddit_scraper._backoff_sleep(backoff)
+            await asyncio.sleep(work)
+            return "done"
+
+    async def run():
+        # One token every 0.15 s: the fourth topic queues ~0.45 s, far past its 0.2 s budget
+        queued = await asyncio.gather(*(topic(0.05) for _ in range(4)))
+        backed_off = await topic(0.05, backoff=0.3)
+        try:
+            await topic(0.3)
+            raise AssertionError("A topic working longer than its budget should time out")
+        except TimeoutError:
+            pass
+        return queued, backed_off
+
+    original_limiter = reddit_scraper.mcp_limiter
+    reddit_scraper.mcp_limiter = DistributedLimiter("mcp-test", 1, 0.15, backend=LocalBackend())
+    try:
+        queued, backed_off = asyncio.run(run())
+    finally:
+        reddit_scraper.mcp_limiter = original_limiter
+
+    assert queued == ["done"] * 4 and backed_off == "done"
+
+    print("✓ Topics late in the limiter queue still get their full working time")
+    return True
+
+
+def test_deterministic_mode_needs_its_tools():
+    """Deterministic mode should fall back to the agent when the MCP server lacks its tools"""
+    print("🧰 Testing deterministic mode tool check...")
+
+    from contextlib import asynccontextmanager
+    from types import SimpleNamespace
+
+    import reddit_scraper
+
+    class StubPool:
+        started = True
+
+        def __init__(self, tool_names):
+            self.member = SimpleNamespace(agent="agent", tools=[SimpleNamespace(name=name) for name in tool_names])
+
+        @asynccontextmanager
+        async def lease(self):
+            yield self.member
+
+    async def agent_pipeline(agent, topic, config=None):
+        return f"agent: {topic}"
+
+    async def fixed_pipeline(tools, topic, config=None, summarize=True):
+        return f"deterministic: {topic}"
+
+    saved = (reddit_scraper._mcp_pool, reddit_scraper.process_topic, reddit_scraper.process_topic_deterministic)
+    reddit_scraper.process_topic, reddit_scraper.process_topic_deterministic = agent_pipeline, fixed_pipeline
+    os.environ["REDDIT_MODE"] = "deterministic"
+    try:
+        reddit_scraper._mcp_pool = StubPool(["search_engine", "scrape_as_markdown", "scrape_as_html"])
+        complete = asyncio.run(reddit_scraper.scrape_reddit_topics(["ai"]))
+        reddit_scraper._mcp_pool = StubPool(["search_engine"])
+        assert reddit_scraper.missing_deterministic_tools(reddit_scraper._mcp_pool.member.tools) == ["scrape_as_markdown"]
+        partial = asyncio.run(reddit_scraper.scrape_reddit_topics(["ai"]))
+    finally:
+        reddit_scraper._mcp_pool, reddit_scraper.process_topic, reddit_scraper.process_topic_deterministic = saved
+        del os.environ["REDDIT_MODE"]
+
+    assert complete["reddit_analysis"]["ai"] == "deterministic: ai"
+    assert partial["reddit_analysis"]["ai"] == "agent: ai", "Missing tools should fall back to the agent"
+
+    print("✓ Servers without search_engine/scrape_as_markdown use the agent pipeline")
+    return True
+
+
+def main():
+    print("🥷 NewsNinja Reddit Infrastructure Test")
+    print("=" * 50)
+
+    tests = [
+        ("MCP Session Pool", test_mcp_session_pool),
+        ("Deterministic Pipeline", test_deterministic_reddit_pipeline),
+        ("MCP Tool Cache", test_mcp_tool_cache),
+        ("Topic Timeout", test_topic_timeout_excludes_limiter_wait),
+        ("Deterministic Tool Check", test_deterministic_mode_needs_its_tools)
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        print("-" * 30)
+        try:
+            results.append(test_func())
+        except Exception as e:
+            print(f"❌ {test_name} failed: {str(e)}")
+            results.append(False)
+
+    print(f"\n📊 {sum(results)}/{len(results)} Reddit tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+Offline tests for NewsNinja upstream resilience helpers
+"""
+
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+
+def test_circuit_breaker():
+    """Breaker should open after repeated failures, fail fast, then recover via a trial call"""
+    print("🔌 Testing circuit breaker...")
+
+    from resilience import CircuitBreaker, CircuitOpenError
+
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0.05)
+
+    for _ in range(2):
+        try:
+            with breaker:
+                raise RuntimeError("upstream down")
+        except RuntimeError:
+            pass
+    assert breaker.state == "open"
+
+    try:
+        with breaker:
+            raise AssertionError("call should have been rejected")
+    except CircuitOpenError:
+        print("✓ Open breaker fails fast")
+
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert breaker.allow() and not breaker.allow(), "Only one trial call allowed while half-open"
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+    print("✓ Breaker recovers after a successful trial call")
+
+    # A Gemini attempt that fails before the request is sent must not keep the trial slot
+    import google.generativeai as genai
+    import resilience
+    from utils import generate_with_gemini
+
+    saved_breaker, saved_model = resilience._breakers.get("gemini"), genai.GenerativeModel
+    breaker = resilience._breakers["gemini"] = CircuitBreaker("gemini", failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+
+    def broken_model(name):
+        raise ValueError("bad model name")
+
+    genai.GenerativeModel = broken_model
+    try:
+        try:
+            generate_with_gemini("test-key", "prompt", models=["gemini-test"])
+        except RuntimeError:
+            pass
+        assert breaker.allow(), "Half-open trial slot was not given back"
+    finally:
+        genai.GenerativeModel = saved_model
+        if saved_breaker is None:
+            resilience._breakers.pop("gemini", None)
+        else:
+            resilience._breakers["gemini"] = saved_breaker
+
+    print("✓ Failed Gemini setup gives the half-open trial slot back")
+    return True
+
+
+def test_model_health_registry():
+    """Failing models should cool down and healthy, fast models should be tried first"""
+    print("🩺 Testing model health registry...")
+
+    from resilience import ModelHealthRegistry
+
+    registry = ModelHealthRegistry(quota_cooldown=0.05, error_cooldown=0.05)
+    chain = ["gemini-1.5-flash", "gemini-pro", "gemini-1.5-pro"]
+    assert registry.order(chain) == chain, "Untried models keep the preference order"
+
+    registry.record_failure("gemini-1.5-flash", RuntimeError("429 Resource has been exhausted (e.g. check quota)."))
+    registry.record_success("gemini-pro", 2.0)
+    registry.record_success("gemini-1.5-pro", 0.8)
+    assert registry.order(chain) == ["gemini-1.5-pro", "gemini-pro"], "Quota-exhausted model is skipped"
+
+    cooldown = registry.record_failure("gemini-pro", RuntimeError("429 quota retry_delay { seconds: 7 }"))
+    assert cooldown == 7, "Server-suggested retry delay should be honoured"
+
+    time.sleep(0.06)
+    assert registry.order(chain) == ["gemini-1.5-pro", "gemini-1.5-flash"], "Cooled-down model returns, ranked last"
+    assert registry.record_failure("gemini-1.5-flash", RuntimeError("500 internal")) == 0.1, "Cooldown doubles"
+
+    print("✓ Requests go straight to the healthiest available model")
+    return True
+
+
+def test_sqlite_limiter_shared_between_workers():
+    """Two limiter instances on the same SQLite file should share one budget"""
+    print("🪣 Testing shared SQLite token bucket...")
+
+    from rate_limit import DistributedLimiter, SQLiteBackend
+
+    async def run(path):
+        # Separate backend objects stand in for separate worker processes
+        worker_a = DistributedLimiter("upstream", 3, 60, backend=SQLiteBackend(path))
+        worker_b = DistributedLimiter("upstream", 3, 60, backend=SQLiteBackend(path))
+        for limiter in (worker_a, worker_b, worker_a):
+            await asyncio.wait_for(limiter.acquire(), timeout=1)
+        try:
+            await asyncio.wait_for(worker_b.acquire(), timeout=0.2)
+            raise AssertionError("Budget should have been exhausted across both workers")
+        except asyncio.TimeoutError:
+            pass
+
+        await worker_a.report_throttled(retry_after=30)
+        state = await worker_b.backend.snapshot("upstream")
+        assert state[2] == 0.5, "Throttling should halve the shared budget"
+        assert state[3] > time.time() + 25, "Retry-After should block every worker"
+
+        try:
+            await asyncio.wait_for(worker_a.acquire(4), timeout=1)
+            raise AssertionError("More tokens than the bucket holds should be refused")
+        except ValueError:
+            pass
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run(Path(tmp) / "ratelimit.sqlite3"))
+
+    print("✓ Budget and Retry-After penalties are shared between workers")
+    return True
+
+
+async def _serve_redis_stand_in(reader, writer, store):
+    """Tiny Redis protocol stand-in supporting the commands RedisBackend needs"""
+    queued = None
+    while True:
+        header = await reader.readline()
+        if not header:
+            break
+        args = []
+        for _ in range(int(header[1:])):
+            length = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(length + 2))[:-2].decode())
+        command = args[0].upper()
+
+        if queued is not None and command != "EXEC":
+            queued.append(args)
+            writer.write(b"+QUEUED\r\n")
+        elif command == "MULTI":
+            queued = []
+            writer.write(b"+OK\r\n")
+        elif command == "EXEC":
+            for queued_args in queued:
+                if queued_args[0].upper() == "HSET":
+                    fields = queued_args[2:]
+                    store.setdefault(queued_args[1], {}).update(zip(fields[::2], fields[1::2]))
+            writer.write(b"*%d\r\n" % len(queued) + b":1\r\n" * len(queued))
+            queued = None
+        elif command == "HMGET":
+            values = [store.get(args[1], {}).get(field) for field in args[2:]]
+            writer.write(b"*%d\r\n" % len(values))
+            for value in values:
+                writer.write(b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value.encode()))
+        else:  # WATCH, UNWATCH
+            writer.write(b"+OK\r\n")
+        await writer.drain()
+
+
+def test_redis_protocol_limiter():
+    """RedisBackend should work against a local Redis protocol stand-in"""
+    print("🧱 Testing Redis protocol token bucket...")
+
+    from rate_limit import DistributedLimiter, RedisBackend
+
+    async def run():
+        store = {}
+        server = await asyncio.start_server(
+            lambda r, w: _serve_redis_stand_in(r, w, store), "127.0.0.1", 0
+        )
+        port = server.sockets[0].getsockname()[1]
+        backend = RedisBackend(f"redis://127.0.0.1:{port}/0")
+        limiter = DistributedLimiter("mcp", 2, 60, backend=backend)
+        try:
+            await asyncio.wait_for(limiter.acquire(), timeout=1)
+            await asyncio.wait_for(limiter.acquire(), timeout=1)
+            assert await backend.acquire("mcp", 2, 2 / 60, 1) > 0, "Third token should not be available"
+            assert float(store["newsninja:ratelimit:mcp"]["tokens"]) < 1
+        finally:
+            await backend.close()
+            server.close()
+            await server.wait_closed()
+
+    asyncio.run(run())
+
+    print("✓ Token bucket state is kept in the Redis protocol server")
+    return True
+
+
+def test_record_replay_transport():
+    """Recorded upstream responses, errors and audio chunks should replay offline"""
+    print("📼 Testing record/replay transport...")
+
+    from replay import ReplayedUpstreamError, UpstreamTransport
+
+    with tempfile.TemporaryDirectory() as tmp:
+        recorder = UpstreamTransport(mode="record", fixtures_dir=tmp)
+
+        async def fetch_page():
+            return {"status": 200, "retry_after": None, "text": "<html>page</html>"}
+
+        def overloaded():
+            raise RuntimeError("429 Resource exhausted")
+
+        asyncio.run(recorder.call("brightdata", {"url": "https://example.com"}, fetch_page))
+        try:
+            recorder.call_sync("gemini", {"prompt": "hi"}, overloaded)
+        except RuntimeError:
+            pass
+        audio = list(recorder.stream_sync("elevenlabs", {"text": "hi"}, lambda: iter([b"ID3", b"\xff\xfb"])))
+
+        player = UpstreamTransport(mode="replay", fixtures_dir=tmp)
+        page = asyncio.run(player.call("brightdata", {"url": "https://example.com"}, None))
+        assert page["text"] == "<html>page</html>"
+        assert list(player.stream_sync("elevenlabs", {"text": "hi"}, None)) == audio
+        try:
+            player.call_sync("gemini", {"prompt": "hi"}, None)
+            raise AssertionError("Recorded error should be replayed")
+        except ReplayedUpstreamError as e:
+            assert "429" in str(e)
+
+        flaky = UpstreamTransport(mode="replay", fixtures_dir=tmp, error_rate=1.0, extra_latency=0.01)
+        start = time.perf_counter()
+        try:
+            asyncio.run(flaky.call("brightdata", {"url": "https://example.com"}, None))
+            raise AssertionError("Error profile should inject a failure")
+        except ReplayedUpstreamError:
+            assert time.perf_counter() - start >= 0.01
+
+    print("✓ Responses, errors and streamed chunks replay deterministically")
+    return True
+
+
+async def _serve_ollama_stand_in(reader, writer, delay, requests):
+    """Minimal Ollama /api/generate server: answers after `delay` seconds"""
+    import json
+
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = next(
+        int(line.split(b":")[1]) for line in head.split(b"\r\n") if line.lower().startswith(b"content-length")
+    )
+    requests.append(json.loads(await reader.readexactly(length)))
+    await asyncio.sleep(delay)
+    body = json.dumps({"model": requests[-1]["model"], "response": "Ollama script", "done": True}).encode()
+    writer.write(
+        b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+        + f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    writer.close()
+
+
+def test_hedged_llm_provider():
+    """A slow or failing primary should be hedged to the local Ollama stand-in, and the loser cancelled"""
+    print("🏁 Testing hedged LLM requests...")
+
+    import cache
+    from llm import HedgedProvider, LLMProvider, OllamaProvider
+
+    class FakeGemini(LLMProvider):
+        name = "gemini"
+
+        def __init__(self):
+            self.delay, self.error, self.cancelled = 0.01, None, 0
+
+        async def generate(self, prompt, generation_config=None, timeout=None):
+            try:
+                await asyncio.sleep(self.delay)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+            if self.error:
+                raise self.error
+            return "Gemini script"
+
+    async def run():
+        requests = []
+        server = await asyncio.start_server(
+            lambda r, w: _serve_ollama_stand_in(r, w, 0.05, requests), "127.0.0.1", 0
+        )
+        port = server.sockets[0].getsockname()[1]
+        gemini = FakeGemini()
+        hedged = HedgedProvider(gemini, OllamaProvider(f"http://127.0.0.1:{port}", "llama3.2"), initial_delay=0.2)
+        try:
+            assert await hedged.generate("prompt") == "Gemini script"
+            assert hedged.hedges == 0 and not requests, "Fast primary is not hedged"
+
+            gemini.delay = 1.0
+            start = time.perf_counter()
+            assert await hedged.generate("prompt", {"max_output_tokens": 50}) == "Ollama script"
+            assert time.perf_counter() - start < 0.6
+            await asyncio.sleep(0)  # Let the cancelled loser unwind
+            assert gemini.cancelled == 1
+            assert requests[-1]["options"] == {"num_predict": 50}
+
+            gemini.delay, gemini.error = 0.01, RuntimeError("429 quota exceeded")
+            start = time.perf_counter()
+            assert await hedged.generate("prompt") == "Ollama script"
+            assert time.perf_counter() - start < 0.2, "A failed primary fails over without waiting"
+            assert hedged.stats()["hedge_wins"] == 2
+
+            served = len(requests)
+            assert await hedged.generate("prompt") == "Ollama script"
+            assert len(requests) == served, "Ollama answers come from the LLM response cache"
+        finally:
+            await hedged.aclose()
+            server.close()
+            await server.wait_closed()
+
+    original = cache._llm_cache
+    with tempfile.TemporaryDirectory() as tmp:
+        disk = cache.DiskCache(Path(tmp) / "llm.sqlite3", ttl=60, max_bytes=1024 * 1024)
+        cache._llm_cache = cache.LLMResponseCache(cache.TieredCache(cache.MemoryCache(ttl=60), disk), ttl=60)
+        try:
+            asyncio.run(run())
+        finally:
+            cache._llm_cache = original
+
+    hedged = HedgedProvider(FakeGemini(), FakeGemini(), min_samples=10, initial_delay=5.0)
+    assert hedged.hedge_delay() == 5.0
+    hedged.latencies["gemini"].extend(i / 100 for i in range(1, 101))
+    assert hedged.hedge_delay() == 0.95, "Threshold follows the primary's p95 latency"
+
+    print("✓ Slow primary hedged, first answer wins, loser cancelled")
+    return True
+
+
+def test_gemini_limiter_per_attempt():
+    """Every Gemini model tried in the fallback chain should take its own limiter token"""
+    print("🎫 Testing Gemini limiter tokens per model attempt...")
+
+    from types import SimpleNamespace
+
+    import google.generativeai as genai
+    import cache
+    import llm
+    import resilience
+    from resilience import CircuitBreaker, ModelHealthRegistry
+
+    class CountingLimiter:
+        def __init__(self):
+            self.acquired, self.throttled, self.succeeded = 0, 0, 0
+
+        async def acquire(self, tokens=1):
+            self.acquired += 1
+
+        async def report_throttled(self, retry_after=None):
+            self.throttled += 1
+
+        async def report_success(self):
+            self.succeeded += 1
+
+    class FakeModel:
+        def __init__(self, name):
+            self.model_name = f"models/{name}"
+
+        def generate_content(self, prompt, **options):
+            if self.model_name != "models/gemini-third":
+                raise RuntimeError("429 quota exceeded")
+            usage = SimpleNamespace(prompt_token_count=1, candidates_token_count=1)
+            return SimpleNamespace(text="Third model script", usage_metadata=usage)
+
+    limiter = CountingLimiter()
+    saved = (
+        cache._llm_cache, resilience._breakers.get("gemini"), resilience._model_registry,
+        genai.GenerativeModel, llm.get_limiter
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        disk = cache.DiskCache(Path(tmp) / "llm.sqlite3", ttl=60, max_bytes=1024 * 1024)
+        cache._llm_cache = cache.LLMResponseCache(cache.TieredCache(cache.MemoryCache(ttl=60), disk), ttl=60)
+        resilience._breakers["gemini"] = CircuitBreaker("gemini")
+        resilience._model_registry = ModelHealthRegistry()
+        genai.GenerativeModel = FakeModel
+        llm.get_limiter = lambda name: limiter
+        try:
+            text = asyncio.run(llm.generate_with_gemini_async(
+                "prompt", api_key="test-key", models=["gemini-first", "gemini-second", "gemini-third"]
+            ))
+        finally:
+            cache._llm_cache, breaker, resilience._model_registry, genai.GenerativeModel, llm.get_limiter = saved
+            if breaker is None:
+                resilience._breakers.pop("gemini", None)
+            else:
+                resilience._breakers["gemini"] = breaker
+
+    assert text == "Third model script"
+    assert limiter.acquired == 3, f"Expected one token per model attempt, took {limiter.acquired}"
+    assert limiter.throttled == 2 and limiter.succeeded == 1
+
+    print("✓ Three model attempts took three limiter tokens")
+    return True
+
+
+def main():
+    print("🥷 NewsNinja Resilience Test")
+    print("=" * 50)
+
+    tests = [
+        ("Circuit Breaker", test_circuit_breaker),
+        ("Model Health Registry", test_model_health_registry),
+        ("Shared SQLite Limiter", test_sqlite_limiter_shared_between_workers),
+        ("Redis Protocol Limiter", test_redis_protocol_limiter),
+        ("Record/Replay Transport", test_record_replay_transport),
+        ("Hedged LLM Provider", test_hedged_llm_provider),
+        ("Gemini Limiter Per Attempt", test_gemini_limiter_per_attempt)
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        print("-" * 30)
+        try:
+            results.append(test_func())
+        except Exception as e:
+            print(f"❌ {test_name} failed: {str(e)}")
+            results.append(False)
+
+    print(f"\n📊 {sum(results)}/{len(results)} resilience tests passed")
+
+
+if __name__ == "__main__":
+    main()
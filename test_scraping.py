@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Offline tests for NewsNinja news page processing
+"""
+
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+SAMPLE_PAGES = [
+    """
+    <html>
+    <body>
+    <h1>AI Breakthrough in 2024</h1>
+    <p>Scientists announce major advancement</p>
+    <h2>Tech Giants Invest Billions</h2>
+    <p>Major investment in AI research</p>
+    More
+    <h3>Future of Work</h3>
+    <p>How AI will change employment</p>
+    More
+    </body>
+    </html>
+    """,
+    "<html><head><title>Google News</title><style>a{}</style><script>var More = 1;</script></head>"
+    "<body>first<!-- hidden -->second<template>More</template>&nbsp;third &amp; fourth"
+    "<p>p1<p>p2 More</p><div>More</div>trailing</body></html>",
+    "<!DOCTYPE html><div><a>Head <b>line</b> one</a><span>Reuters</span><button>More</button></div>"
+    "<div><a>Second&#39;s story</a><button>More</button></div>",
+    "plain text only\nMore\nnext"
+]
+
+
+@contextmanager
+def isolated_upstream_state():
+    """Scrape and LLM caches in a temporary directory and process-local rate limiters"""
+    import cache
+    import rate_limit
+    from news_scraper import NewsScraper
+
+    saved = (cache._scrape_cache, cache._llm_cache, rate_limit._backend, rate_limit._limiters, NewsScraper._rate_limiter)
+    with tempfile.TemporaryDirectory() as tmp:
+        def tiered(name):
+            return cache.TieredCache(
+                cache.MemoryCache(ttl=60), cache.DiskCache(Path(tmp) / name, ttl=60, max_bytes=1024 * 1024)
+            )
+
+        cache._scrape_cache = tiered("scrape.sqlite3")
+        cache._llm_cache = cache.LLMResponseCache(tiered("llm.sqlite3"), ttl=60)
+        rate_limit._backend, rate_limit._limiters = rate_limit.LocalBackend(), {}
+        NewsScraper._rate_limiter = rate_limit.get_limiter("brightdata")
+        try:
+            yield
+        finally:
+            (cache._scrape_cache, cache._llm_cache, rate_limit._backend,
+             rate_limit._limiters, NewsScraper._rate_limiter) = saved
+
+
+def test_streaming_extractor_matches_soup():
+    """The lxml streaming extractor must match the BeautifulSoup heuristic"""
+    print("📰 Testing streaming headline extractor...")
+
+    from benchmark import synthetic_news_page
+    from headline_extractor import (
+        extract_headlines_soup,
+        extract_headlines_streaming,
+        fast_extractor_available
+    )
+
+    if not fast_extractor_available():
+        print("⚠️ lxml not installed, skipping")
+        return True
+
+    for html in SAMPLE_PAGES + [synthetic_news_page(200)]:
+        expected = extract_headlines_soup(html)
+        actual = extract_headlines_streaming(html)
+        assert actual == expected, f"{actual!r} != {expected!r}"
+
+    print("✓ Streaming extractor output matches the BeautifulSoup path")
+    return True
+
+
+def test_headline_records_and_dedup():
+    """Structured records should be parsed and syndicated copies collapsed"""
+    print("🗞️ Testing headline records and near-duplicate collapsing...")
+
+    from headline_extractor import collapse_near_duplicates, extract_headline_records, format_headlines
+
+    html = "".join(
+        f"<article><a>{title}</a><div>{outlet}</div><time>{age}</time><button>More</button></article>"
+        for title, outlet, age in [
+            ("Apple unveils new iPhone 16 at September event", "Reuters", "2 hours ago"),
+            ("Apple unveils new iPhone 16 at September event - The Verge", "The Verge", "3 hours ago"),
+            ("Apple unveils new iPhone 16 at its September event", "CNBC", "1 hour ago"),
+            ("Fed holds interest rates steady amid inflation concerns", "Bloomberg", "Yesterday"),
+            ("OpenAI releases new model", "TechCrunch", "5 hours ago"),
+            ("Google releases new model", "The Verge", "6 hours ago")
+        ]
+    )
+
+    records = extract_headline_records(html)
+    assert len(records) == 6
+    assert records[0].outlet == "Reuters" and records[0].published == "2 hours ago"
+    assert records[3].published == "Yesterday"
+
+    collapsed = collapse_near_duplicates(records)
+    titles = [r.title for r in collapsed]
+    assert len(collapsed) == 4, titles
+    assert collapsed[0].coverage == 3
+    assert "OpenAI releases new model" in titles and "Google releases new model" in titles
+
+    print(f"✓ Collapsed {len(records)} headlines into {len(collapsed)} stories:")
+    print(format_headlines(collapsed))
+    return True
+
+
+def test_single_pass_pipeline():
+    """Single-pass mode should skip per-topic summaries and make one broadcast call on raw headlines"""
+    print("🧠 Testing single-pass summarization pipeline...")
+
+    import asyncio
+
+    import replay
+    from news_scraper import NewsScraper
+    from replay import UpstreamTransport
+    from utils import assemble_broadcast, generate_broadcast_news, llm_usage
+
+    page = (
+        "<div><a>Cloud error takes down payments</a><span>Reuters</span><button>More</button></div>"
+        "<div><a>Chipmaker beats forecasts</a><span>BBC</span><button>More</button></div>"
+    )
+
+    class StubTransport(UpstreamTransport):
+        def __init__(self):
+            super().__init__()
+            self.prompts = []
+
+        async def call(self, upstream, request, func, *args, **kwargs):
+            assert upstream == "brightdata", "No per-topic Gemini call in single-pass mode"
+            return {"status": 200, "retry_after": None, "text": page}
+
+        def call_sync(self, upstream, request, func, *args, **kwargs):
+            self.prompts.append(request["prompt"])
+            return {"text": " ".join(segments), "prompt_tokens": 120, "output_tokens": 30}
+
+    topics = ["cloud", "chips"]
+    segments = [f"Broadcast about {topic}. This concludes our coverage of {topic}." for topic in topics]
+    stub = StubTransport()
+    original = replay._transport
+    replay.set_transport(stub)
+    try:
+        with isolated_upstream_state():
+            news_data = asyncio.run(NewsScraper(summarize=False).scrape_news(topics))
+            llm_usage(reset=True)
+            script = generate_broadcast_news("test", news_data, {}, topics, raw_sources=True)
+    finally:
+        replay._transport = original
+
+    assert news_data["news_analysis"][topics[0]].startswith("Cloud error takes down payments")
+    assert script == assemble_broadcast(segments) and len(stub.prompts) == 1
+    # Raw headlines mentioning "error" must not be mistaken for scraper failures
+    assert stub.prompts[0].count("LATEST HEADLINES") == 2 and "Cloud error" in stub.prompts[0]
+    assert llm_usage() == {"calls": 1, "prompt_tokens": 120, "output_tokens": 30}
+
+    print("✓ Raw headlines for every topic go into a single Gemini call")
+    return True
+
+
+def test_concurrent_topic_fetching():
+    """Topics should be fetched concurrently up to the limit, keep their order and fail on their own"""
+    print("🔀 Testing concurrent news fetching...")
+
+    import asyncio
+    import os
+
+    import replay
+    import resilience
+    from tenacity import wait_none
+
+    from news_scraper import NewsScraper
+    from replay import UpstreamTransport
+    from resilience import CircuitBreaker
+
+    topics = [f"topic{i}" for i in range(7)]
+
+    class StubTransport(UpstreamTransport):
+        def __init__(self):
+            super().__init__()
+            self.in_flight = self.peak = 0
+
+        async def call(self, upstream, request, func, *args, **kwargs):
+            topic = next(topic for topic in topics if topic in request["url"])
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            try:
+                # Earlier topics take longer, so they finish last
+                await asyncio.sleep(0.02 * (len(topics) - topics.index(topic)))
+                if topic == "topic2":
+                    raise RuntimeError("502 Bad Gateway")
+            finally:
+                self.in_flight -= 1
+            page = f"<div><a>Headline about {topic}</a><span>Reuters</span><button>More</button></div>"
+            return {"status": 200, "retry_after": None, "text": page}
+
+    stub = StubTransport()
+    fetch_retry = NewsScraper._fetch_page.retry
+    saved = (replay._transport, resilience._breakers.get("brightdata"), fetch_retry.wait)
+    replay.set_transport(stub)
+    resilience._breakers["brightdata"] = CircuitBreaker("brightdata")
+    fetch_retry.wait = wait_none()
+    os.environ["NEWS_FETCH_CONCURRENCY"] = "3"
+    try:
+        with isolated_upstream_state():
+            news = asyncio.run(NewsScraper(summarize=False).scrape_news(topics))["news_analysis"]
+    finally:
+        replay._transport, breaker, fetch_retry.wait = saved
+        if breaker is None:
+            resilience._breakers.pop("brightdata", None)
+        else:
+            resilience._breakers["brightdata"] = breaker
+        del os.environ["NEWS_FETCH_CONCURRENCY"]
+
+    assert list(news) == topics, "Results follow the requested topic order"
+    assert stub.peak == 3, f"{stub.peak} fetches in flight with NEWS_FETCH_CONCURRENCY=3"
+    assert news["topic2"] == "Unable to fetch news for topic2. Please try again later."
+    assert all(news[topic].startswith(f"Headline about {topic}") for topic in topics if topic != "topic2")
+
+    print(f"✓ At most {stub.peak} fetches in flight, one failed topic left the rest intact")
+    return True
+
+
+def test_scrape_requests_are_shared():
+    """Concurrent scrapes of one URL should make one upstream request that outlives a cancelled caller"""
+    print("🤝 Testing shared in-flight scrapes...")
+
+    import asyncio
+
+    import replay
+    from brightdata_client import BrightDataClient
+    from replay import UpstreamTransport
+
+    class StubTransport(UpstreamTransport):
+        def __init__(self):
+            super().__init__()
+            self.urls = []
+
+        async def call(self, upstream, request, func, *args, **kwargs):
+            self.urls.append(request["url"])
+            await asyncio.sleep(0.2)
+            return {"status": 200, "retry_after": None, "text": f"page for {request['url']}"}
+
+    async def run():
+        client = BrightDataClient(api_key="test", zone="test")
+        try:
+            pages = await asyncio.gather(*(client.scrape("https://example.com/a") for _ in range(2)))
+            assert pages == ["page for https://example.com/a"] * 2 and len(stub.urls) == 1
+
+            leader = asyncio.create_task(client.scrape("https://example.com/b"))
+            await asyncio.sleep(0.05)
+            waiter = asyncio.create_task(client.scrape("https://example.com/b"))
+            await asyncio.sleep(0.05)
+            leader.cancel()
+            assert await waiter == "page for https://example.com/b", "The waiter lost its page with the leader"
+            assert leader.cancelled() and len(stub.urls) == 2
+            assert not client._inflight
+        finally:
+            await client.aclose()
+
+    stub = StubTransport()
+    original = replay._transport
+    replay.set_transport(stub)
+    try:
+        with isolated_upstream_state():
+            asyncio.run(run())
+    finally:
+        replay._transport = original
+
+    print("✓ One upstream request per URL, even when its first caller is cancelled")
+    return True
+
+
+def test_prompt_budget():
+    """A verbose topic should be trimmed to its share without crowding out the others"""
+    print("📏 Testing prompt token budget...")
+
+    from prompt_budget import budget_sources, estimate_tokens
+
+    headlines = "\n".join(
+        [f"Minor story number {i} about markets - Outlet {i} - 2 hours ago" for i in range(200)]
+        + ["Central bank raises rates - Reuters - 1 hour ago (7 sources)"]
+    )
+    sources = {
+        "markets": {"news": headlines, "reddit": "POST 1 (r/stocks, score 900): Rates up\nDiscussion"},
+        "space": {"news": "Rocket lands safely - BBC - 3 hours ago"},
+    }
+    fitted, report = budget_sources(sources, budget=400)
+
+    total = sum(estimate_tokens(text) for texts in fitted.values() for text in texts.values())
+    assert total <= 400, f"{total} tokens over budget"
+    assert fitted["space"] == sources["space"], "Small topics keep all their material"
+    assert fitted["markets"]["reddit"] == sources["markets"]["reddit"]
+    # Widely covered stories survive ahead of the rest, in their original order
+    assert fitted["markets"]["news"].endswith("(7 sources)")
+    assert fitted["markets"]["news"].startswith("Minor story number 0 ")
+    assert report["markets"]["news"]["dropped_units"] > 150
+    assert report["space"]["news"]["dropped_tokens"] == 0
+
+    print(f"✓ Dropped {report['markets']['news']['dropped_units']} low-ranked headlines, {total} tokens kept")
+    return True
+
+
+def test_topic_prompt_is_stable():
+    """A topic's prompt block should not change when other topics join the briefing"""
+    print("📐 Testing per-topic prompt budget...")
+
+    from utils import build_broadcast_prompt, cached_segments
+
+    news = {"news_analysis": {
+        topic: "\n".join(f"{topic} story number {i} moves markets" for i in range(2000))
+        for topic in ("AI", "climate")
+    }}
+    with isolated_upstream_state():
+        alone, _ = cached_segments(news, {}, ["AI"], raw_sources=True)
+        together, _ = cached_segments(news, {}, ["AI", "climate"], raw_sources=True)
+    assert alone["AI"] == together["AI"], "Adding a topic must not change the AI segment's prompt"
+
+    block = alone["AI"][alone["AI"].index("TOPIC: AI"):]
+    assert block in build_broadcast_prompt(news, {}, ["AI", "climate"], raw_sources=True)
+
+    print(f"✓ The AI prompt is {len(alone['AI'])} chars with or without other topics")
+    return True
+
+
+def test_async_llm_keeps_loop_responsive():
+    """Concurrent briefings should run in the LLM pool while the event loop keeps ticking"""
+    print("⏱️ Testing async LLM layer...")
+
+    import asyncio
+    import time
+
+    import replay
+    from llm import generate_broadcast_news_async
+    from replay import UpstreamTransport
+    from utils import assemble_broadcast
+
+    class SlowGemini(UpstreamTransport):
+        delay = 0.5
+
+        def call_sync(self, upstream, request, func, *args, **kwargs):
+            time.sleep(self.delay)  # A blocking SDK call
+            return {"text": "Broadcast script", "prompt_tokens": 100, "output_tokens": 20}
+
+    async def briefings(count, timeout=None):
+        gaps, running = [], True
+
+        async def ticker():
+            last = time.perf_counter()
+            while running:
+                await asyncio.sleep(0.01)
+                now = time.perf_counter()
+                gaps.append(now - last)
+                last = now
+
+        tick = asyncio.create_task(ticker())
+        start = time.perf_counter()
+        news = {"news_analysis": {}}
+        scripts = await asyncio.gather(*(
+            generate_broadcast_news_async(news, {}, [f"topic {i}"], timeout=timeout)
+            for i in range(count)
+        ))
+        elapsed = time.perf_counter() - start
+        running = False
+        await tick
+        return scripts, elapsed, max(gaps)
+
+    original = replay._transport
+    replay.set_transport(SlowGemini())
+    try:
+        with isolated_upstream_state():
+            scripts, elapsed, worst_gap = asyncio.run(briefings(4))
+            assert scripts == [assemble_broadcast(["Broadcast script"])] * 4
+            assert elapsed < 1.5, f"Briefings ran one after another ({elapsed:.2f}s)"
+            assert worst_gap < 0.2, f"Event loop stalled for {worst_gap:.2f}s"
+
+        with isolated_upstream_state():
+            SlowGemini.delay = 1.0
+            scripts, timed_out, _ = asyncio.run(briefings(1, timeout=0.1))
+            time.sleep(SlowGemini.delay)  # Let the abandoned worker finish against the temporary cache
+            assert timed_out < 0.8 and "This concludes our coverage" in scripts[0], "Timed out call falls back"
+    finally:
+        replay._transport = original
+
+    print(f"✓ 4 briefings in {elapsed:.2f}s, longest event loop stall {worst_gap * 1000:.0f}ms")
+    return True
+
+
+def main():
+    print("🥷 NewsNinja Scraping Test")
+    print("=" * 50)
+
+    tests = [
+        ("Streaming Extractor", test_streaming_extractor_matches_soup),
+        ("Headline Records", test_headline_records_and_dedup),
+        ("Single-Pass Pipeline", test_single_pass_pipeline),
+        ("Concurrent Topic Fetching", test_concurrent_topic_fetching),
+        ("Shared In-Flight Scrapes", test_scrape_requests_are_shared),
+        ("Prompt Budget", test_prompt_budget),
+        ("Topic Prompt Stability", test_topic_prompt_is_stable),
+        ("Async LLM Layer", test_async_llm_keeps_loop_responsive)
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        print("-" * 30)
+        try:
+            results.append(test_func())
+        except Exception as e:
+            print(f"❌ {test_name} failed: {str(e)}")
+            results.append(False)
+
+    print(f"\n📊 {sum(results)}/{len(results)} scraping tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from streaming import split_sentences
+
+# Bitrates (kbps) of MPEG-1 and MPEG-2/2.5 Layer III, indexed by the header's bitrate bits
+MP3_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+# Sample rates (Hz) by header version bits: 3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5
+MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+# Bytes read past an ID3v2 tag before deciding where the audio starts (longer than any frame)
+MP3_HEAD_BYTES = 4096
+
+# The line the broadcast prompt asks Gemini to end every topic with
+SEGMENT_END_RE = re.compile(r"This concludes our coverage of [^.!?\n]*[.!?]?", re.IGNORECASE)
+
+# Fixed opening and sign-off put around the per-topic segments of a briefing
+BRIEFING_INTRO = "Good evening, and welcome to your NewsNinja briefing."
+BRIEFING_OUTRO = "Thank you for staying informed with NewsNinja."
+
+
+def chunk_text(text: str, max_chars: int) -> List[str]:
+    """
+    Split a script into TTS requests of at most `max_chars` characters.
+
+    Cuts fall on paragraph and sentence boundaries; a single sentence longer than
+    `max_chars` is cut between words.
+    """
+    chunks, current = [], ""
+    for sentence in split_sentences(text):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            pieces = [current, sentence[:cut].strip()] if current else [sentence[:cut].strip()]
+            chunks.extend(pieces)
+            current, sentence = "", sentence[cut:].strip()
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _frame_length(data: bytes, offset: int) -> int:
+    """Length of the MPEG Layer III frame starting at offset, or 0 if there is none"""
+    if offset + 4 > len(data) or data[offset] != 0xFF or data[offset + 1] & 0xE0 != 0xE0:
+        return 0
+    version = (data[offset + 1] >> 3) & 3
+    layer = (data[offset + 1] >> 1) & 3
+    bitrate_index = data[offset + 2] >> 4
+    rate_index = (data[offset + 2] >> 2) & 3
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return 0
+    bitrate = MP3_BITRATES[1 if version == 3 else 2][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][rate_index]
+    padding = (data[offset + 2] >> 1) & 1
+    return (144 if version == 3 else 72) * bitrate // sample_rate + padding
+
+
+def mp3_format(audio: bytes) -> Optional[tuple]:
+    """(MPEG version, sample rate, channel mode) of the first frame of tag-free audio, or None"""
+    if not _frame_length(audio, 0):
+        return None
+    version = (audio[1] >> 3) & 3
+    return version, MP3_SAMPLE_RATES[version][(audio[2] >> 2) & 3], audio[3] >> 6
+
+
+def _id3_length(data: bytes) -> int:
+    """Length of the ID3v2 tag at the start of data, or 0 if there is none"""
+    if data[:3] != b"ID3" or len(data) < 10:
+        return 0
+    # Syncsafe size: 7 bits per byte, plus the 10-byte header (and footer, if flagged)
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    return 10 + size + (10 if data[5] & 0x10 else 0)
+
+
+def _audio_start(data: bytes, offset: int) -> int:
+    """Offset of the first audio frame at or after offset, skipping a Xing/Info/LAME frame"""
+    length = _frame_length(data, offset)
+    if length and (b"Xing" in data[offset:offset + 64] or b"Info" in data[offset:offset + 64]):
+        return offset + length
+    return offset
+
+
+def strip_mp3_tags(data: bytes) -> bytes:
+    """
+    Return just the audio frames of an MP3: no ID3v2 header, no Xing/Info/LAME
+    frame and no trailing ID3v1 tag, so pieces can be concatenated without
+    re-encoding and without players seeing several files.
+    """
+    start = _audio_start(data, _id3_length(data))
+
+    end = len(data)
+    if end - start >= 128 and data[end - 128:end - 125] == b"TAG":
+        end -= 128
+    return data[start:end]
+
+
+def strip_mp3_stream(chunks: Iterable[bytes], keep_header: bool = False) -> Iterator[bytes]:
+    """
+    strip_mp3_tags() for an MP3 that arrives in chunks, passing audio on as it comes.
+
+    Only the first few KB are held back to find the leading tags, and the last
+    128 bytes to drop a trailing ID3v1 tag.
+
+    Args:
+        chunks: MP3 chunks of one file
+        keep_header: Keep the leading ID3v2 tag (for the first piece of a stream,
+            so players still see one file header); the Xing/Info frame is always
+            dropped since its frame count covers only this piece
+    """
+    chunks = iter(chunks)
+    head = b""
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= _id3_length(head) + MP3_HEAD_BYTES:
+            break
+    tag_end = _id3_length(head)
+    buffered = (head[:tag_end] if keep_header else b"") + head[_audio_start(head, tag_end):]
+
+    for chunk in chunks:
+        buffered += chunk
+        if len(buffered) > 128:
+            yield buffered[:-128]
+            buffered = buffered[-128:]
+    if len(buffered) >= 128 and buffered[-128:-125] == b"TAG":
+        buffered = buffered[:-128]
+    if buffered:
+        yield buffered
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_tts_executor() -> ThreadPoolExecutor:
+    """Process-wide pool for TTS requests (TTS_MAX_WORKERS, default 16)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("TTS_MAX_WORKERS", "16")),
+                thread_name_prefix="tts"
+            )
+    return _executor
+
+
+def split_segments(script: str) -> List[str]:
+    """
+    Split a broadcast script into per-topic segments, each ending with its
+    "This concludes our coverage of [topic]" line. A leading BRIEFING_INTRO and
+    any sign-off after the last marker become segments of their own.
+    """
+    segments, start = [], 0
+    if script.startswith(BRIEFING_INTRO):
+        segments.append(BRIEFING_INTRO)
+        start = len(BRIEFING_INTRO)
+    for match in SEGMENT_END_RE.finditer(script):
+        segment = script[start:match.end()].strip()
+        if segment:
+            segments.append(segment)
+        start = match.end()
+    rest = script[start:].strip()
+    return segments + ([rest] if rest else [])
+
+
+def silence_like(audio: bytes, seconds: float) -> bytes:
+    """
+    Silent MPEG frames in the same format as `audio` (zeroed side info and main data
+    decode as silence), for pauses that can be concatenated without re-encoding.
+    """
+    audio = strip_mp3_tags(audio)
+    length = _frame_length(audio, 0)
+    if not length or seconds <= 0:
+        return b""
+    version = (audio[1] >> 3) & 3
+    sample_rate = MP3_SAMPLE_RATES[version][(audio[2] >> 2) & 3]
+    samples_per_frame = 1152 if version == 3 else 576
+    # Same header without padding, so every frame has the same length
+    header = audio[:2] + bytes([audio[2] & ~0x02]) + audio[3:4]
+    frame = (header + bytes(_frame_length(header, 0) - 4))
+    return frame * round(seconds * sample_rate / samples_per_frame)
+
+
+def _synthesize(
+    segments: List[str],
+    voice,
+    max_chars: Optional[int],
+    parallelism: Optional[int],
+    pause: float,
+    fallback=None
+):
+    max_chars = max_chars or int(os.getenv("TTS_CHUNK_CHARS", "1000"))
+    parallelism = parallelism or int(os.getenv("TTS_PARALLELISM", "4"))
+    executor = get_tts_executor()
+
+    # Chunk every segment on its own, so a segment's chunks (and their cache
+    # entries) do not depend on what comes before or after it
+    jobs = []
+    for segment in segments:
+        chunks = chunk_text(segment, max_chars)
+        for i, chunk in enumerate(chunks):
+            jobs.append((chunk, chunks[i - 1] if i else None, i == 0 and bool(jobs)))
+
+    def synthesize(index: int, speaker) -> bytes:
+        text, previous, _ = jobs[index]
+        return b"".join(speaker(text, previous))
+
+    pending = deque()
+    next_index = 0
+    last = b""
+    switched = False
+    # The first chunk goes alone: a half-open circuit admits a single trial call,
+    # so chunks sent alongside it would be refused
+    window = 1
+    try:
+        while pending or next_index < len(jobs):
+            while next_index < len(jobs) and len(pending) < window:
+                pending.append((next_index, executor.submit(synthesize, next_index, voice)))
+                next_index += 1
+            index, future = pending.popleft()
+            try:
+                audio = strip_mp3_tags(future.result())
+            except Exception as e:
+                if index == 0 or fallback is None:
+                    raise  # Nothing sent yet, the caller can still pick another source
+                # Audio is already out: finish with the fallback voice instead of
+                # cutting the MP3 short, and keep it so the speaker does not flip back
+                print(f"TTS voice failed: {str(e)}, switching to the fallback voice")
+                voice, fallback, switched = fallback, None, True
+                for _, other in pending:
+                    other.cancel()
+                pending.clear()
+                next_index = index
+                continue
+            if switched and audio and last and mp3_format(audio) != mp3_format(last):
+                # Frames of another sample rate or MPEG version cannot follow in the same file
+                raise RuntimeError("The fallback voice produces a different MP3 format, ending the stream")
+            window = parallelism
+            if jobs[index][2]:
+                yield silence_like(last, pause)
+            last = audio or last
+            yield audio
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+
+def synthesize_chunked(
+    text: str,
+    voice: Callable[[str, Optional[str]], Iterable[bytes]],
+    max_chars: Optional[int] = None,
+    parallelism: Optional[int] = None,
+    fallback: Optional[Callable[[str, Optional[str]], Iterable[bytes]]] = None
+) -> Iterator[bytes]:
+    """
+    Synthesize a long script as sentence-aligned chunks in parallel and yield one
+    continuous MP3 in order.
+
+    The first chunk is synthesized on its own; once it succeeds, up to
+    `parallelism` chunks are synthesized at once. Each chunk is yielded as soon as
+    it and everything before it are done, so audio starts after the first chunk.
+    Tags are stripped from every piece, so the result is a plain run of MPEG
+    frames that every player treats as one file.
+
+    If the first chunk fails, the error is raised so the caller can try another
+    source. A later failure switches to `fallback` for the rest of the script,
+    provided it produces the same MP3 format (MPEG version, sample rate and
+    channels); otherwise the stream ends with an error.
+
+    Args:
+        text: Script to speak
+        voice: TTS callable (text, previous_text) -> iterator of MP3 chunks
+        max_chars: Characters per TTS request (TTS_CHUNK_CHARS, default 1000)
+        parallelism: Concurrent TTS requests (TTS_PARALLELISM, default 4)
+        fallback: Voice for the remaining chunks if `voice` fails mid-stream
+    """
+    return _synthesize([text], voice, max_chars, parallelism, pause=0.0, fallback=fallback)
+
+
+def synthesize_briefing(
+    script: str,
+    voice: Callable[[str, Optional[str]], Iterable[bytes]],
+    max_chars: Optional[int] = None,
+    parallelism: Optional[int] = None,
+    pause: Optional[float] = None,
+    fallback: Optional[Callable[[str, Optional[str]], Iterable[bytes]]] = None
+) -> Iterator[bytes]:
+    """
+    Like synthesize_chunked(), but splits the script into per-topic segments
+    first and puts a short pause between them.
+
+    Each segment is chunked independently and no previous_text crosses a segment
+    boundary. A topic segment with the same text as in an earlier briefing
+    therefore maps to the same cached chunks, whatever topics surround it. Only
+    new segments reach the TTS provider.
+
+    Args:
+        pause: Seconds of silence between segments (TTS_SEGMENT_PAUSE, default 0.6)
+        fallback: Voice for the remaining chunks if `voice` fails mid-stream
+    """
+    if pause is None:
+        pause = float(os.getenv("TTS_SEGMENT_PAUSE", "0.6"))
+    return _synthesize(split_segments(script), voice, max_chars, parallelism, pause, fallback)
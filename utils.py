@@ -1,12 +1,22 @@
 from urllib.parse import quote_plus
 from dotenv import load_dotenv
-import requests
 import os
+import threading
+import time
+from contextlib import nullcontext
+from functools import lru_cache
+from typing import Callable, ContextManager, Iterator, List, Optional
 from fastapi import FastAPI, HTTPException
-from bs4 import BeautifulSoup
-import google.generativeai as genai
-from datetime import datetime
-from elevenlabs import ElevenLabs
+
+# Provider SDKs (requests, bs4, google.generativeai, elevenlabs, gtts) are imported
+# inside the functions that use them so worker boot does not pay for them
+
+from audio_store import get_audio_store
+from cache import get_llm_cache, get_tts_cache
+from prompt_budget import budget_topics, describe_drops
+from replay import get_transport
+from resilience import CircuitOpenError, get_breaker, get_model_registry
+from tts import BRIEFING_INTRO, BRIEFING_OUTRO, SEGMENT_END_RE, split_segments, synthesize_chunked
 
 load_dotenv()
 
@@ -16,6 +26,72 @@ class MCPOverloadedError(Exception):
     pass
 
 
+SINGLE_PASS, TWO_PASS = "single_pass", "two_pass"
+
+# Prefixes of the placeholders scrapers return instead of source material
+SOURCE_PLACEHOLDERS = (
+    "Unable to fetch news", "No headlines found", "News unavailable",
+    "Reddit discussions unavailable", "No recent Reddit discussions"
+)
+
+
+def pipeline_mode() -> str:
+    """
+    Summarization pipeline (NEWS_PIPELINE_MODE):
+
+    two_pass     -> each topic's headlines are summarized by Gemini, then the
+                    summaries are turned into the broadcast (N+1 LLM calls)
+    single_pass  -> raw headlines and Reddit posts go straight into one
+                    batched broadcast-generation call
+    """
+    mode = os.getenv("NEWS_PIPELINE_MODE", TWO_PASS)
+    if mode not in (SINGLE_PASS, TWO_PASS):
+        raise ValueError(f"Unknown NEWS_PIPELINE_MODE: {mode}")
+    return mode
+
+
+_gemini_lock = threading.Lock()
+_gemini_api_key: Optional[str] = None
+
+
+def configure_gemini(api_key: str):
+    """
+    Configure the Gemini SDK once per process (or when the key changes).
+
+    genai.configure() swaps global client state, so calling it on every request
+    races with calls already in flight on other threads.
+    """
+    global _gemini_api_key
+    if api_key == _gemini_api_key:
+        return
+    import google.generativeai as genai
+
+    with _gemini_lock:
+        if api_key != _gemini_api_key:
+            genai.configure(api_key=api_key)
+            _gemini_api_key = api_key
+
+
+_llm_usage = {"calls": 0, "prompt_tokens": 0, "output_tokens": 0}
+_llm_usage_lock = threading.Lock()
+
+
+def record_llm_usage(prompt_tokens: int, output_tokens: int):
+    with _llm_usage_lock:
+        _llm_usage["calls"] += 1
+        _llm_usage["prompt_tokens"] += prompt_tokens
+        _llm_usage["output_tokens"] += output_tokens
+
+
+def llm_usage(reset: bool = False) -> dict:
+    """Return Gemini calls and token counts made by this process (optionally resetting them)"""
+    with _llm_usage_lock:
+        usage = dict(_llm_usage)
+        if reset:
+            _llm_usage.update(calls=0, prompt_tokens=0, output_tokens=0)
+    return usage
+
+
 def generate_valid_news_url(keyword: str) -> str:
     """
     Generate a Google News search URL for a keyword with optional sorting by latest
@@ -39,7 +115,13 @@ def generate_news_urls_to_scrape(list_of_keywords):
 
 
 def scrape_with_brightdata(url: str) -> str:
-    """Scrape a URL using BrightData MCP server or fallback to direct API"""
+    """
+    Scrape a URL using BrightData MCP server or fallback to direct API.
+
+    Blocking; async callers should use brightdata_client.get_brightdata_client() instead.
+    """
+    import requests
+
     try:
         # Try using MCP server first (if available)
         # This would be handled by the MCP integration in the calling code
@@ -55,7 +137,8 @@ def scrape_with_brightdata(url: str) -> str:
             "format": "raw"
         }
         
-        response = requests.post("https://api.brightdata.com/request", json=payload, headers=headers)
+        timeout = float(os.getenv("BRIGHTDATA_TIMEOUT", "30"))
+        response = requests.post("https://api.brightdata.com/request", json=payload, headers=headers, timeout=timeout)
         response.raise_for_status()
         return response.text
     except requests.exceptions.RequestException as e:
@@ -64,6 +147,8 @@ def scrape_with_brightdata(url: str) -> str:
 
 def clean_html_to_text(html_content: str) -> str:
     """Clean HTML content to plain text"""
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(html_content, "html.parser")
     text = soup.get_text(separator="\n")
     return text.strip()
@@ -102,7 +187,7 @@ def extract_headlines(cleaned_text: str) -> str:
     return "\n".join(headlines)
 
 
-def summarize_with_ollama(headlines) -> str:
+def summarize_with_ollama(headlines, timeout: Optional[float] = None) -> str:
     """Summarize content using Ollama (fallback option - requires ollama to be installed)"""
     try:
         import ollama
@@ -111,7 +196,7 @@ def summarize_with_ollama(headlines) -> str:
         {headlines}
         News Script:"""
 
-        client = ollama.Client(host=os.getenv("OLLAMA_HOST", "http://localhost:11434"))
+        client = ollama.Client(host=os.getenv("OLLAMA_HOST", "http://localhost:11434"), timeout=timeout)
         
         # Generate response using the Ollama client
         response = client.generate(
@@ -131,7 +216,96 @@ def summarize_with_ollama(headlines) -> str:
         raise HTTPException(status_code=500, detail=f"Ollama error: {str(e)}")
 
 
-def generate_broadcast_news(api_key, news_data, reddit_data, topics):
+BROADCAST_MODELS = ['gemini-1.5-flash', 'gemini-pro', 'gemini-1.5-pro']
+
+# Conservative generation config to limit API usage
+BROADCAST_GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "top_p": 0.8,
+    "top_k": 40,
+    "max_output_tokens": 1000,
+}
+
+
+# Added to the writing prompts in the single-pass pipeline
+RAW_SOURCES_NOTE = """
+    The source material is raw: scraped headlines (one per line, "(N sources)" marks a
+    story several outlets ran) and Reddit posts with their top comments. Pick the most
+    newsworthy stories, merge duplicates and ignore navigation text. Never read the
+    headlines out as a list.
+    """
+
+
+def collect_broadcast_sources(news_data, reddit_data, topics, raw_sources: bool = False) -> dict:
+    """
+    Pick the usable news and Reddit material for every topic and fit each topic
+    into its own PROMPT_TOPIC_TOKEN_BUDGET; whatever is dropped is logged.
+
+    Returns:
+        dict: {topic: {"news": text, "reddit": text}} with only the usable sources
+    """
+    sources = {}
+    for topic in topics:
+        news_content = news_data.get("news_analysis", {}).get(topic) if news_data else ''
+        reddit_content = reddit_data.get("reddit_analysis", {}).get(topic) if reddit_data else ''
+
+        # Check if we have meaningful content (not error messages)
+        if raw_sources:
+            # Raw headlines may legitimately mention "error" or "unavailable"
+            has_news = news_content and not news_content.startswith(SOURCE_PLACEHOLDERS)
+            has_reddit = reddit_content and not reddit_content.startswith(SOURCE_PLACEHOLDERS)
+        else:
+            has_news = news_content and not any(x in news_content.lower() for x in ['error', 'unavailable', 'unable to fetch'])
+            has_reddit = reddit_content and not any(x in reddit_content.lower() for x in ['error', 'unavailable', 'unable to fetch'])
+
+        sources[topic] = {}
+        if has_news:
+            sources[topic]["news"] = news_content
+        if has_reddit:
+            sources[topic]["reddit"] = reddit_content
+
+    # Keep each topic bounded on its own, so its material does not depend on
+    # which other topics share the briefing
+    sources, budget_report = budget_topics(sources)
+    for line in describe_drops(budget_report):
+        print(f"Prompt budget: {line}")
+    return sources
+
+
+def topic_block(topic: str, texts: dict, raw_sources: bool = False) -> str:
+    """The TOPIC: section of a writing prompt, with the topic's material or a general-knowledge request"""
+    context = []
+    if texts.get("news"):
+        context.append(f"{'LATEST HEADLINES' if raw_sources else 'CURRENT NEWS'}:\n{texts['news']}")
+    if texts.get("reddit"):
+        context.append(f"ONLINE DISCUSSIONS:\n{texts['reddit']}")
+
+    # Always include the topic, even without current data
+    topic_info = f"TOPIC: {topic}\n\n"
+    if context:
+        topic_info += "\n\n".join(context)
+    else:
+        topic_info += f"Create an informative news segment about {topic} based on general knowledge and current relevance."
+    return topic_info
+
+
+def build_broadcast_prompt(news_data, reddit_data, topics, raw_sources: bool = False) -> str:
+    """
+    Build the full broadcast-writing prompt for all topics.
+
+    Args:
+        news_data: {"news_analysis": {topic: text}} from NewsScraper
+        reddit_data: {"reddit_analysis": {topic: text}} from the Reddit scraper
+        topics: Topics in broadcast order
+        raw_sources: The source texts are unedited headlines and Reddit posts
+            (single-pass pipeline) rather than per-topic summaries
+
+    Each topic's material is fitted into PROMPT_TOPIC_TOKEN_BUDGET; whatever is
+    dropped is logged.
+
+    Returns:
+        str: System instructions followed by the per-topic material
+    """
     # Updated system message with flexible source handling
     system_prompt = """
     You are broadcast_news_writer, a professional virtual news reporter. Generate natural, TTS-ready news reports.
@@ -149,114 +323,420 @@ def generate_broadcast_news(api_key, news_data, reddit_data, topics):
     Formatting rules:
     - ALWAYS start directly with the content, NO INTRODUCTIONS
     - Keep audio length 60-120 seconds per topic
-    - Use natural speech transitions between topics
+    - Keep each topic's segment self-contained, without references to the other topics
     - Maintain professional, informative tone
     - End with "This concludes our coverage of [topic]"
     - Write in full paragraphs optimized for speech synthesis
     - Avoid markdown or special characters
     """
+    if raw_sources:
+        system_prompt += RAW_SOURCES_NOTE
+
+    sources = collect_broadcast_sources(news_data, reddit_data, topics, raw_sources)
+    has_real_data = any(sources.values())
+    topic_blocks = [topic_block(topic, sources[topic], raw_sources) for topic in topics]
+
+    if has_real_data:
+        user_prompt = (
+            "Create broadcast segments for these topics using the provided current information:\n\n" +
+            "\n\n--- NEW TOPIC ---\n\n".join(topic_blocks)
+        )
+    else:
+        user_prompt = (
+            f"Create professional news segments about these topics: {', '.join(topics)}. "
+            "Even though current specific data isn't available, provide informative content about each topic's "
+            "current relevance, recent developments, and why it matters. Make it sound like a real news broadcast."
+        )
+
+    return f"{system_prompt}\n\n{user_prompt}"
+
+
+# LLM cache "model" under which finished topic segments are stored
+SEGMENT_CACHE_MODEL = "broadcast-segment"
+
+
+def cached_segments(news_data, reddit_data, topics, raw_sources: bool = False):
+    """
+    Look up every topic's segment in the LLM cache.
+
+    A segment is keyed by the prompt that would write it alone,
+    build_broadcast_prompt() for just that topic. That prompt depends only on the
+    topic and its own sources, so a topic that comes back with the same material
+    finds its segment whatever topics surround it.
+
+    Returns:
+        tuple: ({topic: segment prompt}, {topic: cached segment or None})
+    """
+    cache = get_llm_cache()
+    prompts = {topic: build_broadcast_prompt(news_data, reddit_data, [topic], raw_sources) for topic in topics}
+    segments = {}
+    for topic, prompt in prompts.items():
+        entry = cache.get(SEGMENT_CACHE_MODEL, prompt, BROADCAST_GENERATION_CONFIG)
+        segments[topic] = entry["text"] if entry is not None else None
+    return prompts, segments
+
+
+def finish_broadcast(topics, prompts: dict, segments: dict, script: Optional[str], latency: float = 0.0) -> str:
+    """
+    Assemble the briefing from cached segments and the script written for the rest.
+
+    `script` is the batched call's answer for the topics without a cached segment
+    (None if it failed). It is split on the "This concludes our coverage of
+    [topic]" marker and each segment is cached under its topic's prompt. A script
+    that does not split into one segment per topic is used as is and not cached;
+    if there is no script, those topics get the fallback text.
 
+    Returns:
+        str: TTS-ready broadcast script
+    """
+    missing = [topic for topic in topics if segments[topic] is None]
+    written = None
+    if script and len(missing) == 1:
+        written = [script.strip()]
+    elif script:
+        marked = [segment for segment in split_segments(script) if SEGMENT_END_RE.search(segment)]
+        written = marked if len(marked) == len(missing) else None
+
+    if written is not None:
+        cache = get_llm_cache()
+        for topic, segment in zip(missing, written):
+            segments[topic] = segment
+            cache.set(SEGMENT_CACHE_MODEL, prompts[topic], BROADCAST_GENERATION_CONFIG, segment, latency / len(missing))
+    elif script:
+        print("Broadcast did not split into one segment per topic, not caching its segments")
+        segments.update({topic: "" for topic in missing})
+        segments[missing[0]] = script
+    else:
+        for position, topic in enumerate(topics, 1):
+            if segments[topic] is None:
+                segments[topic] = fallback_segment(topic, position)
+    return assemble_broadcast([segments[topic] for topic in topics])
+
+
+def assemble_broadcast(segments: List[str]) -> str:
+    """Put the fixed opening and sign-off around the topic segments"""
+    return "\n\n".join([BRIEFING_INTRO, *(segment.strip() for segment in segments if segment.strip()), BRIEFING_OUTRO])
+
+
+def generate_broadcast_news(
+    api_key,
+    news_data,
+    reddit_data,
+    topics,
+    raw_sources: bool = False,
+    timeout: Optional[float] = None
+):
+    """
+    Write the broadcast script for all topics in one Gemini call.
+
+    Topics whose segment is cached (see cached_segments()) are not sent again;
+    the others are written by a single batched call whose answer is split into
+    per-topic segments and cached. The segments are framed by the fixed opening
+    and sign-off.
+
+    Args:
+        api_key: Gemini API key
+        news_data: {"news_analysis": {topic: text}} from NewsScraper
+        reddit_data: {"reddit_analysis": {topic: text}} from the Reddit scraper
+        topics: Topics in broadcast order
+        raw_sources: The source texts are unedited headlines and Reddit posts
+            (single-pass pipeline) rather than per-topic summaries
+        timeout: Optional HTTP timeout in seconds for each Gemini attempt
+
+    Returns:
+        str: TTS-ready broadcast script
+    """
     try:
-        # Check if we have any real data
-        has_real_data = False
-        topic_blocks = []
-        
-        for topic in topics:
-            news_content = news_data.get("news_analysis", {}).get(topic) if news_data else ''
-            reddit_content = reddit_data.get("reddit_analysis", {}).get(topic) if reddit_data else ''
-            
-            # Check if we have meaningful content (not error messages)
-            has_news = news_content and not any(x in news_content.lower() for x in ['error', 'unavailable', 'unable to fetch'])
-            has_reddit = reddit_content and not any(x in reddit_content.lower() for x in ['error', 'unavailable', 'unable to fetch'])
-            
-            context = []
-            if has_news:
-                context.append(f"CURRENT NEWS:\n{news_content}")
-                has_real_data = True
-            if has_reddit:
-                context.append(f"ONLINE DISCUSSIONS:\n{reddit_content}")
-                has_real_data = True
-            
-            # Always include the topic, even without current data
-            topic_info = f"TOPIC: {topic}\n\n"
-            if context:
-                topic_info += "\n\n".join(context)
-            else:
-                topic_info += f"Create an informative news segment about {topic} based on general knowledge and current relevance."
-            
-            topic_blocks.append(topic_info)
-
-        if has_real_data:
-            user_prompt = (
-                "Create broadcast segments for these topics using the provided current information:\n\n" +
-                "\n\n--- NEW TOPIC ---\n\n".join(topic_blocks)
-            )
-        else:
-            user_prompt = (
-                f"Create professional news segments about these topics: {', '.join(topics)}. "
-                "Even though current specific data isn't available, provide informative content about each topic's "
-                "current relevance, recent developments, and why it matters. Make it sound like a real news broadcast."
-            )
-
-        # Configure Gemini
-        genai.configure(api_key=api_key)
-        
-        # Try different models in order of preference (flash is free tier)
-        models_to_try = ['gemini-1.5-flash', 'gemini-pro', 'gemini-1.5-pro']
-        
-        for model_name in models_to_try:
+        prompts, segments = cached_segments(news_data, reddit_data, topics, raw_sources)
+        missing = [topic for topic in topics if segments[topic] is None]
+        script, latency = None, 0.0
+        if missing:
+            full_prompt = build_broadcast_prompt(news_data, reddit_data, missing, raw_sources)
+            start = time.perf_counter()
             try:
-                model = genai.GenerativeModel(model_name)
-                full_prompt = f"{system_prompt}\n\n{user_prompt}"
-                
-                # Add generation config to be more conservative with API usage
-                generation_config = {
-                    "temperature": 0.7,
-                    "top_p": 0.8,
-                    "top_k": 40,
-                    "max_output_tokens": 1000,
-                }
-                
-                response = model.generate_content(full_prompt, generation_config=generation_config)
-                return response.text
-            except Exception as model_error:
-                print(f"Model {model_name} failed: {str(model_error)}")
-                if "429" in str(model_error) or "quota" in str(model_error).lower():
-                    continue  # Try next model
-                else:
-                    continue  # Try next model for any error
-        
-        # If all models fail, create a basic fallback
-        print("All Gemini models failed, using fallback script")
-        fallback_script = create_fallback_script(topics)
-        return fallback_script
-
+                script = generate_with_gemini(api_key, full_prompt, BROADCAST_GENERATION_CONFIG, timeout=timeout)
+                latency = time.perf_counter() - start
+            except Exception as e:
+                # If all models fail (or are cooling down), the new topics get fallback text
+                print(f"All Gemini models failed ({str(e)}), using fallback segments")
+        return finish_broadcast(topics, prompts, segments, script, latency)
     except Exception as e:
-        # Final fallback if everything fails
+        print(f"Broadcast generation failed ({str(e)}), using fallback script")
         return create_fallback_script(topics)
 
+
+def gemini_model_name(model_name: str) -> str:
+    """Full model resource name, as genai.GenerativeModel reports it (and the LLM cache keys it)"""
+    return model_name if model_name.startswith("models/") else f"models/{model_name}"
+
+
+def cached_gemini_text(prompt: str, generation_config: dict = None, models=BROADCAST_MODELS) -> Optional[str]:
+    """
+    Return a fresh cached answer to the prompt from any of `models`, or None.
+
+    Touches neither the circuit breaker nor the rate limiter, so cached answers
+    are served even while Gemini is down or its budget is spent.
+    """
+    entry = get_llm_cache().get_any([gemini_model_name(m) for m in models], prompt, generation_config)
+    return entry["text"] if entry is not None else None
+
+
+def generate_with_gemini(
+    api_key,
+    prompt: str,
+    generation_config: dict = None,
+    timeout: Optional[float] = None,
+    models=BROADCAST_MODELS,
+    lookup: bool = True,
+    attempt: Callable[[], ContextManager] = nullcontext
+) -> str:
+    """
+    Run a prompt on the healthiest available Gemini model, falling back through `models`.
+
+    Args:
+        api_key: Gemini API key
+        prompt: Full prompt text
+        generation_config: Optional generation config dict
+        timeout: Optional HTTP timeout in seconds for each attempt
+        models: Candidate models in order of preference
+        lookup: Check the LLM cache first (False when the caller already missed it)
+        attempt: Entered around every model attempt; llm.run_gemini() passes one
+            that takes a "gemini" limiter token per attempt
+
+    Returns:
+        str: Generated text
+
+    Raises:
+        RuntimeError: Every model failed, is cooling down, or the circuit is open
+    """
+    import google.generativeai as genai
+
+    if lookup:
+        cached = cached_gemini_text(prompt, generation_config, models)
+        if cached is not None:
+            return cached
+
+    configure_gemini(api_key)
+
+    # Models cooling down after quota errors or failures are skipped entirely;
+    # the rest are tried best-first based on recent success rate and latency
+    for model_name in get_model_registry().order(models):
+        try:
+            # The breaker settles (or releases) its trial slot however the attempt ends
+            with attempt(), get_breaker("gemini"):
+                model = genai.GenerativeModel(model_name)
+                return gemini_generate(model, prompt, generation_config, timeout=timeout, lookup=False)
+        except CircuitOpenError:
+            # Skip straight to the fallback while Gemini is known to be down
+            print("Gemini circuit is open")
+            break
+        except Exception as model_error:
+            print(f"Model {model_name} failed: {str(model_error)}")
+            continue  # Try next model for any error
+
+    raise RuntimeError("No Gemini model produced a response")
+
+
+def fallback_segment(topic: str, position: int) -> str:
+    """Generic segment for the topic at `position` (1-based) when AI fails"""
+    segment = f"In our {['first', 'second', 'third', 'fourth', 'fifth'][position-1] if position <= 5 else str(position)} story today, we focus on {topic}. "
+    segment += f"This topic continues to be of significant importance in today's rapidly evolving landscape. "
+    segment += f"Industry experts and researchers are actively monitoring developments in {topic}, "
+    segment += f"as it represents a key area of innovation and public interest. "
+    segment += f"The implications of advances in {topic} extend across multiple sectors, "
+    segment += f"affecting both policy makers and the general public. "
+    segment += f"This concludes our coverage of {topic}. "
+    return segment
+
+
 def create_fallback_script(topics):
     """Create a basic news script when AI fails"""
     script = "Good evening, and welcome to your personalized news briefing. "
     
     for i, topic in enumerate(topics, 1):
-        script += f"In our {['first', 'second', 'third', 'fourth', 'fifth'][i-1] if i <= 5 else str(i)} story today, we focus on {topic}. "
-        script += f"This topic continues to be of significant importance in today's rapidly evolving landscape. "
-        script += f"Industry experts and researchers are actively monitoring developments in {topic}, "
-        script += f"as it represents a key area of innovation and public interest. "
-        script += f"The implications of advances in {topic} extend across multiple sectors, "
-        script += f"affecting both policy makers and the general public. "
-        script += f"This concludes our coverage of {topic}. "
+        script += fallback_segment(topic, i)
     
     script += "Thank you for staying informed with NewsNinja. We'll continue to bring you the latest updates on these important topics."
     
     return script
 
 
-def summarize_with_gemini_news_script(api_key: str, headlines: str) -> str:
+def gemini_generate(
+    model,
+    prompt: str,
+    generation_config: dict = None,
+    timeout: Optional[float] = None,
+    lookup: bool = True
+) -> str:
     """
-    Summarize multiple news headlines into a TTS-friendly broadcast news script using Gemini.
+    Run a Gemini generate_content call through the upstream transport and return its text.
+
+    Identical requests (same model, normalized prompt and generation config) are
+    answered from the LLM response cache while fresh. Real calls report their
+    outcome and latency to the model health registry.
+
+    Args:
+        model: genai.GenerativeModel to call
+        prompt: Full prompt text
+        generation_config: Optional generation config dict
+        timeout: Optional HTTP timeout in seconds for the Gemini request
+        lookup: Check the LLM cache first (False when the caller already missed it)
+
+    Returns:
+        str: Generated text
+    """
+    cache = get_llm_cache()
+    cached = cache.get(model.model_name, prompt, generation_config) if lookup else None
+    if cached is not None:
+        return cached["text"]
+
+    request = {"model": model.model_name, "prompt": prompt, "generation_config": generation_config}
+
+    def generate():
+        options = {}
+        if generation_config is not None:
+            options["generation_config"] = generation_config
+        if timeout is not None:
+            options["request_options"] = {"timeout": timeout}
+        response = model.generate_content(prompt, **options)
+        usage = response.usage_metadata
+        return {
+            "text": response.text,
+            "prompt_tokens": usage.prompt_token_count,
+            "output_tokens": usage.candidates_token_count
+        }
+
+    registry = get_model_registry()
+    model_name = model.model_name.removeprefix("models/")
+    start = time.perf_counter()
+    try:
+        result = get_transport().call_sync("gemini", request, generate)
+    except Exception as e:
+        registry.record_failure(model_name, e)
+        raise
+    latency = time.perf_counter() - start
+    registry.record_success(model_name, latency)
+    if isinstance(result, str):
+        # Fixture recorded before token counts were kept; estimate ~4 characters per token
+        result = {"text": result, "prompt_tokens": len(prompt) // 4, "output_tokens": len(result) // 4}
+    record_llm_usage(result["prompt_tokens"], result["output_tokens"])
+    cache.set(model.model_name, prompt, generation_config, result["text"], latency)
+    return result["text"]
+
+
+def stream_gemini_text(model, prompt: str, generation_config: dict = None, lookup: bool = True) -> Iterator[str]:
     """
+    Streaming counterpart of gemini_generate(): yield text as Gemini produces it.
+
+    Cached responses are yielded in one piece; completed streams are cached, counted
+    and reported to the model health registry like non-streamed calls.
+    """
+    cache = get_llm_cache()
+    cached = cache.get(model.model_name, prompt, generation_config) if lookup else None
+    if cached is not None:
+        yield cached["text"]
+        return
+
+    request = {"model": model.model_name, "prompt": prompt, "generation_config": generation_config, "stream": True}
+
+    def generate():
+        for chunk in model.generate_content(prompt, generation_config=generation_config, stream=True):
+            try:
+                text = chunk.text
+            except ValueError:
+                continue  # e.g. a final chunk that only carries the finish reason
+            if text:
+                yield text.encode("utf-8")
+
+    registry = get_model_registry()
+    model_name = model.model_name.removeprefix("models/")
+    parts = []
+    start = time.perf_counter()
+    try:
+        for data in get_transport().stream_sync("gemini", request, generate):
+            parts.append(data.decode("utf-8"))
+            yield parts[-1]
+    except Exception as e:
+        registry.record_failure(model_name, e)
+        raise
+    latency = time.perf_counter() - start
+    registry.record_success(model_name, latency)
+
+    text = "".join(parts)
+    # Streamed chunks carry no reliable usage totals; estimate ~4 characters per token
+    record_llm_usage(len(prompt) // 4, len(text) // 4)
+    cache.set(model.model_name, prompt, generation_config, text, latency)
+
+
+def stream_broadcast_news(
+    api_key,
+    news_data,
+    reddit_data,
+    topics,
+    raw_sources: bool = False,
+    prompt: Optional[str] = None,
+    lookup: bool = True,
+    attempt: Callable[[], ContextManager] = nullcontext
+) -> Iterator[str]:
+    """
+    Streaming counterpart of generate_broadcast_news(): yield the script as it is written.
+
+    A cached script is yielded in one piece, even while the circuit is open.
+    Otherwise models are tried in registry order until one starts streaming. If
+    every model fails before producing text, the fallback script is yielded
+    instead; a stream that breaks midway simply ends, since its audio has already
+    been sent.
+
+    Args:
+        prompt: Prompt already built with build_broadcast_prompt() for these sources
+        lookup: Check the LLM cache first (False when the caller already missed it)
+        attempt: Entered around every model attempt, as in generate_with_gemini()
+    """
+    import google.generativeai as genai
+
+    full_prompt = prompt or build_broadcast_prompt(news_data, reddit_data, topics, raw_sources)
+    if lookup:
+        cached = cached_gemini_text(full_prompt, BROADCAST_GENERATION_CONFIG)
+        if cached is not None:
+            yield cached
+            return
+    configure_gemini(api_key)
+
+    for model_name in get_model_registry().order(BROADCAST_MODELS):
+        breaker = get_breaker("gemini")
+        if not breaker.allow():
+            print("Gemini circuit is open, using fallback script")
+            break
+        started = False
+        try:
+            with attempt():
+                model = genai.GenerativeModel(model_name)
+                for text in stream_gemini_text(model, full_prompt, BROADCAST_GENERATION_CONFIG, lookup=False):
+                    started = True
+                    yield text
+        except GeneratorExit:
+            # The listener went away; that says nothing about Gemini's health
+            breaker.release()
+            raise
+        except Exception as model_error:
+            breaker.record_failure()
+            print(f"Model {model_name} failed: {str(model_error)}")
+            if started:
+                return
+            continue
+        breaker.record_success()
+        return
+
+    print("All Gemini models failed, using fallback script")
+    yield create_fallback_script(topics)
+
+
+# The model that summarizes one topic's headlines in the two-pass pipeline
+NEWS_SCRIPT_MODEL = 'gemini-1.5-pro'
+
+
+def news_script_prompt(headlines: str) -> str:
+    """Full Gemini prompt for summarize_with_gemini_news_script()"""
     system_prompt = """
 You are my personal news editor and scriptwriter for a news podcast. Your job is to turn raw headlines into a clean, professional, and TTS-friendly news script.
 
@@ -270,80 +750,177 @@ The final output will be read aloud by a news anchor or text-to-speech engine. S
 
 Remember: Your only output should be a clean script that is ready to be read out loud.
 """
+    return f"{system_prompt}\n\nHeadlines to summarize:\n{headlines}"
+
+
+def summarize_with_gemini_news_script(
+    api_key: str,
+    headlines: str,
+    timeout: Optional[float] = None,
+    lookup: bool = True,
+    attempt: Callable[[], ContextManager] = nullcontext
+) -> str:
+    """
+    Summarize multiple news headlines into a TTS-friendly broadcast news script using Gemini.
+
+    A cached summary is returned even while the circuit is open; pass lookup=False
+    when the caller has already missed the cache. `attempt` is entered around the
+    Gemini request, as in generate_with_gemini().
+    """
+    import google.generativeai as genai
+
+    full_prompt = news_script_prompt(headlines)
+    if lookup:
+        cached = cached_gemini_text(full_prompt, models=[NEWS_SCRIPT_MODEL])
+        if cached is not None:
+            return cached
 
     try:
-        # Configure Gemini
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-1.5-pro')
-        
-        full_prompt = f"{system_prompt}\n\nHeadlines to summarize:\n{headlines}"
-        response = model.generate_content(full_prompt)
-        
-        return response.text
+        configure_gemini(api_key)
+        model = genai.GenerativeModel(NEWS_SCRIPT_MODEL)
+
+        with attempt(), get_breaker("gemini"):
+            return gemini_generate(model, full_prompt, timeout=timeout, lookup=False)
+    except CircuitOpenError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Gemini error: {str(e)}")
 
 
+@lru_cache(maxsize=4)
+def _elevenlabs_client(api_key: str):
+    # One client (and HTTP connection pool) per key instead of one per request
+    from elevenlabs import ElevenLabs
+    return ElevenLabs(api_key=api_key)
+
+
+def stream_elevenlabs_audio(
+    text: str,
+    previous_text: Optional[str] = None,
+    voice_id: str = "JBFqnCBsd6RMkjVDRZzb",
+    model_id: str = "eleven_multilingual_v2",
+    output_format: str = "mp3_44100_128",
+    api_key: str = None
+) -> Iterator[bytes]:
+    """
+    Yield MP3 chunks for one piece of text as ElevenLabs produces them.
+
+    Args:
+        text: Text to speak (typically one or a few sentences)
+        previous_text: Text spoken just before, so intonation carries across pieces
+    """
+    api_key = api_key or os.getenv("ELEVEN_API_KEY")
+    if not api_key:
+        raise ValueError("ElevenLabs API key is required.")
+
+    breaker = get_breaker("elevenlabs")
+    if not breaker.allow():
+        raise CircuitOpenError("elevenlabs circuit is open, failing fast")
+
+    request = {"text": text, "voice_id": voice_id, "model_id": model_id, "output_format": output_format}
+    kwargs = dict(request)
+    if previous_text:
+        request["previous_text"] = kwargs["previous_text"] = previous_text
+
+    try:
+        yield from get_transport().stream_sync(
+            "elevenlabs", request, _elevenlabs_client(api_key).text_to_speech.convert, **kwargs
+        )
+    except GeneratorExit:
+        breaker.release()
+        raise
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+
+
+def stream_gtts_audio(text: str, language: str = 'en') -> Iterator[bytes]:
+    """Yield MP3 chunks for one piece of text from gTTS (fallback voice)"""
+    from gtts import gTTS
+    yield from gTTS(text=text, lang=language, slow=False).stream()
+
+
+def cached_voice(voice, voice_id: str, model_id: str, output_format: str, language: str = ""):
+    """
+    Wrap a TTS callable (text, previous_text) -> MP3 chunks with the TTS audio cache.
+
+    Hits return the stored audio without calling the provider; complete misses are
+    stored. previous_text only nudges intonation, so it is not part of the key.
+    """
+    cache = get_tts_cache()
+
+    def speak(text: str, previous_text: Optional[str] = None) -> Iterator[bytes]:
+        key = cache.key(text, voice_id, model_id, output_format, language)
+        audio = cache.get(key)
+        if audio is not None:
+            yield audio
+            return
+        chunks = []
+        start = time.perf_counter()
+        for chunk in voice(text, previous_text):
+            chunks.append(chunk)
+            yield chunk
+        cache.set(
+            key, b"".join(chunks), time.perf_counter() - start,
+            text=text, voice_id=voice_id, model_id=model_id, output_format=output_format, language=language
+        )
+
+    return speak
+
+
+def elevenlabs_voice(
+    voice_id: str = "JBFqnCBsd6RMkjVDRZzb",
+    model_id: str = "eleven_multilingual_v2",
+    output_format: str = "mp3_44100_128",
+    api_key: str = None
+):
+    """Cached ElevenLabs voice for synthesize_chunked() and stream_speech()"""
+    def voice(text, previous_text):
+        return stream_elevenlabs_audio(text, previous_text, voice_id, model_id, output_format, api_key)
+    return cached_voice(voice, voice_id, model_id, output_format)
+
+
+def gtts_voice(language: str = 'en'):
+    """Cached gTTS voice for synthesize_chunked() and stream_speech()"""
+    return cached_voice(lambda text, previous_text: stream_gtts_audio(text, language), "gtts", "gtts", "mp3", language)
+
+
 def text_to_audio_elevenlabs_sdk(
     text: str,
     voice_id: str = "JBFqnCBsd6RMkjVDRZzb",
     model_id: str = "eleven_multilingual_v2",
     output_format: str = "mp3_44100_128",
-    output_dir: str = "audio",
+    output_dir: Optional[str] = None,
     api_key: str = None,
     topic_name: str = None
 ) -> str:
     """
-    Converts text to speech using ElevenLabs SDK and saves it to audio/ directory.
+    Converts text to speech using ElevenLabs SDK and saves it to the audio store
+    (output_dir, default AUDIO_DIR).
+
+    Long scripts are synthesized as sentence-aligned chunks in parallel (see
+    tts.synthesize_chunked) and stitched into one MP3.
 
     Returns:
         str: Path to the saved audio file.
     """
-    try:
-        api_key = api_key or os.getenv("ELEVEN_API_KEY")
-        if not api_key:
-            raise ValueError("ElevenLabs API key is required.")
-
-        # Initialize client
-        client = ElevenLabs(api_key=api_key)
-
-        # Get the audio generator
-        audio_stream = client.text_to_speech.convert(
-            text=text,
-            voice_id=voice_id,
-            model_id=model_id,
-            output_format=output_format
-        )
+    api_key = api_key or os.getenv("ELEVEN_API_KEY")
+    if not api_key:
+        raise ValueError("ElevenLabs API key is required.")
 
-        # Ensure output directory exists
-        os.makedirs(output_dir, exist_ok=True)
+    voice = elevenlabs_voice(voice_id, model_id, output_format, api_key)
 
-        # Generate filename based on topic or timestamp
-        if topic_name:
-            # Clean topic name for filename (remove special characters)
-            clean_topic = "".join(c for c in topic_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
-            clean_topic = clean_topic.replace(' ', '_')
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"{clean_topic}_{timestamp}.mp3"
-        else:
-            filename = f"tts_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp3"
-        
-        filepath = os.path.join(output_dir, filename)
+    # Saved under a unique name in the managed store; the file appears only once it is complete
+    return str(get_audio_store(output_dir).save(synthesize_chunked(text, voice), topic_name))
 
-        # Write audio chunks to file
-        with open(filepath, "wb") as f:
-            for chunk in audio_stream:
-                f.write(chunk)
 
-        return filepath
 
-    except Exception as e:
-        raise e
+def persist_audio() -> bool:
+    """Whether streamed briefings are also saved in the audio store (AUDIO_PERSIST, default on)"""
+    return os.getenv("AUDIO_PERSIST", "true").lower() in ("1", "true", "yes")
+
 
-from pathlib import Path
-from gtts import gTTS
-AUDIO_DIR = Path("audio")
-AUDIO_DIR.mkdir(exist_ok=True)  # Create directory if it doesn't exist
 def tts_to_audio(text: str, language: str = 'en', topic_name: str = None) -> str:
     """
     Convert text to speech using gTTS (Google Text-to-Speech) and save to file.
@@ -360,22 +937,8 @@ def tts_to_audio(text: str, language: str = 'en', topic_name: str = None) -> str
         tts_to_audio("Hello world", "en", "AI_News")
     """
     try:
-        # Generate filename based on topic or timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        
-        if topic_name:
-            # Clean topic name for filename (remove special characters)
-            clean_topic = "".join(c for c in topic_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
-            clean_topic = clean_topic.replace(' ', '_')
-            filename = AUDIO_DIR / f"{clean_topic}_{timestamp}.mp3"
-        else:
-            filename = AUDIO_DIR / f"tts_{timestamp}.mp3"
-        
-        # Create TTS object and save
-        tts = gTTS(text=text, lang=language, slow=False)
-        tts.save(str(filename))
-        
-        return str(filename)
+        # Synthesize sentence-aligned chunks in parallel and save the stitched MP3
+        return str(get_audio_store().save(synthesize_chunked(text, gtts_voice(language)), topic_name))
     except Exception as e:
         print(f"gTTS Error: {str(e)}")
         return None
\ No newline at end of file